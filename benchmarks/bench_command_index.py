@@ -0,0 +1,100 @@
+"""插件指令匹配基准测试
+对比逐个遍历注册池（旧实现）与预编译指令索引在不同插件规模下的匹配耗时，并校验两者结果一致
+
+运行方式（项目根目录）：python benchmarks/bench_command_index.py
+"""
+
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.command_index import CommandIndex  # noqa: E402
+
+MASTER_QQ = "10000"
+
+
+def linear_match(plugins, raw_msg, chat_type, sender_id, is_at_bot):
+    """旧实现：逐个插件检查场景/权限/@要求，再逐条检查指令子串"""
+    for plugin in plugins:
+        if chat_type not in plugin["chat_type"]:
+            continue
+        if plugin["permission"] == "master" and str(sender_id) != str(MASTER_QQ):
+            continue
+        if chat_type == "group" and plugin.get("is_at_required", False) and not is_at_bot:
+            continue
+        if [cmd for cmd in plugin["commands"] if cmd in raw_msg]:
+            return plugin
+    return None
+
+
+def make_plugins(count, rng):
+    """生成模拟插件注册池（每个插件3~8条中文/英文混合指令）"""
+    plugins = []
+    for i in range(count):
+        commands = []
+        for _ in range(rng.randint(3, 8)):
+            word = "".join(rng.choice("状态查询运行帮助天气签到抽奖音乐" + string.ascii_lowercase)
+                           for _ in range(rng.randint(2, 5)))
+            commands.append("/" + word)
+        plugins.append({
+            "name": f"Plugin_{i}",
+            "commands": commands,
+            "chat_type": rng.choice([["private"], ["group"], ["private", "group"]]),
+            "permission": rng.choice(["all", "all", "all", "master"]),
+            "is_at_required": rng.random() < 0.2,
+        })
+    return plugins
+
+
+def make_messages(plugins, rng, count=200):
+    """生成测试消息：一半包含随机指令，一半为普通聊天"""
+    messages = []
+    all_commands = [cmd for plugin in plugins for cmd in plugin["commands"]]
+    for i in range(count):
+        noise = "".join(rng.choice("今天大家好你在吗哈哈哈" + string.ascii_letters) for _ in range(rng.randint(5, 60)))
+        if i % 2 == 0:
+            messages.append(rng.choice(all_commands) + " " + noise)
+        else:
+            messages.append(noise)
+    return messages
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'插件数':>6} | {'旧实现(us/条)':>14} | {'指令索引(us/条)':>16} | {'加速比':>6}")
+    print("-" * 54)
+    for count in (10, 50, 100, 300, 500, 1000):
+        plugins = make_plugins(count, rng)
+        messages = make_messages(plugins, rng)
+        cases = [(msg, rng.choice(["private", "group"]), rng.choice([MASTER_QQ, "20000"]), rng.random() < 0.5)
+                 for msg in messages]
+
+        index = CommandIndex()
+        index.rebuild(plugins)
+
+        # 正确性校验：匹配结果必须与旧实现完全一致（包括注册顺序优先级）
+        for msg, chat_type, sender, at in cases:
+            expected = linear_match(plugins, msg, chat_type, sender, at)
+            actual = index.match(msg, chat_type, sender == MASTER_QQ, at)
+            assert expected is actual, f"匹配结果不一致：{msg!r}"
+
+        def run_linear():
+            for msg, chat_type, sender, at in cases:
+                linear_match(plugins, msg, chat_type, sender, at)
+
+        def run_index():
+            for msg, chat_type, sender, at in cases:
+                index.match(msg, chat_type, sender == MASTER_QQ, at)
+
+        repeat = 20
+        linear_us = min(timeit.repeat(run_linear, number=1, repeat=repeat)) / len(cases) * 1e6
+        index_us = min(timeit.repeat(run_index, number=1, repeat=repeat)) / len(cases) * 1e6
+        print(f"{count:>6} | {linear_us:>14.2f} | {index_us:>16.2f} | {linear_us / index_us:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""内容过滤基准测试
+对比旧实现（先完整HTML转义净化，再逐条re.search危险命令、敏感字符和SQL注入规则）
+与单个组合正则单次扫描原始文本（ContentFilter）的每条消息耗时；
+并校验新实现与“逐条规则扫描原始文本”的拦截结论一致（旧实现在转义后的文本上匹配，转义产生的&;#会误判）
+
+运行方式（项目根目录）：python benchmarks/bench_content_filter.py
+"""
+
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.content_filter import ContentFilter, DEFAULT_CONTENT_RULES  # noqa: E402
+
+LEGACY_DANGEROUS = [r"rm\s+-rf", r"shutdown", r"init\s+0", r"reboot", r"mkfs|mke2fs",
+                    r"dd\s+if=.*of=.*", r"chmod\s+777", r"sudo\s+su"]
+LEGACY_SQL = [r'\b(select|insert|update|delete|drop|truncate|alter)\b.*?\b(from|into|table|database)\b',
+              r'\bunion\s+select\b', r'--|#', r';\s*[a-zA-Z]']
+HTML_ESCAPE = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;', '/': '&#47;'}
+
+
+def legacy_filter(content):
+    """旧实现：sanitize_input + 逐条规则匹配"""
+    content = content[:1000]
+    content = ''.join(HTML_ESCAPE.get(c, c) for c in content)
+    content = re.sub(r'[\x00-\x1F\x7F]', '', content)
+    content = ' '.join(content.split())
+    for pattern in LEGACY_DANGEROUS:
+        if re.search(pattern, content, re.IGNORECASE):
+            return False
+    body = content[1:] if content.startswith('/') else content
+    if re.search(r'[\;\&\|\$\<\>\'\"\`]', body):
+        return False
+    for pattern in LEGACY_SQL:
+        if re.search(pattern, content, re.IGNORECASE):
+            return False
+    return True
+
+
+_SEQUENTIAL = [re.compile(rule["pattern"], re.IGNORECASE) for rule in DEFAULT_CONTENT_RULES]
+
+
+def sequential_raw(content):
+    """同一组规则逐条扫描原始文本（用于校验拦截结论）"""
+    content = re.sub(r'[\x00-\x1F\x7F]', '', content[:1000])
+    return not any(pattern.search(content) for pattern in _SEQUENTIAL)
+
+
+def make_messages(rng, count=2000):
+    words = ["今天", "天气", "不错", "哈哈", "大家好", "状态", "帮助", "吃饭了吗", "好耶", "这个插件怎么用",
+             "select", "from", "hello", "world", "reboot", "rm -rf /", "a;b", "/运行状态", "<b>", "#话题"]
+    messages = []
+    for _ in range(count):
+        if rng.random() < 0.9:
+            # 普通聊天消息
+            messages.append("".join(rng.choice(words[:10]) for _ in range(rng.randint(1, 30))))
+        else:
+            messages.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 8))))
+    return messages
+
+
+def main():
+    content_filter = ContentFilter()
+    messages = make_messages(random.Random(42))
+
+    for message in messages:
+        assert (content_filter.match(message) is None) == sequential_raw(message), message
+    false_positives = sum(1 for m in messages if sequential_raw(m) and not legacy_filter(m))
+    print(f"消息数：{len(messages)}，旧实现误判（转义后命中）：{false_positives} 条")
+
+    def run_legacy():
+        for message in messages:
+            legacy_filter(message)
+
+    def run_compiled():
+        for message in messages:
+            content_filter.match(message)
+
+    legacy_us = min(timeit.repeat(run_legacy, number=1, repeat=10)) / len(messages) * 1e6
+    compiled_us = min(timeit.repeat(run_compiled, number=1, repeat=10)) / len(messages) * 1e6
+    print(f"{'实现':>10} | {'耗时(us/条)':>12}")
+    print("-" * 28)
+    print(f"{'旧实现':>10} | {legacy_us:>12.2f}")
+    print(f"{'组合正则':>10} | {compiled_us:>12.2f}")
+    print(f"加速比：{legacy_us / compiled_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""耗时直方图基准测试
+测量 SlidingHistogram 每次记录的耗时，对比旧版 deque(maxlen=100) 追加；
+并用对数正态分布的模拟耗时比较直方图分位数与精确分位数（排序后取值）的相对误差，
+以及查询 1m / 5m / 1h 三个窗口分位数的耗时
+
+运行方式（项目根目录）：python benchmarks/bench_latency_histogram.py
+"""
+
+import os
+import random
+import sys
+import timeit
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.histogram import Histogram, SlidingHistogram  # noqa: E402
+
+SAMPLES = 200000
+NUMBER = 200000
+
+
+def main():
+    random.seed(1)
+    # 模拟回调耗时：中位数约20ms，长尾到数秒
+    values = [random.lognormvariate(-4, 1.2) for _ in range(SAMPLES)]
+
+    sliding = SlidingHistogram()
+    samples = iter(values * (NUMBER // SAMPLES + 1))
+    per_record = timeit.timeit(lambda: sliding.record(next(samples)), number=NUMBER) / NUMBER
+    old = deque(maxlen=100)
+    per_append = timeit.timeit(lambda: old.append(0.02 * 1000), number=NUMBER) / NUMBER
+    print(f"记录一次：SlidingHistogram {per_record * 1e9:.0f}ns，deque追加 {per_append * 1e9:.0f}ns")
+
+    per_query = timeit.timeit(sliding.summary, number=100) / 100
+    print(f"查询三个窗口的分位数：{per_query * 1e3:.2f}ms")
+
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    exact = sorted(values)
+    for q in (50, 95, 99, 99.9):
+        estimated = histogram.percentile(q)
+        actual = exact[max(int(len(exact) * q / 100) - 1, 0)]
+        print(f"p{q:g}：直方图 {estimated * 1000:.2f}ms，精确 {actual * 1000:.2f}ms，"
+              f"误差 {abs(estimated - actual) / actual * 100:.2f}%")
+    print(f"桶数量：{len(histogram.counts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""上下文日志基准测试
+对比旧版 log_with_context（先json.dumps上下文并拼入消息，每次调用向stdout打印“日志记录成功”）
+与新版（先判断级别是否启用，上下文作为记录属性，由格式化器序列化一次）的每次调用耗时，
+分别测量级别已启用（INFO，经过格式化器写入内存流）和未启用（DEBUG）两种情况
+
+运行方式（项目根目录）：python benchmarks/bench_log_with_context.py
+"""
+
+import io
+import json
+import logging
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.logger_manager import LoggerManager, StructuredLogFormatter  # noqa: E402
+
+CONTEXT = {
+    "client_ip": "127.0.0.1",
+    "request_id": "123456",
+    "path": "/callback",
+    "user_id": 192004908,
+    "message_type": "group",
+    "raw_message": "今天天气不错，大家好",
+    "group_id": 987654321
+}
+
+
+def legacy_log_with_context(logger, level, message="无日志消息", context=None, exc_info=False, **kwargs):
+    """旧实现（去掉了外层的异常兜底）"""
+    if context:
+        if isinstance(context, dict):
+            context_str = json.dumps(context, ensure_ascii=False)
+        else:
+            context_str = str(context)
+        full_message = f"{message} | 上下文: {context_str}"
+    else:
+        full_message = message
+    logger.log(level, full_message, exc_info=exc_info)
+    print(f"✅ 日志记录成功: {logger.name if hasattr(logger, 'name') else 'unknown'}")
+
+
+def make_logger():
+    logger = logging.getLogger("bench-log-with-context")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setFormatter(StructuredLogFormatter(structured=False))
+    logger.addHandler(handler)
+    return logger
+
+
+def main():
+    manager = LoggerManager()
+    logger = make_logger()
+    number = 20000
+    stdout = sys.stdout
+    results = []
+    for level_name, level in (("INFO(启用)", logging.INFO), ("DEBUG(未启用)", logging.DEBUG)):
+        sys.stdout = io.StringIO()  # 旧实现的stdout打印写入内存，不计终端输出耗时
+        try:
+            legacy = min(timeit.repeat(lambda: legacy_log_with_context(logger, level, "请求处理成功", CONTEXT),
+                                       number=number, repeat=5)) / number * 1e6
+            lazy = min(timeit.repeat(lambda: manager.log_with_context(logger, level, "请求处理成功", CONTEXT),
+                                     number=number, repeat=5)) / number * 1e6
+        finally:
+            sys.stdout = stdout
+        results.append((level_name, legacy, lazy))
+
+    print(f"{'级别':>14} | {'旧实现(us/次)':>14} | {'新实现(us/次)':>14} | {'加速比':>6}")
+    print("-" * 60)
+    for level_name, legacy, lazy in results:
+        print(f"{level_name:>14} | {legacy:>14.2f} | {lazy:>14.2f} | {legacy / lazy:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
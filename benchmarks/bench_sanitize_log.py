@@ -0,0 +1,120 @@
+"""日志脱敏基准测试
+对比旧实现（sanitize_log 8次re.sub + SanitizeLogFilter 4次re.sub）与单次扫描的组合脱敏器的每条日志耗时，
+并校验两者输出一致。旧过滤器中3条规则的替换串写法有误（'\\1' 被当作控制字符，输出字面量 \\1****），
+对照实现按规则本意修正为保留前缀后隐藏。
+旧实现逐条替换时，密钥中的数字段可能先被ID规则改写，导致后续密钥规则失配、密钥后半段原样输出；
+新实现按整个密钥一次隐藏（新实现隐藏得更彻底）。校验时把这类日志中密钥前缀后的脱敏段统一为 ****
+再比较，计为预期差异，不计入不一致
+
+运行方式（项目根目录）：python benchmarks/bench_sanitize_log.py
+"""
+
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.security import sanitize_log  # noqa: E402
+
+LEGACY_PASSES = [
+    (r'(?<!\w)(\d{5,15})(?!\w)', lambda m: f"用户****{m.group(1)[-4:]}"),
+    (r'用户(\d{1,})', lambda m: f"用户****{m.group(1)[-4:]}"),
+    (r'【(\d{1,})】', lambda m: f"【用户****{m.group(1)[-4:]}】"),
+    (r'群ID：(\d{1,})', lambda m: f"群ID：****{m.group(1)[-4:]}"),
+    (r'目标ID：(\d{1,})', lambda m: f"目标ID：用户****{m.group(1)[-4:]}"),
+    (r'发送(private|group)消息到(\d{1,})', lambda m: f"发送{m.group(1)}消息到【用户****{m.group(2)[-4:]}】"),
+    (r'密码[:=]\s*[^\s]+', '密码: ******'),
+    (r'(API_KEY|api_key|sk-|SK-)[\s:]*([a-zA-Z0-9]{6})[a-zA-Z0-9]*', r'\1\2****'),
+    # 以下为旧过滤器的附加规则
+    (r'(sk-|API_KEY=|token=)[\w-]{4,}', r'\1****'),
+    (r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', '****@****.***'),
+    (r'(?<!\d)(1[3-9]\d{9})(?!\d)', lambda m: f"1****{m.group(1)[-4:]}"),
+    (r'(password|secret|token)=([^&]+)', r'\1=****'),
+]
+
+
+def legacy_sanitize(content):
+    for pattern, replacement in LEGACY_PASSES:
+        content = re.sub(pattern, replacement, content)
+    return content
+
+
+# 密钥前缀后的脱敏段（旧实现可能在 **** 后原样输出密钥的剩余部分）
+MASKED_SECRET = re.compile(r'(API_KEY=|token=|sk-|SK-|api_key:\s*)\*{4,}[\w-]*')
+
+
+def normalize_secrets(content):
+    return MASKED_SECRET.sub(r'\1****', content)
+
+
+TEMPLATES = [
+    "[指令分发] 指令「/帮助...」处理完成（handled：True）",
+    "[内置命令] 主人{qq}执行/重启命令，即将重启机器人",
+    "[内置命令] 用户{qq}执行/关于命令，已返回框架信息",
+    "[群事件] 新人入群（群ID：{group}，用户：小明）",
+    "[群事件] 自动同意群邀请（群ID：{short}）",
+    "[好友事件] 自动同意好友请求（用户ID：{qq}）",
+    "[消息发送] 发送group消息到{group}成功",
+    "[消息发送] 发送private消息到{qq}失败：超时",
+    "[事件路由] 【{qq}】 处理 message.group 事件失败",
+    "[通知] 目标ID：{qq}，操作者：{qq}",
+    "[配置] 登录密码: hunter2 已更新",
+    "[AI] 使用密钥 sk-{key} 请求接口",
+    "[AI] API_KEY={key} 已加载",
+    "[AI] SK-{key} api_key: {key}",
+    "[回调] 请求地址 /api?token={key}&user={qq}",
+    "[用户] 绑定邮箱 {qq}@qq.com / test.user@example.org",
+    "[用户] 联系电话13812345678，备用 {phone}",
+    "[监控] 运行状态正常，CPU 12.5%，内存 256MB，队列 0/1000",
+    "[插件] 插件加载完成，共 12 个插件，耗时 35ms",
+    "[系统] 机器人启动完成",
+    "[系统] 心跳正常",
+    "[调度] 无插件匹配，忽略消息",
+]
+
+
+def make_lines(rng, count=5000):
+    lines = []
+    for _ in range(count):
+        template = rng.choice(TEMPLATES)
+        lines.append(template.format(
+            qq=rng.randint(10000, 9999999999),
+            group=rng.randint(100000, 999999999),
+            short=rng.randint(1, 9999),
+            key=rng.choice("abcdefXYZ") + "".join(rng.choice("abcdefXYZ0123456789-_") for _ in range(rng.randint(2, 40))),
+            phone=f"1{rng.randint(3, 9)}{rng.randint(0, 999999999):09d}"))
+    return lines
+
+
+def main():
+    lines = make_lines(random.Random(42))
+    differences = [line for line in lines if sanitize_log(line) != legacy_sanitize(line)]
+    mismatches = [line for line in differences
+                  if normalize_secrets(sanitize_log(line)) != normalize_secrets(legacy_sanitize(line))]
+    for line in mismatches[:10]:
+        print(f"不一致：{line!r}\n  旧：{legacy_sanitize(line)!r}\n  新：{sanitize_log(line)!r}")
+    print(f"日志数：{len(lines)}，输出不一致：{len(mismatches)} 条，"
+          f"预期差异（旧实现漏出密钥后半段）：{len(differences) - len(mismatches)} 条")
+
+    def run_legacy():
+        for line in lines:
+            legacy_sanitize(line)
+
+    def run_combined():
+        for line in lines:
+            sanitize_log(line)
+
+    legacy_us = min(timeit.repeat(run_legacy, number=1, repeat=10)) / len(lines) * 1e6
+    combined_us = min(timeit.repeat(run_combined, number=1, repeat=10)) / len(lines) * 1e6
+    print(f"{'实现':>10} | {'耗时(us/条)':>12}")
+    print("-" * 28)
+    print(f"{'旧实现':>10} | {legacy_us:>12.2f}")
+    print(f"{'单次扫描':>10} | {combined_us:>12.2f}")
+    print(f"加速比：{legacy_us / combined_us:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
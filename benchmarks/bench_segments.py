@@ -0,0 +1,131 @@
+"""消息段解析基准测试
+对比旧实现（any()遍历消息数组判断@机器人，字符串消息退化为子串查找；插件再各自遍历取@列表/回复/图片）
+与一次解析的消息段（ParsedMessage）在消息数组和CQ码字符串两种格式下的耗时，并校验结果一致；
+另外对比构建事件时判断@机器人的耗时：旧实现、不解析消息段的 mentions_qq、完整解析后判断
+
+运行方式（项目根目录）：python benchmarks/bench_segments.py
+"""
+
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.segments import mentions_qq, parse_message  # noqa: E402
+
+ROBOT_QQ = "1972693082"
+_CQ_AT = re.compile(r"\[CQ:at,qq=(\d+|all)[^\]]*\]")
+_CQ_REPLY = re.compile(r"\[CQ:reply,id=(-?\d+)[^\]]*\]")
+_CQ_IMAGE = re.compile(r"\[CQ:image,[^\]]*?(?:url|file)=([^,\]]+)[^\]]*\]")
+
+
+def legacy_extract(data):
+    """旧实现：核心判断@机器人，插件需要@列表、回复、图片时再各自遍历一次原始结构"""
+    message = data["message"]
+    if isinstance(message, list):
+        is_at_bot = any(item.get("type") == "at" and str(item.get("data", {}).get("qq")) == ROBOT_QQ
+                        for item in message)
+        mentions = [str(item.get("data", {}).get("qq")) for item in message if item.get("type") == "at"]
+        reply_to = next((str(item["data"]["id"]) for item in message if item.get("type") == "reply"), None)
+        images = [item["data"].get("url") or item["data"].get("file") for item in message if item.get("type") == "image"]
+        plain_text = "".join(item["data"].get("text", "") for item in message if item.get("type") == "text").strip()
+    else:
+        raw = data["raw_message"]
+        is_at_bot = f"@{ROBOT_QQ}" in raw or f"[CQ:at,qq={ROBOT_QQ}" in raw
+        mentions = _CQ_AT.findall(raw)
+        reply = _CQ_REPLY.search(raw)
+        reply_to = reply.group(1) if reply else None
+        images = _CQ_IMAGE.findall(raw)
+        plain_text = re.sub(r"\[CQ:[^\]]*\]", "", raw).strip()
+    return is_at_bot, mentions, reply_to, images, plain_text
+
+
+def segment_extract(data):
+    parsed = parse_message(data["message"], data["raw_message"])
+    return parsed.is_at(ROBOT_QQ), list(parsed.mentions), parsed.reply_to, list(parsed.images), parsed.plain_text
+
+
+def make_events(rng, count=500):
+    """生成同一批消息的数组格式与CQ码字符串格式"""
+    array_events, string_events = [], []
+    for i in range(count):
+        segments, cq_parts = [], []
+        if rng.random() < 0.2:
+            msg_id = str(rng.randint(1, 10 ** 9))
+            segments.append({"type": "reply", "data": {"id": msg_id}})
+            cq_parts.append(f"[CQ:reply,id={msg_id}]")
+        for _ in range(rng.randint(0, 2)):
+            qq = rng.choice([ROBOT_QQ, str(rng.randint(10 ** 6, 10 ** 9)), "all"])
+            segments.append({"type": "at", "data": {"qq": qq}})
+            cq_parts.append(f"[CQ:at,qq={qq}]")
+        text = " " + "".join(rng.choice("今天大家好你在吗哈哈哈/状态查询abcxyz ") for _ in range(rng.randint(2, 40)))
+        segments.append({"type": "text", "data": {"text": text}})
+        cq_parts.append(text)
+        if rng.random() < 0.15:
+            url = f"https://example.invalid/img/{i}.jpg"
+            segments.append({"type": "image", "data": {"file": f"{i}.jpg", "url": url}})
+            cq_parts.append(f"[CQ:image,file={i}.jpg,url={url}]")
+        raw = "".join(cq_parts)
+        array_events.append({"message": segments, "raw_message": raw})
+        string_events.append({"message": raw, "raw_message": raw})
+    return array_events, string_events
+
+
+def main():
+    rng = random.Random(42)
+    array_events, string_events = make_events(rng)
+
+    # 正确性校验：两种实现、两种消息格式的提取结果一致
+    for arr, cq in zip(array_events, string_events):
+        expected = legacy_extract(arr)
+        assert segment_extract(arr) == expected, arr
+        assert segment_extract(cq) == expected, cq
+
+    print(f"{'消息格式':>8} | {'旧实现(us/条)':>14} | {'消息段解析(us/条)':>18} | {'加速比':>6}")
+    print("-" * 58)
+    for name, events in (("消息数组", array_events), ("CQ码字符串", string_events)):
+        def run_legacy():
+            for data in events:
+                legacy_extract(data)
+
+        def run_segments():
+            for data in events:
+                segment_extract(data)
+
+        legacy_us = min(timeit.repeat(run_legacy, number=1, repeat=20)) / len(events) * 1e6
+        segment_us = min(timeit.repeat(run_segments, number=1, repeat=20)) / len(events) * 1e6
+        print(f"{name:>8} | {legacy_us:>14.2f} | {segment_us:>18.2f} | {legacy_us / segment_us:>5.1f}x")
+
+    # 构建事件时只需判断是否@机器人，消息段在插件读取时才解析
+    for data in array_events + string_events:
+        assert mentions_qq(data["message"], data["raw_message"], ROBOT_QQ) == legacy_extract(data)[0], data
+    print()
+    print(f"{'消息格式':>8} | {'旧实现@判断(us/条)':>18} | {'mentions_qq(us/条)':>18} | {'完整解析(us/条)':>16}")
+    print("-" * 74)
+    for name, events in (("消息数组", array_events), ("CQ码字符串", string_events)):
+        def run_legacy_at():
+            for data in events:
+                message = data["message"]
+                if isinstance(message, list):
+                    any(item.get("type") == "at" and str(item.get("data", {}).get("qq")) == ROBOT_QQ for item in message)
+                else:
+                    f"[CQ:at,qq={ROBOT_QQ}" in data["raw_message"]
+
+        def run_mentions():
+            for data in events:
+                mentions_qq(data["message"], data["raw_message"], ROBOT_QQ)
+
+        def run_parse():
+            for data in events:
+                parse_message(data["message"], data["raw_message"]).is_at(ROBOT_QQ)
+
+        timings = [min(timeit.repeat(func, number=1, repeat=20)) / len(events) * 1e6
+                   for func in (run_legacy_at, run_mentions, run_parse)]
+        print(f"{name:>8} | {timings[0]:>18.2f} | {timings[1]:>18.2f} | {timings[2]:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -79,8 +79,9 @@ def get_logger_manager():
     return core.logger_manager
 
 # 导出主要工具函数和常量
-from .handler import callback_base, dispatch_plugin_cmd, register_plugin
-from .utils import send_http_msg, logger, sanitize_log
+from .handler import callback_base, dispatch_plugin_cmd, execute_plugin_cmd, register_plugin
+from .utils import send_http_msg, call_napcat_api, logger, sanitize_log
+from .event import Event
 
 # 版本信息
 __version__ = "1.8.0"
@@ -96,9 +97,13 @@ __all__ = [
     # 主要函数
     "callback_base",
     "dispatch_plugin_cmd",
+    "execute_plugin_cmd",
     "register_plugin",
     "send_http_msg",
+    "call_napcat_api",
     "sanitize_log",
+    # 消息事件
+    "Event",
     # 日志对象
     "logger",
     # 版本信息
@@ -0,0 +1,157 @@
+"""准入控制模块
+在指令分发前限制同时处理中的事件数量和排队时长，超限时按策略削减负载：
+1. 在途事件达到软上限（max_inflight × chatter_ratio）：丢弃群聊中与机器人无关的闲聊
+2. 在途事件达到硬上限：其余非主人事件回复固定的繁忙提示，不再调用AI
+3. 入队模式下排队超过max_queue_age的事件：丢弃闲聊，其余回复繁忙提示
+主人指令始终放行，保证高负载时运维可达；各削减原因的计数记录到monitor_manager
+繁忙提示由后台线程发送（有界队列，满时不再回复），被拒绝的线程不等待发送超时
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from core.config import AUTO_REPLIES
+from core.utils import logger, send_http_msg
+from core.config_manager import config_manager
+from core.monitor import monitor_manager
+from core.plugin_manager import plugin_manager
+
+# 等待发送的繁忙提示数量上限
+BUSY_REPLY_QUEUE_SIZE = 64
+
+
+class AdmissionController:
+    """准入控制器：统计在途事件数量，超限时执行削减策略"""
+
+    def __init__(self):
+        self.enabled = config_manager.get("admission_enabled", True)
+        self.max_inflight = config_manager.get("admission_max_inflight", 64)
+        self.soft_limit = int(self.max_inflight * config_manager.get("admission_chatter_ratio", 0.5))
+        self.max_queue_age = config_manager.get("admission_max_queue_age", 30)
+        self.busy_reply = config_manager.get("admission_busy_reply", "⏳ 当前消息较多，请稍后再试～")
+        self.busy_reply_cooldown = config_manager.get("admission_busy_reply_cooldown", 30)
+
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._peak_inflight = 0
+        self._last_busy_reply: Dict[str, float] = {}
+        self._busy_replies: "queue.Queue" = queue.Queue(maxsize=BUSY_REPLY_QUEUE_SIZE)
+        self._sender: Optional[threading.Thread] = None
+        self.shed_counts: Dict[str, int] = {}
+        self.busy_replies_dropped = 0
+
+        monitor_manager.register_metrics_provider("admission", self.get_stats)
+
+    @staticmethod
+    def is_group_chatter(parsed_data: Dict[str, Any]) -> bool:
+        """群聊闲聊：未@机器人、未命中自动回复和任何插件指令的群消息"""
+        if parsed_data["chat_type"] != "group" or parsed_data["is_at_bot"]:
+            return False
+        raw_msg = parsed_data["raw_msg"]
+        if raw_msg in AUTO_REPLIES:
+            return False
+        return plugin_manager.find_plugin(raw_msg, "group", parsed_data["sender_id"], False) is None
+
+    def try_admit(self, parsed_data: Dict[str, Any], lane: str) -> bool:
+        """尝试接纳事件，接纳后在途数量+1（处理结束必须调用release）
+        :param lane: 事件所属分发通道（master通道始终放行）
+        :return: 接纳返回True，被削减返回False
+        """
+        if not self.enabled or lane == "master":
+            self._acquire(None)
+            return True
+        # 比较和计数在同一次加锁中完成，并发接纳时不会越过上限
+        if self._acquire(self.soft_limit):
+            return True
+
+        chatter = self.is_group_chatter(parsed_data)
+        if not chatter and self._acquire(self.max_inflight):
+            return True
+        self.shed(parsed_data, "group_chatter" if chatter else "inflight_limit")
+        return False
+
+    def _acquire(self, limit: Optional[int]) -> bool:
+        """在途数量未达到limit时+1（limit为None表示不限制）"""
+        with self._lock:
+            if limit is not None and self._inflight >= limit:
+                return False
+            self._inflight += 1
+            if self._inflight > self._peak_inflight:
+                self._peak_inflight = self._inflight
+            return True
+
+    def release(self):
+        """事件处理结束（无论成功、失败或被削减于队列中）"""
+        with self._lock:
+            if self._inflight > 0:
+                self._inflight -= 1
+
+    def check_queue_age(self, parsed_data: Dict[str, Any], lane: str, wait_seconds: float) -> bool:
+        """入队模式下检查排队时长，过期事件执行削减
+        :return: 仍需处理返回True，已削减返回False
+        """
+        if not self.enabled or lane == "master" or not self.max_queue_age or wait_seconds <= self.max_queue_age:
+            return True
+        self.shed(parsed_data, "group_chatter" if self.is_group_chatter(parsed_data) else "queue_age")
+        return False
+
+    def shed(self, parsed_data: Dict[str, Any], reason: str):
+        """削减事件：闲聊直接丢弃，其余回复繁忙提示（同一会话有冷却时间，避免刷屏）"""
+        with self._lock:
+            self.shed_counts[reason] = self.shed_counts.get(reason, 0) + 1
+        monitor_manager.record_event_shed(reason)
+
+        if reason == "group_chatter":
+            logger.debug(f"[准入控制] 负载过高，丢弃群聊闲聊（群ID：{parsed_data['target_id']}）")
+            return
+
+        logger.warning(f"[准入控制] 负载过高（原因：{reason}，在途：{self._inflight}），"
+                       f"回复繁忙提示（会话：{parsed_data['target_id']}）")
+        if not self.busy_reply:
+            return
+        target = parsed_data["target_id"]
+        now = time.time()
+        with self._lock:
+            if now - self._last_busy_reply.get(target, 0) < self.busy_reply_cooldown:
+                return
+            self._last_busy_reply[target] = now
+            if len(self._last_busy_reply) > 1000:
+                self._last_busy_reply = {k: v for k, v in self._last_busy_reply.items()
+                                         if now - v < self.busy_reply_cooldown}
+            if self._sender is None:
+                self._sender = threading.Thread(target=self._sender_loop, name="busy-reply", daemon=True)
+                self._sender.start()
+        try:
+            self._busy_replies.put_nowait((target, parsed_data["chat_type"]))
+        except queue.Full:
+            with self._lock:
+                self.busy_replies_dropped += 1
+
+    def _sender_loop(self):
+        """后台发送繁忙提示（发送可能等待Napcat超时，不占用被拒绝事件所在的线程）"""
+        while True:
+            target, chat_type = self._busy_replies.get()
+            try:
+                send_http_msg(target, self.busy_reply, chat_type)
+            except Exception as e:
+                logger.error(f"[准入控制] 发送繁忙提示失败：{str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """在途事件数量与各原因的削减计数"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "inflight": self._inflight,
+                "peak_inflight": self._peak_inflight,
+                "max_inflight": self.max_inflight,
+                "chatter_limit": self.soft_limit,
+                "max_queue_age_seconds": self.max_queue_age,
+                "shed": dict(self.shed_counts),
+                "busy_replies_dropped": self.busy_replies_dropped
+            }
+
+
+# 全局准入控制实例
+admission_controller = AdmissionController()
@@ -0,0 +1,313 @@
+"""异步服务模块
+基于aiohttp的asyncio服务入口，替代Werkzeug开发服务器：
+- 异步回调处理：等待插件/AI回复时不占用线程
+- 异步Napcat客户端：复用连接池发送消息
+- 同步插件通过线程池执行器桥接运行，提供异步入口的插件（async_handler）直接在事件循环中执行
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from core.config import NAPCAT_HTTP_URL
+from core.config_manager import config_manager
+from core.utils import logger, logger_manager
+from core.monitor import monitor_manager, register_async_health_check_routes
+from core.dispatcher import event_dispatcher
+from core.dedup import event_deduplicator
+from core.admission import admission_controller
+from core.transport import napcat_transport, NapcatApiError
+from core.event import call_plugin_handler
+from core import request_log
+from core.handler import (
+    process_callback_data,
+    audit_message_received,
+    handle_builtin_cmd,
+    match_plugin,
+    run_plugin,
+    record_plugin_result,
+    needs_fallback_reply,
+    get_fallback_reply_target,
+    admit_event,
+    acquire_rate_quota,
+    plugin_rate_category,
+    fallback_needs_ai
+)
+
+
+class AsyncNapcatClient:
+    """异步HTTP客户端：Napcat消息发送与插件外部请求共用同一个aiohttp连接池"""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """获取（必要时创建）共享的ClientSession，必须在事件循环中调用"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10),
+                json_serialize=partial(json.dumps, ensure_ascii=False)
+            )
+        return self._session
+
+    async def send_msg(self, target: str, content: str, chat_type: str = "private") -> bool:
+        """异步发送私聊/群聊消息（与send_http_msg语义一致）
+        :return: 发送成功返回True，失败返回False
+        """
+        log_context = {
+            "target": target,
+            "chat_type": chat_type,
+            "content_preview": content[:50] + ("..." if len(content) > 50 else "")
+        }
+        if not target or not content:
+            logger_manager.log_with_context(logger, logging.ERROR, "[消息发送] 目标或内容不能为空", context=log_context)
+            return False
+
+        if chat_type == "private":
+            action = "send_private_msg"
+            params = {"user_id": int(target), "message": content}
+        else:
+            action = "send_group_msg"
+            params = {"group_id": int(target), "message": content}
+
+        send_start = time.perf_counter()
+        try:
+            with request_log.stage("send"):
+                if napcat_transport.is_ws():
+                    result = await napcat_transport.ws.call_api_async(action, params)
+                else:
+                    session = await self.get_session()
+                    async with session.post(f"{NAPCAT_HTTP_URL}/{action}", json=params) as response:
+                        response.raise_for_status()
+                        result = await response.json(content_type=None)
+        except NapcatApiError as e:
+            logger_manager.log_with_context(logger, logging.ERROR, f"[消息发送] WebSocket调用失败: {str(e)}", context=log_context)
+            return False
+        except asyncio.TimeoutError:
+            logger_manager.log_with_context(logger, logging.ERROR, "[消息发送] 请求超时（10秒）", context=log_context)
+            return False
+        except aiohttp.ClientError as e:
+            logger_manager.log_with_context(logger, logging.ERROR, f"[消息发送] 请求失败: {str(e)}", context=log_context)
+            return False
+        finally:
+            monitor_manager.record_latency("napcat_send", time.perf_counter() - send_start)
+
+        if result.get("retcode") == 0:
+            logger_manager.log_with_context(logger, logging.INFO, f"[消息发送] 成功发送{chat_type}消息", context=log_context)
+            return True
+        log_context['error_msg'] = result.get('msg', '未知错误')
+        logger_manager.log_with_context(logger, logging.ERROR, f"[消息发送] {chat_type}消息发送失败", context=log_context)
+        return False
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# 全局异步客户端（插件可通过 from core.async_server import async_client 复用）
+async_client = AsyncNapcatClient()
+
+
+def _handle_builtin_and_match(parsed_data: Dict[str, Any]) -> Tuple[bool, Optional[Dict]]:
+    """同步阶段：审计、内置命令、插件匹配（在线程池中执行）
+    :return: (是否已被内置命令处理, 匹配到的插件)
+    """
+    audit_message_received(parsed_data)
+    if handle_builtin_cmd(parsed_data):
+        return True, None
+    matched_plugin = match_plugin(parsed_data)
+    if matched_plugin and not acquire_rate_quota(
+            parsed_data, plugin_rate_category(matched_plugin, parsed_data["raw_msg"])):
+        # 被多级限流拒绝：视为已处理，不再进入AI兜底
+        return True, None
+    return False, matched_plugin
+
+
+class AsyncServer:
+    """asyncio服务：异步回调处理 + 同步插件执行器桥接"""
+
+    def __init__(self):
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    async def run_sync(self, func, *args):
+        """在线程池中执行同步函数（同步插件、文件IO等阻塞操作）
+        复制当前上下文执行，请求摘要等上下文变量在线程中同样可见
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(contextvars.copy_context().run, func, *args))
+
+    async def dispatch(self, parsed_data: Dict[str, Any]) -> bool:
+        """异步指令分发，执行流程与execute_plugin_cmd一致
+        :return: 是否被内置命令或插件处理
+        """
+        handled, matched_plugin = await self.run_sync(_handle_builtin_and_match, parsed_data)
+
+        if not handled and matched_plugin:
+            async_handler = matched_plugin.get("async_handler_func")
+            if async_handler:
+                plugin_start_time = time.time()
+                try:
+                    with request_log.stage("plugin"):
+                        await call_plugin_handler(matched_plugin, async_handler, parsed_data,
+                                                  async_client.send_msg, logger)
+                    handled = True
+                    error = None
+                except Exception as e:
+                    error = e
+                await self.run_sync(record_plugin_result, matched_plugin, parsed_data,
+                                    time.time() - plugin_start_time, error)
+            else:
+                handled = await self.run_sync(run_plugin, matched_plugin, parsed_data)
+
+        if not handled and needs_fallback_reply(parsed_data):
+            if not fallback_needs_ai(parsed_data) or await self.run_sync(acquire_rate_quota, parsed_data, "ai"):
+                await self._fallback_reply(parsed_data)
+
+        request_log.note(handled=handled)
+        logger.info(f"[指令分发] 指令「{parsed_data['raw_msg'][:20]}...」处理完成（handled：{handled}）")
+        return handled
+
+    async def _fallback_reply(self, parsed_data: Dict[str, Any]):
+        """自动回复/AI对话兜底（异步执行，AI请求不占用线程）"""
+        try:
+            from plugins.OpenAI_plugin.OpenAI_plugin import handle_auto_reply_async
+        except ImportError:
+            logger.warning("⚠️ OpenAI插件未加载，自动回复功能失效")
+            return
+
+        nickname = parsed_data.get("nickname") or "用户"
+        auto_reply = await handle_auto_reply_async(parsed_data["raw_msg"], parsed_data["sender_id"], nickname)
+        if auto_reply:
+            target, chat_type = get_fallback_reply_target(parsed_data)
+            await async_client.send_msg(target, auto_reply, chat_type)
+
+    async def handle_callback(self, request: web.Request) -> web.Response:
+        """回调接口（与Flask版本的状态码和响应保持一致）"""
+        context = {
+            'client_ip': request.remote,
+            'request_id': str(time.time())[-6:],
+            'path': request.path
+        }
+        # 请求摘要（log_canonical_requests开启时，处理结束输出一行摘要；入队的请求由工作线程输出）
+        request_log.begin(context['request_id'], path=request.path, source="http")
+        try:
+            return await self._handle_callback(request, context)
+        finally:
+            request_log.finish()
+
+    async def _handle_callback(self, request: web.Request, context: Dict[str, Any]) -> web.Response:
+        monitor_manager.record_message_received()
+        start_time = time.time()
+        logger_manager.log_with_context(logger, logging.INFO, '请求开始处理', context)
+
+        if request.content_type != 'application/json':
+            logger_manager.log_with_context(logger, logging.WARNING, f"不支持的Content-Type: {request.content_type}", context)
+            monitor_manager.record_message_error()
+            return web.json_response({"retcode": 415, "msg": "仅支持application/json格式"}, status=415)
+
+        # 按Content-Length提前拒绝超大请求（不读取、不解析请求体）
+        max_body = config_manager.get("callback_max_body_bytes", 262144)
+        if request.content_length and request.content_length > max_body:
+            logger_manager.log_with_context(logger, logging.WARNING,
+                                            f"请求体过大: {request.content_length} 字节（上限 {max_body}）", context)
+            monitor_manager.record_message_error()
+            return web.json_response({"retcode": 413, "msg": f"请求体过大（上限 {max_body} 字节）"}, status=413)
+
+        try:
+            with request_log.stage("parse"):
+                json_data = await request.json()
+        except Exception as json_err:
+            logger_manager.log_with_context(logger, logging.ERROR, f"JSON解析失败: {str(json_err)}", context)
+            monitor_manager.record_message_error()
+            return web.json_response({"retcode": 400, "msg": "JSON解析错误"}, status=400)
+        if json_data is None:
+            logger_manager.log_with_context(logger, logging.ERROR, "请求体无法解析为JSON格式", context)
+            monitor_manager.record_message_error()
+            return web.json_response({"retcode": 400, "msg": "无效的JSON格式"}, status=400)
+
+        try:
+            with request_log.stage("base"):
+                parsed_data, body, status = await self.run_sync(process_callback_data, json_data, request.remote)
+        except Exception as base_err:
+            logger_manager.log_with_context(logger, logging.ERROR, f"基础处理函数异常: {str(base_err)}",
+                                            context, exc_info=True)
+            monitor_manager.record_message_error()
+            return web.json_response({"retcode": 500, "msg": "处理过程异常"}, status=500)
+
+        if parsed_data is None:
+            monitor_manager.record_message_processed(time.time() - start_time)
+            request_log.note(outcome="ignored" if status < 400 else "rejected", status=status)
+            logger_manager.log_with_context(logger, logging.INFO, '非消息请求，已正常处理', context)
+            return web.json_response(body, status=status)
+
+        # 准入控制（削减时可能同步发送繁忙提示，放到线程池执行）
+        lane = await self.run_sync(admit_event, parsed_data)
+        if lane is None:
+            monitor_manager.record_message_processed(time.time() - start_time)
+            request_log.note(outcome="shed")
+            return web.json_response({"retcode": 0})
+
+        # 入队模式：交给分发工作线程池，立即返回
+        if event_dispatcher.is_enabled():
+            if event_dispatcher.submit(parsed_data, received_at=start_time, lane_name=lane):
+                return web.json_response({"retcode": 0})
+            monitor_manager.record_message_error()
+            request_log.note(outcome="busy")
+            # 未被接受的事件移除去重记录，Napcat重试时重新处理
+            event_deduplicator.forget(parsed_data.data)
+            return web.json_response({"retcode": 503, "msg": "服务繁忙，请稍后再试"}, status=503)
+
+        try:
+            with request_log.stage("dispatch"):
+                await self.dispatch(parsed_data)
+        except Exception as dispatch_err:
+            logger_manager.log_with_context(logger, logging.ERROR, f"命令分发异常: {str(dispatch_err)}",
+                                            context, exc_info=True)
+            monitor_manager.record_message_error()
+            return web.json_response({"retcode": 500, "msg": "服务繁忙，请稍后再试"}, status=500)
+        finally:
+            admission_controller.release()
+
+        monitor_manager.record_message_processed(time.time() - start_time)
+        request_log.note(outcome="ok")
+        logger_manager.log_with_context(logger, logging.INFO, '请求处理成功', context)
+        return web.json_response({"retcode": 0})
+
+    async def _on_startup(self, app: web.Application):
+        """启动时创建执行器，并设为事件循环默认执行器（插件内run_in_executor(None, ...)共用）"""
+        workers = config_manager.get("async_executor_workers", 16)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="async-bridge")
+        asyncio.get_running_loop().set_default_executor(self.executor)
+        logger.info(f"📌 asyncio服务已启动（同步插件执行器线程数：{workers}）")
+
+    async def _on_cleanup(self, app: web.Application):
+        """关闭时释放连接池与执行器"""
+        await async_client.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def create_app(self) -> web.Application:
+        """创建aiohttp应用并注册路由"""
+        app = web.Application()
+        app.router.add_post('/callback', self.handle_callback)
+        register_async_health_check_routes(app, self.run_sync)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    def run(self, host: str = '0.0.0.0', port: int = 3002):
+        """启动asyncio服务（阻塞直到退出，信号处理沿用bot.py中的注册）"""
+        web.run_app(self.create_app(), host=host, port=port, handle_signals=False, print=None, access_log=None)
+
+
+# 全局异步服务实例
+async_server = AsyncServer()
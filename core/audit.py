@@ -0,0 +1,269 @@
+"""审计日志模块
+审计事件在请求线程中只追加到内存环形缓冲区（deque追加为原子操作，不加锁），
+由后台写入线程批量取出，写入按大小轮转的SQLite（WAL模式）审计库：
+- 缓冲区满时丢弃最旧的未写入事件并计数，不阻塞请求线程
+- 审计库只追加写入，超过 audit_max_bytes 后轮转为 audit.db.1 ~ audit.db.N
+- 按用户、操作、时间范围查询（user_id/action/timestamp均有索引），供主人 /审计 指令使用
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from core.config_manager import config_manager
+from core.logger_manager import logger_manager, LOG_DIR
+
+logger = logger_manager.get_logger("security")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    user_id TEXT,
+    role TEXT,
+    action TEXT,
+    resource TEXT,
+    success INTEGER,
+    event_type TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audit_user_ts ON audit_log (user_id, ts);
+CREATE INDEX IF NOT EXISTS idx_audit_action_ts ON audit_log (action, ts);
+CREATE INDEX IF NOT EXISTS idx_audit_ts ON audit_log (ts);
+"""
+_COLUMNS = ("ts", "user_id", "role", "action", "resource", "success", "event_type", "details")
+
+
+class AuditLog:
+    """异步批量审计日志：环形缓冲区 + 后台写入线程 + 轮转SQLite审计库"""
+
+    def __init__(self):
+        self.enabled = config_manager.get("audit_enabled", True)
+        self.batch_size = config_manager.get("audit_batch_size", 200)
+        self.flush_interval = config_manager.get("audit_flush_interval", 1.0)
+        self.max_bytes = config_manager.get("audit_max_bytes", 10 * 1024 * 1024)
+        self.backup_count = config_manager.get("audit_backup_count", 5)
+        db_path = config_manager.get("audit_db_path", "") or os.path.join(LOG_DIR, "audit.db")
+        self.db_path = os.path.abspath(db_path)
+
+        self._buffer: deque = deque(maxlen=config_manager.get("audit_buffer_size", 10000))
+        self._wakeup = threading.Event()
+        self._db_lock = threading.Lock()  # 保护数据库连接（写入线程、查询、同步flush共用）
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._running = False
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.rotations = 0
+        self.write_errors = 0
+
+    # ---------- 写入端（请求线程） ----------
+    def record(self, entry: Dict[str, Any]) -> None:
+        """追加一条审计事件（不阻塞，缓冲区满时挤掉最旧的未写入事件）"""
+        if not self.enabled:
+            return
+        if not self._running:
+            self._start()
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            self.dropped += 1
+        buffer.append(entry)
+        if len(buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _start(self):
+        """首次记录时启动后台写入线程（避免仅导入模块就创建审计库）
+        监控管理器依赖core.utils，而core.utils经security_manager导入本模块，因此在此处才注册指标
+        """
+        with self._start_lock:
+            if self._running:
+                return
+            from core.monitor import monitor_manager
+            monitor_manager.register_metrics_provider("audit", self.get_stats)
+            self._running = True
+            self._writer = threading.Thread(target=self._writer_loop, name="audit-writer", daemon=True)
+            self._writer.start()
+
+    # ---------- 后台写入线程 ----------
+    def _writer_loop(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch = []
+        buffer = self._buffer
+        while buffer and len(batch) < self.batch_size:
+            try:
+                batch.append(buffer.popleft())
+            except IndexError:
+                break
+        return batch
+
+    def flush(self) -> int:
+        """将缓冲区中的事件全部写入审计库
+        :return: 本次写入条数
+        """
+        total = 0
+        with self._db_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                try:
+                    self._write_batch(batch)
+                    total += len(batch)
+                except Exception as e:
+                    self.write_errors += 1
+                    logger.error(f"[审计日志] 批量写入失败（{len(batch)}条已丢弃）：{str(e)}")
+                    self._close_conn()
+                    break
+        return total
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        conn = self._get_conn()
+        rows = [(
+            entry.get("ts", time.time()),
+            entry.get("user_id"),
+            entry.get("role"),
+            entry.get("action"),
+            entry.get("resource"),
+            None if entry.get("success") is None else int(bool(entry["success"])),
+            entry.get("event_type"),
+            json.dumps(entry["details"], ensure_ascii=False, default=str) if entry.get("details") else None
+        ) for entry in batch]
+        with conn:
+            conn.executemany(
+                f"INSERT INTO audit_log ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", rows)
+        self.written += len(rows)
+        self.batches += 1
+
+        # 失败的操作（权限不足等）仍输出到日志，便于实时告警
+        for entry in batch:
+            if entry.get("success") is False:
+                logger.warning(f"[审计日志] 用户 {entry.get('user_id')} 操作 {entry.get('action')} "
+                               f"失败（资源：{entry.get('resource')}）")
+
+        if self.max_bytes and self._db_size() >= self.max_bytes:
+            self._rotate()
+
+    def _db_size(self) -> int:
+        """审计库占用大小（WAL模式下未checkpoint的数据在-wal文件中）"""
+        return sum(os.path.getsize(path) for path in (self.db_path, self.db_path + "-wal") if os.path.exists(path))
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _close_conn(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _rotate(self):
+        """轮转审计库：audit.db -> audit.db.1 -> ... -> audit.db.N（最旧的删除）"""
+        conn = self._get_conn()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._close_conn()
+        for idx in range(self.backup_count, 0, -1):
+            src = self.db_path if idx == 1 else f"{self.db_path}.{idx - 1}"
+            dst = f"{self.db_path}.{idx}"
+            if os.path.exists(src):
+                os.replace(src, dst)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(self.db_path + suffix):
+                os.remove(self.db_path + suffix)
+        if not self.backup_count and os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        self.rotations += 1
+        logger.info(f"[审计日志] 审计库已轮转（保留 {self.backup_count} 个历史文件）")
+
+    # ---------- 查询 ----------
+    def query(self, user_id: Optional[str] = None, action: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              limit: int = 20) -> List[Dict[str, Any]]:
+        """按用户、操作、时间范围查询审计事件（新的在前，依次查询当前库和历史库直到满足条数）
+        :param since/until: 时间范围（Unix时间戳）
+        """
+        self.flush()
+        conditions, params = [], []
+        for column, value in (("user_id", user_id), ("action", action)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(str(value))
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("ts <= ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM audit_log {where} ORDER BY ts DESC, id DESC LIMIT ?"
+
+        results: List[Dict[str, Any]] = []
+        paths = [self.db_path] + [f"{self.db_path}.{idx}" for idx in range(1, self.backup_count + 1)]
+        for path in paths:
+            if len(results) >= limit or not os.path.exists(path):
+                continue
+            try:
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                try:
+                    rows = conn.execute(sql, params + [limit - len(results)]).fetchall()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"[审计日志] 查询 {os.path.basename(path)} 失败：{str(e)}")
+                continue
+            for row in rows:
+                entry = dict(zip(_COLUMNS, row))
+                entry["success"] = None if entry["success"] is None else bool(entry["success"])
+                entry["details"] = json.loads(entry["details"]) if entry["details"] else None
+                results.append(entry)
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓冲区积压与写入统计"""
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._buffer),
+            "buffer_capacity": self._buffer.maxlen,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "rotations": self.rotations,
+            "write_errors": self.write_errors,
+            "db_size_bytes": self._db_size()
+        }
+
+    def shutdown(self, timeout: float = 5):
+        """停止写入线程并写完缓冲区中剩余的事件"""
+        if self._running:
+            self._running = False
+            self._wakeup.set()
+            if self._writer is not None:
+                self._writer.join(timeout=timeout)
+        self.flush()
+        with self._db_lock:
+            self._close_conn()
+
+
+# 全局审计日志实例
+audit_log = AuditLog()
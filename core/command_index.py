@@ -0,0 +1,120 @@
+"""插件指令索引模块
+将插件注册池编译为Aho-Corasick自动机，单次扫描消息即可完成指令匹配：
+- 按（聊天类型, 是否主人, 是否@机器人）分桶，每个桶只包含该场景下可用的插件指令
+- 自动机每个状态预先计算"可命中的最小注册序号"，保证与逐个遍历注册池的优先级一致
+"""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+class _Automaton:
+    """Aho-Corasick自动机：输出值为命中指令所属插件的最小注册序号"""
+
+    __slots__ = ("goto", "fail", "best")
+
+    def __init__(self, patterns: Dict[str, int]):
+        """
+        :param patterns: {指令: 该指令对应的最小插件注册序号}
+        """
+        self.goto: List[Dict[str, int]] = [{}]
+        self.best: List[Optional[int]] = [None]
+        for pattern, order in patterns.items():
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.best.append(None)
+                state = nxt
+            # 空指令挂在根状态上：与 "" in raw_msg 恒为真的旧行为一致
+            if self.best[state] is None or order < self.best[state]:
+                self.best[state] = order
+
+        # BFS构建失败指针，并沿失败链合并输出（取最小注册序号）
+        self.fail: List[int] = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                inherited = self.best[self.fail[nxt]]
+                if inherited is not None and (self.best[nxt] is None or inherited < self.best[nxt]):
+                    self.best[nxt] = inherited
+                queue.append(nxt)
+
+    def search(self, text: str) -> Optional[int]:
+        """单次扫描文本，返回命中指令中最小的插件注册序号（无命中返回None）"""
+        goto, fail, best = self.goto, self.fail, self.best
+        result = best[0]
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            order = best[state]
+            if order is not None and (result is None or order < result):
+                result = order
+                if result == 0:
+                    break
+        return result
+
+
+class CommandIndex:
+    """插件指令索引：注册池变化后调用rebuild，匹配时按场景分桶惰性编译自动机"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (插件快照, 分桶自动机) 作为整体替换，匹配线程不会读到新旧混合的状态
+        self._state: Tuple[List[Dict], Dict[Tuple[str, bool, bool], _Automaton]] = ([], {})
+
+    def rebuild(self, plugins: List[Dict]) -> None:
+        """根据注册池重建索引（保留注册顺序作为匹配优先级）"""
+        with self._lock:
+            self._state = (list(plugins), {})
+
+    @property
+    def size(self) -> int:
+        """已索引的插件数量"""
+        return len(self._state[0])
+
+    @staticmethod
+    def _build_bucket(plugins: List[Dict], key: Tuple[str, bool, bool]) -> _Automaton:
+        chat_type, is_master, is_at_bot = key
+        patterns: Dict[str, int] = {}
+        for order, plugin in enumerate(plugins):
+            # 过滤规则与逐个遍历时一致：场景、主人权限、群聊@要求
+            if chat_type not in plugin["chat_type"]:
+                continue
+            if plugin["permission"] == "master" and not is_master:
+                continue
+            if chat_type == "group" and plugin.get("is_at_required", False) and not is_at_bot:
+                continue
+            for cmd in plugin["commands"]:
+                if cmd not in patterns:
+                    patterns[cmd] = order
+        return _Automaton(patterns)
+
+    def match(self, raw_msg: str, chat_type: str, is_master: bool, is_at_bot: bool) -> Optional[Dict]:
+        """匹配消息对应的插件
+        :return: 注册顺序最靠前的可用插件，无匹配返回None
+        """
+        plugins, buckets = self._state
+        key = (chat_type, is_master, is_at_bot and chat_type == "group")
+        automaton = buckets.get(key)
+        if automaton is None:
+            with self._lock:
+                automaton = buckets.get(key)
+                if automaton is None:
+                    automaton = self._build_bucket(plugins, key)
+                    buckets[key] = automaton
+        order = automaton.search(raw_msg)
+        return plugins[order] if order is not None else None
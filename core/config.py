@@ -83,6 +83,330 @@ config_manager.register_config(ConfigItem(
     validate_func=lambda x: x in ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
 ))
 
+config_manager.register_config(ConfigItem(
+    key="dispatch_mode",
+    default="sync",
+    description="指令分发模式（sync=请求线程内同步执行，queue=入队后由工作线程池异步执行）",
+    validate_func=lambda x: x in ["sync", "queue"]
+))
+config_manager.register_config(ConfigItem(
+    key="dispatch_workers",
+    default=4,
+    description="异步分发工作线程数（ai通道）",
+    validate_func=lambda x: isinstance(x, int) and 1 <= x <= 64
+))
+config_manager.register_config(ConfigItem(
+    key="dispatch_queue_size",
+    default=1000,
+    description="异步分发队列容量（ai通道，队列满时拒绝新事件）",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="dispatch_lanes",
+    default={"master": {"workers": 1, "queue_size": 100}, "command": {"workers": 2, "queue_size": 500}},
+    description="入队模式下master/command通道的线程数和队列容量（ai通道使用dispatch_workers/dispatch_queue_size）",
+    validate_func=lambda x: isinstance(x, dict)
+))
+config_manager.register_config(ConfigItem(
+    key="admission_enabled",
+    default=True,
+    description="是否启用准入控制（超限时削减负载）"
+))
+config_manager.register_config(ConfigItem(
+    key="admission_max_inflight",
+    default=64,
+    description="同时处理中（含排队）的事件上限，超过后非主人事件回复繁忙提示",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="admission_chatter_ratio",
+    default=0.5,
+    description="在途事件达到上限的该比例时开始丢弃群聊闲聊",
+    validate_func=lambda x: isinstance(x, (int, float)) and 0 < x <= 1
+))
+config_manager.register_config(ConfigItem(
+    key="admission_max_queue_age",
+    default=30,
+    description="入队模式下事件最长排队时间（秒，0为不限制）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x >= 0
+))
+config_manager.register_config(ConfigItem(
+    key="admission_busy_reply",
+    default="⏳ 当前消息较多，请稍后再试～",
+    description="负载过高时的繁忙提示（留空则静默丢弃）"
+))
+config_manager.register_config(ConfigItem(
+    key="admission_busy_reply_cooldown",
+    default=30,
+    description="同一会话繁忙提示的冷却时间（秒）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x >= 0
+))
+config_manager.register_config(ConfigItem(
+    key="server_mode",
+    default="flask",
+    description="回调服务模式（flask=Werkzeug线程服务，asyncio=aiohttp异步服务）",
+    validate_func=lambda x: x in ["flask", "asyncio"]
+))
+config_manager.register_config(ConfigItem(
+    key="async_executor_workers",
+    default=16,
+    description="asyncio模式下运行同步插件的线程池大小",
+    validate_func=lambda x: isinstance(x, int) and 1 <= x <= 256
+))
+config_manager.register_config(ConfigItem(
+    key="napcat_transport",
+    default="http",
+    description="Napcat传输方式（http=POST回调+HTTP API，ws=WebSocket长连接）",
+    validate_func=lambda x: x in ["http", "ws"]
+))
+config_manager.register_config(ConfigItem(
+    key="napcat_ws_mode",
+    default="forward",
+    description="WebSocket模式（forward=机器人连接Napcat，reverse=Napcat连接机器人）",
+    validate_func=lambda x: x in ["forward", "reverse"]
+))
+config_manager.register_config(ConfigItem(
+    key="napcat_ws_url",
+    default="ws://localhost:3001",
+    description="正向WebSocket地址（Napcat的WS服务）"
+))
+config_manager.register_config(ConfigItem(
+    key="napcat_ws_listen_port",
+    default=3003,
+    description="反向WebSocket监听端口",
+    validate_func=lambda x: isinstance(x, int) and 1 <= x <= 65535
+))
+config_manager.register_config(ConfigItem(
+    key="napcat_access_token",
+    default="",
+    description="Napcat访问令牌（WebSocket鉴权，留空不校验）"
+))
+config_manager.register_config(ConfigItem(
+    key="napcat_ws_timeout",
+    default=10,
+    description="WebSocket API调用超时时间（秒）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="napcat_ws_max_pending",
+    default=128,
+    description="WebSocket传输中等待处理的事件数上限（超出时丢弃新事件，防止积压耗尽内存）",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="dedup_enabled",
+    default=True,
+    description="是否丢弃Napcat重复投递的事件"
+))
+config_manager.register_config(ConfigItem(
+    key="dedup_cache_size",
+    default=4096,
+    description="事件去重缓存容量（条）",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="dedup_ttl_seconds",
+    default=120,
+    description="事件去重窗口（秒）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="rate_limit_per_minute",
+    default=60,
+    description="单个用户每分钟最多消息数（0为不限制）",
+    validate_func=lambda x: isinstance(x, int) and x >= 0
+))
+config_manager.register_config(ConfigItem(
+    key="rate_limit_per_hour",
+    default=1000,
+    description="单个用户每小时最多消息数（0为不限制）",
+    validate_func=lambda x: isinstance(x, int) and x >= 0
+))
+config_manager.register_config(ConfigItem(
+    key="rate_limit_source_per_minute",
+    default=1200,
+    description="单个回调来源（Napcat地址/WebSocket连接）每分钟最多事件数（0为不限制）",
+    validate_func=lambda x: isinstance(x, int) and x >= 0
+))
+config_manager.register_config(ConfigItem(
+    key="rate_limit_source_per_hour",
+    default=0,
+    description="单个回调来源每小时最多事件数（0为不限制）",
+    validate_func=lambda x: isinstance(x, int) and x >= 0
+))
+config_manager.register_config(ConfigItem(
+    key="rate_limit_tiers",
+    default={
+        "ai": {
+            "global": {"per_minute": 30, "per_hour": 600},
+            "group": {"per_minute": 10, "per_hour": 200},
+            "user": {"per_minute": 5, "per_hour": 60}
+        },
+        "command": {
+            "global": {"per_minute": 300, "per_hour": 0},
+            "group": {"per_minute": 60, "per_hour": 0},
+            "user": {"per_minute": 20, "per_hour": 0}
+        }
+    },
+    description="AI调用/插件指令的全局、群、用户多级限流（每分钟/每小时次数，0为不限制，主人不受限）",
+    validate_func=lambda x: isinstance(x, dict)
+))
+config_manager.register_config(ConfigItem(
+    key="state_backend",
+    default="memory",
+    description="频率限制计数器和黑名单的状态后端（memory=进程内，sqlite=同一主机多进程共享）",
+    validate_func=lambda x: x in ["memory", "sqlite"]
+))
+config_manager.register_config(ConfigItem(
+    key="state_backend_path",
+    default="",
+    description="共享状态库路径（SQLite，留空为 logs/state.db，多个进程需配置为同一路径）"
+))
+config_manager.register_config(ConfigItem(
+    key="callback_max_body_bytes",
+    default=262144,
+    description="回调请求体大小上限（字节，按Content-Length提前拒绝，返回413）",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="input_max_string_length",
+    default=5000,
+    description="事件中单个字符串字段的最大长度（含嵌套消息段）",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="input_max_total_chars",
+    default=50000,
+    description="单个事件所有字符串字段的总长度上限",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="input_max_segments",
+    default=200,
+    description="单条消息的最大消息段数量",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="content_filter_rules",
+    default=[],
+    description="内容过滤的追加规则（每条含id/pattern/category/message，同ID覆盖内置规则，pattern为空则禁用）",
+    validate_func=lambda x: isinstance(x, list)
+))
+config_manager.register_config(ConfigItem(
+    key="log_async",
+    default=True,
+    description="是否异步写日志（请求线程只入队，后台线程批量脱敏、格式化和写出）"
+))
+config_manager.register_config(ConfigItem(
+    key="log_queue_size",
+    default=10000,
+    description="异步日志缓冲区容量（条，达到3/4后先丢弃DEBUG日志，写满后丢弃其他日志）",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="log_batch_size",
+    default=256,
+    description="异步日志单批写出条数",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="log_flush_interval",
+    default=0.2,
+    description="异步日志写出间隔（秒，ERROR及以上级别的日志立即唤醒写出）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="log_archive_enabled",
+    default=True,
+    description="是否将轮转出的日志压缩为带索引的归档文件（供 /日志查询 使用）"
+))
+config_manager.register_config(ConfigItem(
+    key="log_archive_block_bytes",
+    default=65536,
+    description="日志归档的压缩块大小（字节，查询时按块解压）",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="log_sampling_enabled",
+    default=False,
+    description="是否按调用点限流INFO及以下日志（被省略的条数每个时间窗口汇总输出一次；默认关闭，开启后权限、安全等INFO日志同样会被限流）"
+))
+config_manager.register_config(ConfigItem(
+    key="log_site_limit",
+    default=30,
+    description="每个日志调用点每个时间窗口最多输出的INFO及以下日志条数（0为不限制）",
+    validate_func=lambda x: isinstance(x, int) and x >= 0
+))
+config_manager.register_config(ConfigItem(
+    key="log_site_window",
+    default=60,
+    description="日志采样的时间窗口（秒）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="log_site_rules",
+    default={},
+    description="按调用点覆盖采样上限（键为“文件名:行号”或“文件名”，值为条数，-1不限制，0全部省略）",
+    validate_func=lambda x: isinstance(x, dict)
+))
+config_manager.register_config(ConfigItem(
+    key="log_canonical_requests",
+    default=False,
+    description="是否为每个请求只输出一行结构化摘要（阶段耗时、结果、插件），请求内的INFO及以下日志折叠进摘要"
+))
+config_manager.register_config(ConfigItem(
+    key="debug_trace_default_minutes",
+    default=10,
+    description="/调试追踪 未指定时长时的追踪时长（分钟）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="debug_trace_max_minutes",
+    default=60,
+    description="单条调试追踪的最长时长（分钟，到期后自动关闭并恢复日志级别）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="audit_enabled",
+    default=True,
+    description="是否将审计事件写入审计库"
+))
+config_manager.register_config(ConfigItem(
+    key="audit_db_path",
+    default="",
+    description="审计库路径（SQLite，留空为 logs/audit.db）"
+))
+config_manager.register_config(ConfigItem(
+    key="audit_buffer_size",
+    default=10000,
+    description="审计事件内存缓冲区容量（条，满时丢弃最旧的未写入事件）",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="audit_batch_size",
+    default=200,
+    description="审计事件单批写入条数",
+    validate_func=lambda x: isinstance(x, int) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="audit_flush_interval",
+    default=1.0,
+    description="审计事件写入间隔（秒）",
+    validate_func=lambda x: isinstance(x, (int, float)) and x > 0
+))
+config_manager.register_config(ConfigItem(
+    key="audit_max_bytes",
+    default=10485760,
+    description="审计库轮转大小（字节，0为不轮转）",
+    validate_func=lambda x: isinstance(x, int) and x >= 0
+))
+config_manager.register_config(ConfigItem(
+    key="audit_backup_count",
+    default=5,
+    description="审计库轮转保留的历史文件数",
+    validate_func=lambda x: isinstance(x, int) and x >= 0
+))
+
 # 加载配置
 if not config_manager.load():
     raise RuntimeError("配置加载失败，请检查配置文件或环境变量")
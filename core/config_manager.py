@@ -1,7 +1,7 @@
 import os
 import json
 import logging
-from typing import Dict, Any, Optional, TypeVar, Generic
+from typing import Dict, Any, Optional, TypeVar, Generic, Callable
 
 # 配置文件路径
 CONFIG_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
@@ -37,6 +37,7 @@ class ConfigManager:
             cls._instance._initialized = False
             cls._instance._config_items = {}
             cls._instance._file_config = {}
+            cls._instance._listeners = []
             cls._instance._logger = logging.getLogger("GracyBot-Config")
         return cls._instance
     
@@ -44,6 +45,19 @@ class ConfigManager:
         """注册配置项"""
         self._config_items[config_item.key] = config_item
     
+    def add_listener(self, listener: Callable[[Optional[str]], None]) -> None:
+        """注册配置变更监听器（配置重新加载时参数为None，动态设置时为变更的配置键）
+        用于让依赖配置的缓存（如权限决策缓存）在配置变化时失效
+        """
+        self._listeners.append(listener)
+    
+    def _notify_listeners(self, key: Optional[str]) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(key)
+            except Exception as e:
+                self._logger.error(f"❌ 配置变更监听器执行异常: {str(e)}")
+    
     def load(self) -> bool:
         """加载配置，优先级：环境变量 > 配置文件 > 默认值"""
         try:
@@ -100,6 +114,7 @@ class ConfigManager:
             
             self._initialized = True
             self._logger.info("✅ 所有配置加载完成")
+            self._notify_listeners(None)
             return True
         except Exception as e:
             self._logger.error(f"❌ 配置加载异常: {str(e)}", exc_info=True)
@@ -123,6 +138,7 @@ class ConfigManager:
             if item.validate(value):
                 item.value = value
                 self._logger.info(f"🔄 动态更新配置 {key}: {value}")
+                self._notify_listeners(key)
                 return True
             else:
                 self._logger.error(f"❌ 无法设置配置 {key}: 无效值 {value}")
@@ -0,0 +1,208 @@
+"""内容过滤引擎
+所有过滤规则（危险命令、注入字符、SQL注入）在启动时编译为一个带命名分组的交替正则，
+对原始文本只扫描一遍，命中时报告规则ID和类别：
+- 内置规则见 DEFAULT_CONTENT_RULES，content_filter_rules 配置可追加规则，或按ID覆盖/禁用内置规则
+- 规则统一忽略大小写匹配；规则中不要使用编号反向引用（\\1），组合后分组编号会变化
+- 各规则可能的首字符合并为前置断言 (?=[...])，普通聊天内容（中文为主）的大部分位置只需一次字符集判断
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+from core.logger_manager import logger_manager
+
+logger = logger_manager.get_logger("security")
+
+# 规则类别 -> 拦截提示
+RULE_CATEGORIES = {
+    "dangerous_command": "检测到危险命令",
+    "sensitive_char": "内容包含敏感字符，可能存在安全风险",
+    "sql_injection": "检测到潜在的SQL注入攻击"
+}
+
+# 内置规则（按类别优先级排列，同一位置同时命中多条规则时取靠前的规则）
+DEFAULT_CONTENT_RULES: List[Dict[str, str]] = [
+    {"id": "rm_rf", "category": "dangerous_command", "pattern": r"rm\s+-rf"},           # 强制删除命令
+    {"id": "shutdown", "category": "dangerous_command", "pattern": r"shutdown"},         # 关机命令
+    {"id": "init_0", "category": "dangerous_command", "pattern": r"init\s+0"},           # 系统停机命令
+    {"id": "reboot", "category": "dangerous_command", "pattern": r"reboot"},             # 重启命令
+    {"id": "mkfs", "category": "dangerous_command", "pattern": r"mkfs|mke2fs"},          # 格式化命令
+    {"id": "dd_write", "category": "dangerous_command", "pattern": r"dd\s+if=.*of=.*"},  # 磁盘写入命令
+    {"id": "chmod_777", "category": "dangerous_command", "pattern": r"chmod\s+777"},     # 危险权限设置
+    {"id": "sudo_su", "category": "dangerous_command", "pattern": r"sudo\s+su"},         # 提权至root
+    {"id": "shell_meta", "category": "sensitive_char", "pattern": r"[;&|$<>'\"`]"},     # 命令注入字符
+    {"id": "sql_statement", "category": "sql_injection",
+     "pattern": r"\b(?:select|insert|update|delete|drop|truncate|alter)\b.*?\b(?:from|into|table|database)\b"},
+    {"id": "sql_union", "category": "sql_injection", "pattern": r"\bunion\s+select\b"},
+    {"id": "sql_comment", "category": "sql_injection", "pattern": r"--|#"}
+]
+
+# 控制字符（匹配前移除，防止用控制字符拆开关键字绕过规则）
+_CONTROL_CHARS = re.compile(r"[\x00-\x1F\x7F]")
+
+
+# 首字符集合超过该大小时不再生成前置断言（收益很小）
+_MAX_FIRST_CHARS = 128
+
+
+def _first_chars(items) -> Optional[Set[str]]:
+    """分析正则语法树，返回匹配可能的首字符集合（无法确定时返回None）"""
+    for op, av in items:
+        name = str(op)
+        if name == "AT":  # \b、^ 等零宽断言，继续看下一个元素
+            continue
+        if name == "LITERAL":
+            return {chr(av)}
+        if name == "IN":
+            chars: Set[str] = set()
+            for item_op, item_av in av:
+                item_name = str(item_op)
+                if item_name == "LITERAL":
+                    chars.add(chr(item_av))
+                elif item_name == "RANGE" and item_av[1] - item_av[0] < _MAX_FIRST_CHARS:
+                    chars.update(chr(code) for code in range(item_av[0], item_av[1] + 1))
+                else:
+                    return None
+            return chars
+        if name == "BRANCH":
+            chars = set()
+            for branch in av[1]:
+                branch_chars = _first_chars(branch)
+                if branch_chars is None:
+                    return None
+                chars |= branch_chars
+            return chars
+        if name == "SUBPATTERN":
+            return _first_chars(av[-1])
+        if name in ("MAX_REPEAT", "MIN_REPEAT") and av[0] >= 1:
+            return _first_chars(av[2])
+        return None
+    return None
+
+
+def _guard_prefix(patterns: List[str]) -> str:
+    """所有规则的首字符集合组成的前置断言（任一规则无法确定首字符时返回空串）"""
+    chars: Set[str] = set()
+    for pattern in patterns:
+        try:
+            rule_chars = _first_chars(sre_parse.parse(pattern, re.IGNORECASE))
+        except (re.error, TypeError, ValueError, IndexError):
+            return ""
+        if rule_chars is None:
+            return ""
+        chars |= rule_chars
+    # 忽略大小写：补齐字母的大小写形式
+    chars |= {c.upper() for c in chars} | {c.lower() for c in chars}
+    if not chars or len(chars) > _MAX_FIRST_CHARS:
+        return ""
+    return "(?=[" + "".join(re.escape(c) if c not in "-]\\^" else "\\" + c for c in sorted(chars)) + "])"
+
+
+class ContentRule:
+    """单条过滤规则"""
+
+    __slots__ = ("id", "category", "pattern", "message")
+
+    def __init__(self, rule_id: str, category: str, pattern: str, message: Optional[str] = None):
+        self.id = rule_id
+        self.category = category
+        self.pattern = pattern
+        self.message = message or RULE_CATEGORIES.get(category, "内容未通过安全检查")
+
+    def __repr__(self) -> str:
+        return f"ContentRule({self.id!r}, {self.category!r})"
+
+
+class FilterMatch:
+    """命中结果：规则与命中的文本片段"""
+
+    __slots__ = ("rule", "text", "start")
+
+    def __init__(self, rule: ContentRule, text: str, start: int):
+        self.rule = rule
+        self.text = text
+        self.start = start
+
+    def __repr__(self) -> str:
+        return f"FilterMatch(rule={self.rule.id!r}, text={self.text!r}, start={self.start})"
+
+
+class ContentFilter:
+    """单次扫描的内容过滤器：规则编译为 (?P<r0>...)|(?P<r1>...)|... 一个正则"""
+
+    def __init__(self, extra_rules: Optional[List[Dict[str, Any]]] = None, max_length: int = 1000):
+        self.max_length = max_length
+        self.rules: List[ContentRule] = []
+        self._groups: Dict[str, ContentRule] = {}
+        self._pattern: Optional["re.Pattern"] = None
+        self.load(extra_rules)
+
+    def load(self, extra_rules: Optional[List[Dict[str, Any]]] = None) -> int:
+        """编译内置规则和配置规则（配置中同ID的规则覆盖内置规则，pattern为空表示禁用该规则）
+        单条规则无效时记录错误并跳过，不影响其他规则
+        :return: 生效的规则数量
+        """
+        merged: Dict[str, Dict[str, Any]] = {rule["id"]: rule for rule in DEFAULT_CONTENT_RULES}
+        for item in extra_rules or []:
+            if not isinstance(item, dict) or not item.get("id"):
+                logger.error(f"[内容过滤] 忽略格式错误的规则：{item}")
+                continue
+            merged[str(item["id"])] = {**merged.get(str(item["id"]), {"category": "dangerous_command"}), **item}
+
+        rules, parts = [], []
+        for rule_id, item in merged.items():
+            pattern = item.get("pattern")
+            if not pattern:
+                continue
+            try:
+                re.compile(pattern, re.IGNORECASE)
+            except re.error as e:
+                logger.error(f"[内容过滤] 规则 {rule_id} 的正则无效，已跳过：{str(e)}")
+                continue
+            rule = ContentRule(rule_id, item.get("category", "dangerous_command"), pattern, item.get("message"))
+            parts.append(f"(?P<r{len(rules)}>{pattern})")
+            rules.append(rule)
+
+        try:
+            guard = _guard_prefix([rule.pattern for rule in rules])
+            pattern = re.compile(f"{guard}(?:{'|'.join(parts)})", re.IGNORECASE) if parts else None
+        except re.error as e:
+            # 规则单独有效但组合后冲突（如规则内的命名分组重名），退回内置规则
+            if not extra_rules:
+                raise
+            logger.error(f"[内容过滤] 配置规则组合编译失败，仅使用内置规则：{str(e)}")
+            return self.load(None)
+        self.rules = rules
+        self._groups = {f"r{idx}": rule for idx, rule in enumerate(rules)}
+        self._pattern = pattern
+        return len(rules)
+
+    def match(self, content: str) -> Optional[FilterMatch]:
+        """扫描内容，返回最先命中的规则（未命中返回None）"""
+        if self._pattern is None or not content:
+            return None
+        if len(content) > self.max_length:
+            content = content[:self.max_length]
+        if _CONTROL_CHARS.search(content):
+            content = _CONTROL_CHARS.sub("", content)
+        found = self._pattern.search(content)
+        if found is None:
+            return None
+        # lastgroup在规则内部含捕获分组时不可靠，按命名分组查找命中的规则
+        group = found.lastgroup
+        if group not in self._groups:
+            group = next(name for name, value in found.groupdict().items()
+                         if value is not None and name in self._groups)
+        return FilterMatch(self._groups[group], found.group(), found.start())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """规则数量（按类别）"""
+        by_category: Dict[str, int] = {}
+        for rule in self.rules:
+            by_category[rule.category] = by_category.get(rule.category, 0) + 1
+        return {"rules": len(self.rules), "by_category": by_category}
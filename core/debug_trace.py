@@ -0,0 +1,163 @@
+"""定向调试追踪模块
+按用户、群或插件在限定时间内开启DEBUG日志和阶段追踪，不需要把整个进程切换到DEBUG级别：
+- 有追踪规则时根日志器临时降到DEBUG，由 DebugTraceFilter 丢弃不属于被追踪请求的DEBUG日志；
+  没有追踪规则（或全部到期）时恢复原级别，默认路径与INFO级别开销相同
+- 请求是否被追踪由请求摘要（core.request_log）在记录用户、群、插件字段时判定，
+  被追踪的请求输出全部DEBUG日志、各阶段耗时和请求摘要行，且不参与日志采样
+- 主人通过 /调试追踪 指令管理，插件或其他模块可直接调用 debug_tracer.add / remove
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.config_manager import config_manager
+from core.logger_manager import logger_manager
+
+logger = logger_manager.get_logger("GracyBot-Logger")
+
+# 追踪类型 -> 请求摘要中对应的字段
+TRACE_KINDS = {"user": "user_id", "group": "group_id", "plugin": "plugin"}
+TRACE_KIND_NAMES = {"user": "用户", "group": "群", "plugin": "插件"}
+
+
+class DebugTracer:
+    """追踪规则：(类型, 值) -> 到期时间"""
+
+    def __init__(self):
+        self._rules: Dict[Tuple[str, str], float] = {}
+        self._next_expiry = float("inf")
+        self._base_level: Optional[int] = None  # 开启追踪前根日志器的级别（未降低级别时为None）
+        self._lock = threading.RLock()
+        self.traced_requests = 0
+
+    def add(self, kind: str, value: str, minutes: Optional[float] = None) -> float:
+        """开启追踪（同一目标重复开启时刷新到期时间）
+        :param kind: user / group / plugin
+        :param minutes: 持续时间（分钟），为空时使用 debug_trace_default_minutes，不超过 debug_trace_max_minutes
+        :return: 到期时间戳
+        """
+        if kind not in TRACE_KINDS:
+            raise ValueError(f"不支持的追踪类型：{kind}")
+        max_minutes = config_manager.get("debug_trace_max_minutes", 60)
+        if minutes is None:
+            minutes = config_manager.get("debug_trace_default_minutes", 10)
+        if minutes <= 0:
+            raise ValueError("追踪时长必须大于0")
+        expires_at = time.time() + min(minutes, max_minutes) * 60
+        with self._lock:
+            self._rules[(kind, str(value))] = expires_at
+            self._next_expiry = min(self._rules.values())
+            self._lower_level()
+        logger.info(f"🔍 [调试追踪] 已开启{TRACE_KIND_NAMES[kind]} {value} 的调试追踪，"
+                    f"{min(minutes, max_minutes):g}分钟后到期")
+        return expires_at
+
+    def remove(self, kind: Optional[str] = None, value: Optional[str] = None) -> int:
+        """关闭追踪（不指定类型时关闭全部）
+        :return: 关闭的规则数量
+        """
+        with self._lock:
+            if kind is None:
+                removed = len(self._rules)
+                self._rules.clear()
+            else:
+                removed = 1 if self._rules.pop((kind, str(value)), None) is not None else 0
+            self._refresh()
+        if removed:
+            logger.info(f"🔍 [调试追踪] 已关闭 {removed} 条调试追踪")
+        return removed
+
+    def active(self) -> bool:
+        """是否有生效的追踪规则（顺带清理到期的规则）"""
+        if not self._rules:
+            return False
+        if time.time() >= self._next_expiry:
+            self._expire()
+        return bool(self._rules)
+
+    def matches(self, fields: Dict[str, Any]) -> bool:
+        """请求字段是否命中追踪规则"""
+        if not self.active():
+            return False
+        rules = self._rules
+        for kind, field in TRACE_KINDS.items():
+            value = fields.get(field)
+            if value is not None and (kind, str(value)) in rules:
+                return True
+        return False
+
+    def list_rules(self) -> List[Tuple[str, str, float]]:
+        """生效的追踪规则 [(类型, 值, 剩余秒数)]"""
+        self.active()
+        now = time.time()
+        with self._lock:
+            return [(kind, value, expires_at - now) for (kind, value), expires_at in sorted(self._rules.items())]
+
+    def rebase(self) -> None:
+        """根日志器级别被修改后重新记录原级别（追踪生效时保持DEBUG）"""
+        with self._lock:
+            self._base_level = None
+            if self._rules:
+                self._lower_level()
+
+    @property
+    def base_level(self) -> Optional[int]:
+        return self._base_level
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [key for key, expires_at in self._rules.items() if expires_at <= now]
+            for key in expired:
+                del self._rules[key]
+            self._refresh()
+        for kind, value in expired:
+            logger.info(f"🔍 [调试追踪] {TRACE_KIND_NAMES[kind]} {value} 的调试追踪已到期")
+
+    def _refresh(self):
+        """规则变化后更新最近到期时间，没有规则时恢复根日志器级别"""
+        self._next_expiry = min(self._rules.values()) if self._rules else float("inf")
+        if not self._rules and self._base_level is not None:
+            logging.getLogger().setLevel(self._base_level)
+            self._base_level = None
+
+    def _lower_level(self):
+        root_logger = logging.getLogger()
+        if self._base_level is None and root_logger.level > logging.DEBUG:
+            self._base_level = root_logger.level
+            root_logger.setLevel(logging.DEBUG)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """追踪统计"""
+        return {
+            "active": [{"kind": kind, "value": value, "remaining_seconds": round(remaining)}
+                       for kind, value, remaining in self.list_rules()],
+            "level_lowered": self._base_level is not None,
+            "traced_requests": self.traced_requests
+        }
+
+
+class DebugTraceFilter(logging.Filter):
+    """追踪开启期间丢弃低于原日志级别、且不属于被追踪请求的记录
+    :param current_request: 返回当前请求摘要的函数（request_log.current）
+    """
+
+    def __init__(self, tracer: DebugTracer, current_request: Callable[[], Any]):
+        super().__init__()
+        self.tracer = tracer
+        self.current_request = current_request
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        base_level = self.tracer.base_level
+        if base_level is None or record.levelno >= base_level:
+            return True
+        if not self.tracer.active():
+            return False
+        summary = self.current_request()
+        return summary is not None and summary.traced
+
+
+# 全局追踪器
+debug_tracer = DebugTracer()
@@ -0,0 +1,112 @@
+"""事件去重模块
+Napcat在机器人响应慢时会重试投递同一事件，去重缓存保证同一事件只执行一次处理流程：
+- 优先以 message_id + 事件类型作为键（撤回、精华等通知携带原消息的message_id，不能与消息事件共用键），
+  缺失时使用 self_id/time/user_id/事件类型/消息内容哈希 组合键
+- 去重在结构校验之后执行；事件因繁忙被拒绝（503）时调用 forget 移除键，Napcat重试时可正常处理
+- OrderedDict实现LRU+TTL：按过期时间有序，淘汰和过期清理均为O(1)，容量有上限
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Hashable
+
+from core.utils import logger
+from core.config_manager import config_manager
+from core.monitor import monitor_manager
+
+
+def event_dedup_key(data: Dict[str, Any]) -> Hashable:
+    """生成事件去重键"""
+    message_id = data.get("message_id")
+    post_type = data.get("post_type")
+    if message_id is not None:
+        return "m", data.get("self_id"), message_id, post_type, data.get(f"{post_type}_type")
+    return (
+        "e",
+        data.get("self_id"),
+        data.get("time"),
+        data.get("user_id"),
+        data.get("group_id"),
+        post_type,
+        data.get(f"{post_type}_type"),
+        data.get("sub_type"),
+        data.get("flag"),
+        hash(data.get("raw_message", ""))
+    )
+
+
+class EventDeduplicator:
+    """有界LRU+TTL去重缓存（线程安全）"""
+
+    def __init__(self):
+        self.enabled = config_manager.get("dedup_enabled", True)
+        self.capacity = config_manager.get("dedup_cache_size", 4096)
+        self.ttl = config_manager.get("dedup_ttl_seconds", 120)
+        self._lock = threading.Lock()
+        # 键 -> 过期时间；命中时刷新过期时间并移到末尾，因此整体按过期时间升序
+        self._cache: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.duplicates = 0
+        self.evicted = 0
+
+        monitor_manager.register_metrics_provider("dedup", self.get_stats)
+
+    def is_duplicate(self, data: Dict[str, Any]) -> bool:
+        """检查事件是否已处理过（首次出现时记录下来）
+        心跳等元事件不参与去重
+        :return: 重复事件返回True
+        """
+        if not self.enabled or data.get("post_type") == "meta_event":
+            return False
+
+        key = event_dedup_key(data)
+        now = time.monotonic()
+        with self._lock:
+            cache = self._cache
+            # 清理已过期的头部条目（按过期时间有序，遇到未过期即停止）
+            while cache:
+                _, expires_at = next(iter(cache.items()))
+                if expires_at > now:
+                    break
+                cache.popitem(last=False)
+
+            if key in cache:
+                cache[key] = now + self.ttl
+                cache.move_to_end(key)
+                self.duplicates += 1
+                duplicate = True
+            else:
+                cache[key] = now + self.ttl
+                if len(cache) > self.capacity:
+                    cache.popitem(last=False)
+                    self.evicted += 1
+                duplicate = False
+
+        if duplicate:
+            monitor_manager.record_duplicate_event()
+            logger.info(f"[事件去重] 丢弃重复投递的事件（post_type：{data.get('post_type')}，"
+                        f"message_id：{data.get('message_id')}）")
+        return duplicate
+
+    def forget(self, data: Dict[str, Any]) -> None:
+        """移除事件的去重记录（事件未被接受处理时调用，使Napcat的重试不会被当作重复事件丢弃）"""
+        if not self.enabled:
+            return
+        key = event_dedup_key(data)
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """去重缓存统计"""
+        return {
+            "enabled": self.enabled,
+            "size": len(self._cache),
+            "capacity": self.capacity,
+            "ttl_seconds": self.ttl,
+            "duplicates": self.duplicates,
+            "evicted": self.evicted
+        }
+
+
+# 全局事件去重实例
+event_deduplicator = EventDeduplicator()
@@ -0,0 +1,334 @@
+"""事件分发模块
+提供入队分发模式：/callback 只负责校验并入队，由工作线程池消费队列、执行插件，
+避免慢插件（AI对话、消息发送超时）占用HTTP请求线程导致Napcat推送积压。
+事件按优先级划分到 master / command / ai 三个通道，每个通道有独立的就绪队列和工作线程；
+同一会话（target_id）的事件无论划分到哪个通道，都在会话队列中按到达顺序逐个执行：
+会话当前没有事件在执行时，才按队首事件的通道排入该通道的就绪队列，由该通道任一空闲线程取走。
+通道只决定会话排到哪组线程（优先级），不会让同一会话的两个事件同时执行；
+慢事件只阻塞所在会话，同一通道的其他会话由其余线程继续处理（通道线程全部被慢事件占满时仍需排队）
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Optional
+
+from core.utils import logger
+from core.config_manager import config_manager
+from core.monitor import monitor_manager
+from core.admission import admission_controller
+from core import request_log
+
+
+# 分发通道：主人指令 / 内置命令与插件指令 / AI对话，各自独立的队列和并发预算
+LANES = ("master", "command", "ai")
+DEFAULT_LANE_CONFIG = {
+    "master": {"workers": 1, "queue_size": 100},
+    "command": {"workers": 2, "queue_size": 500}
+}
+# 会话积压达到该深度时视为热点会话
+HOT_CONVERSATION_MIN_DEPTH = 5
+# 统计中列出的热点会话数量
+HOT_CONVERSATION_TOP = 5
+
+
+class DispatchLane:
+    """单个分发通道：会话就绪队列 + 专属工作线程 + 统计数据
+    就绪队列中是队首事件属于本通道、且当前没有事件在执行的会话；
+    pending为本通道排队中的事件数（受queue_size限制，由分发器的会话锁保护）
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.ready: "queue.Queue" = queue.Queue()
+        self.pending = 0
+        self.workers = []
+
+        # 统计数据（由lock保护）
+        self.lock = threading.Lock()
+        self.busy_workers = 0
+        self.busy_time = 0.0
+        self.stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "shed": 0,
+            "max_wait_ms": 0.0
+        }
+        self.wait_times = deque(maxlen=1000)  # 最近1000次排队等待时间（毫秒）
+
+    def get_stats(self, elapsed: float) -> Dict[str, Any]:
+        """通道深度、排队等待时间与工作线程利用率"""
+        with self.lock:
+            wait_times = list(self.wait_times)
+            busy_workers = self.busy_workers
+            busy_time = self.busy_time
+            stats = dict(self.stats)
+
+        capacity = elapsed * self.worker_count
+        return {
+            "workers": self.worker_count,
+            "busy_workers": busy_workers,
+            "queue_depth": self.pending,
+            "queue_capacity": self.queue_size,
+            "ready_conversations": self.ready.qsize(),
+            "avg_wait_ms": round(sum(wait_times) / len(wait_times), 2) if wait_times else 0,
+            "max_wait_ms": round(stats.pop("max_wait_ms"), 2),
+            "utilization_percent": round(busy_time / capacity * 100, 2) if capacity > 0 else 0,
+            **stats
+        }
+
+
+class EventDispatcher:
+    """事件分发器单例：按会话维护事件队列，按优先级通道调度会话
+    主人指令、普通指令、AI对话分别占用各自通道的线程，AI对话积压时其他会话的主人和普通指令仍能及时处理；
+    同一会话的事件跨通道保持到达顺序
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(EventDispatcher, cls).__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        """初始化分发器（工作线程在start时才创建）"""
+        self.mode = config_manager.get("dispatch_mode", "sync")
+        lane_config = {**DEFAULT_LANE_CONFIG, **(config_manager.get("dispatch_lanes", {}) or {})}
+        # AI通道沿用 dispatch_workers / dispatch_queue_size，兼容旧配置
+        lane_config["ai"] = {
+            "workers": config_manager.get("dispatch_workers", 4),
+            "queue_size": config_manager.get("dispatch_queue_size", 1000)
+        }
+        self.lanes: Dict[str, DispatchLane] = {
+            name: DispatchLane(name, int(lane_config[name].get("workers", 1)), int(lane_config[name].get("queue_size", 100)))
+            for name in LANES
+        }
+
+        # 会话 -> 待执行事件队列；会话在字典中表示已排入就绪队列或正在执行（同一时间最多一个事件在执行）
+        self._conversations: Dict[str, deque] = {}
+        self._conversation_lock = threading.Lock()
+
+        self._handler: Optional[Callable[[Dict[str, Any]], Any]] = None
+        self._classifier: Optional[Callable[[Dict[str, Any]], str]] = None
+        self._running = False
+        self._started_at = 0.0
+
+        # 注册到监控管理器，随/metrics和/status输出
+        monitor_manager.register_metrics_provider("dispatch", self.get_stats)
+
+    def start(self, handler: Callable[[Dict[str, Any]], Any],
+              classifier: Optional[Callable[[Dict[str, Any]], str]] = None) -> bool:
+        """启动各通道的工作线程池
+        :param handler: 处理单个事件的函数（如execute_plugin_cmd）
+        :param classifier: 通道划分函数，返回 master/command/ai（缺省时全部进入command通道）
+        :return: 是否以入队模式运行
+        """
+        if self.mode != "queue":
+            logger.info("📌 指令分发模式：同步（请求线程内执行）")
+            return False
+        if self._running:
+            logger.warning("⚠️ 事件分发器已启动，无需重复调用")
+            return True
+
+        self._handler = handler
+        self._classifier = classifier
+        self._running = True
+        self._started_at = time.time()
+        for lane in self.lanes.values():
+            for idx in range(lane.worker_count):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    args=(lane, idx),
+                    name=f"dispatch-{lane.name}-{idx + 1}",
+                    daemon=True
+                )
+                worker.start()
+                lane.workers.append(worker)
+
+        lane_info = "，".join(f"{lane.name} {lane.worker_count}线程/{lane.queue_size}容量" for lane in self.lanes.values())
+        logger.info(f"📌 指令分发模式：入队（{lane_info}）")
+        return True
+
+    def is_enabled(self) -> bool:
+        """是否处于入队分发模式"""
+        return self._running
+
+    def classify(self, parsed_data: Dict[str, Any]) -> str:
+        """确定事件所属通道（划分失败时按普通指令处理）"""
+        if self._classifier is None:
+            return "command"
+        try:
+            lane = self._classifier(parsed_data)
+        except Exception as e:
+            logger.error(f"[事件分发] 通道划分异常：{str(e)}")
+            return "command"
+        return lane if lane in self.lanes else "command"
+
+    def submit(self, parsed_data: Dict[str, Any], received_at: Optional[float] = None,
+               lane_name: Optional[str] = None) -> bool:
+        """事件入队（不阻塞）
+        调用前事件需已通过准入控制，处理结束或入队失败时由分发器释放在途名额
+        :param parsed_data: callback_base解析出的消息字典
+        :param received_at: 消息接收时间，用于统计端到端处理耗时
+        :param lane_name: 所属通道（已划分时传入，避免重复划分）
+        :return: 入队成功返回True，所属通道已满返回False
+        """
+        lane = self.lanes[lane_name if lane_name in self.lanes else self.classify(parsed_data)]
+        # 会话：群聊为群ID，私聊为用户ID
+        key = str(parsed_data.get("target_id", ""))
+        enqueued_at = time.time()
+        # 请求摘要随事件交给工作线程（入队前交出，避免工作线程先接管）
+        summary = request_log.handoff()
+        item = (parsed_data, received_at or enqueued_at, enqueued_at, summary, lane)
+        with self._conversation_lock:
+            accepted = lane.pending < lane.queue_size
+            if accepted:
+                lane.pending += 1
+                pending = self._conversations.get(key)
+                if pending is None:
+                    self._conversations[key] = deque((item,))
+                    lane.ready.put(key)
+                else:
+                    pending.append(item)
+        if not accepted:
+            request_log.resume(summary)
+            with lane.lock:
+                lane.stats["rejected"] += 1
+            admission_controller.release()
+            monitor_manager.record_event_shed("queue_full")
+            logger.warning(f"[事件分发] {lane.name}通道已满（容量 {lane.queue_size}，"
+                           f"会话：{parsed_data.get('target_id')}），拒绝新事件")
+            return False
+
+        with lane.lock:
+            lane.stats["enqueued"] += 1
+        return True
+
+    def _take(self, key: str):
+        """取出会话的队首事件（会话保留在字典中，表示正在执行）"""
+        with self._conversation_lock:
+            item = self._conversations[key].popleft()
+            item[4].pending -= 1
+        return item
+
+    def _finish_conversation_item(self, key: str):
+        """会话的一个事件执行完毕：还有待执行事件时按新队首的通道重新排队，否则移除会话"""
+        with self._conversation_lock:
+            pending = self._conversations[key]
+            if pending:
+                pending[0][4].ready.put(key)
+            else:
+                del self._conversations[key]
+
+    def _worker_loop(self, lane: DispatchLane, idx: int):
+        """工作线程主循环：从所属通道的就绪队列取出会话，执行该会话的队首事件"""
+        ready = lane.ready
+        while self._running:
+            try:
+                key = ready.get(timeout=1)
+            except queue.Empty:
+                continue
+            if key is None:
+                break
+            try:
+                self._run_item(lane, self._take(key))
+            finally:
+                self._finish_conversation_item(key)
+
+    def _run_item(self, lane: DispatchLane, item):
+        """执行单个事件并记录统计"""
+        parsed_data, received_at, enqueued_at, summary, _ = item
+        request_log.resume(summary)
+        started_at = time.time()
+        wait_ms = (started_at - enqueued_at) * 1000
+        with lane.lock:
+            lane.busy_workers += 1
+            lane.wait_times.append(wait_ms)
+            if wait_ms > lane.stats["max_wait_ms"]:
+                lane.stats["max_wait_ms"] = wait_ms
+
+        # 排队过久的事件按准入策略削减（不计入失败）
+        if not admission_controller.check_queue_age(parsed_data, lane.name, wait_ms / 1000):
+            with lane.lock:
+                lane.busy_workers -= 1
+                lane.stats["shed"] += 1
+            admission_controller.release()
+            monitor_manager.record_message_processed(time.time() - received_at)
+            request_log.finish("shed", lane=lane.name, queue_ms=round(wait_ms, 1))
+            return
+
+        success = False
+        try:
+            with request_log.stage("dispatch"):
+                self._handler(parsed_data)
+            success = True
+        except Exception as e:
+            logger.error(f"[事件分发] {lane.name}通道执行异常：{type(e).__name__}，原因：{str(e)}", exc_info=True)
+        finally:
+            finished_at = time.time()
+            with lane.lock:
+                lane.busy_workers -= 1
+                lane.busy_time += finished_at - started_at
+                lane.stats["completed" if success else "failed"] += 1
+            admission_controller.release()
+            if success:
+                monitor_manager.record_message_processed(finished_at - received_at)
+            else:
+                monitor_manager.record_message_error()
+            request_log.finish("ok" if success else "error", lane=lane.name, queue_ms=round(wait_ms, 1))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取整体及各通道的队列深度、排队等待时间、工作线程利用率与热点会话"""
+        elapsed = time.time() - self._started_at if self._started_at else 0
+        lanes = {name: lane.get_stats(elapsed) for name, lane in self.lanes.items()}
+        total_workers = sum(lane["workers"] for lane in lanes.values())
+        busy_capacity = sum(lane["utilization_percent"] * lane["workers"] for lane in lanes.values())
+        with self._conversation_lock:
+            depths = [(key, len(pending)) for key, pending in self._conversations.items()]
+        # 热点会话：单个会话刷屏或慢插件导致该会话的事件积压
+        hot = sorted((item for item in depths if item[1] >= HOT_CONVERSATION_MIN_DEPTH),
+                     key=lambda item: item[1], reverse=True)[:HOT_CONVERSATION_TOP]
+        summary = {
+            "mode": self.mode,
+            "running": self._running,
+            "workers": total_workers,
+            "utilization_percent": round(busy_capacity / total_workers, 2) if total_workers else 0,
+            "max_wait_ms": max(lane["max_wait_ms"] for lane in lanes.values()),
+            "active_conversations": len(depths),
+            "max_conversation_depth": max((depth for _, depth in depths), default=0),
+            "hot_conversations": [{"conversation": key, "depth": depth} for key, depth in hot]
+        }
+        for key in ("busy_workers", "queue_depth", "queue_capacity", "enqueued", "rejected", "completed", "failed", "shed"):
+            summary[key] = sum(lane[key] for lane in lanes.values())
+        summary["lanes"] = lanes
+        return summary
+
+    def shutdown(self, timeout: float = 5):
+        """停止所有通道的工作线程（尽量处理完已排入就绪队列的会话）"""
+        if not self._running:
+            return
+        deadline = time.time() + timeout
+        # 每个工作线程一个哨兵，排在已就绪的会话之后
+        for lane in self.lanes.values():
+            for _ in lane.workers:
+                lane.ready.put(None)
+        for lane in self.lanes.values():
+            for worker in lane.workers:
+                worker.join(timeout=max(deadline - time.time(), 0.1))
+            lane.workers.clear()
+        self._running = False
+        logger.info("事件分发器已关闭")
+
+
+# 创建全局单例实例
+event_dispatcher = EventDispatcher()
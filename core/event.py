@@ -0,0 +1,148 @@
+"""消息事件模块
+每个消息事件只解析一次，生成带 __slots__ 的 Event 对象，在回调、准入控制、分发队列和插件之间直接传递：
+- 基础字段（会话类型、发送者、指令文本、是否@机器人）在构建时确定；
+  是否@机器人直接检查消息数组的at段或CQ码子串，不在构建时解析消息段
+- target_id、规范化文本、@列表、回复/图片、昵称等按需计算并缓存，未使用的字段不产生开销
+- 消息段由 core.segments 解析（消息数组和CQ码字符串统一处理），每个事件最多解析一次
+- 支持 event["raw_msg"] / event.get("target_id") 的字典式访问，兼容原有的 parsed_data 用法
+
+插件处理函数签名：
+- 新签名（PLUGIN_META 中声明 "handler_style": "event"）：handler(event, bot)，bot为消息发送函数
+- 旧签名：handler(self_bot, bot, message, user_id, chat_type, permission, logger)，由核心自动适配
+"""
+
+import re
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import ROBOT_QQ, MASTER_QQ
+from core.segments import ParsedMessage, mentions_qq, parse_message
+
+# 规范化文本时移除的纯文本@内容（@QQ号 形式）
+_AT_TEXT_PATTERN = re.compile(r"@\d{5,}")
+_WHITESPACE_PATTERN = re.compile(r"[\s　]+")
+def _strip_at_bot(raw_msg: str) -> str:
+    """去掉消息中@机器人的内容（CQ码和 @QQ号 两种形式）"""
+    if "[CQ:at," in raw_msg:
+        raw_msg = re.sub(rf"\[CQ:at,qq={re.escape(str(ROBOT_QQ))}[^\]]*\]", "", raw_msg)
+    return raw_msg.replace(f"@{ROBOT_QQ}", "").strip()
+
+
+class Event:
+    """单条消息事件（构建后只读）"""
+
+    __slots__ = ("data", "chat_type", "sender_id", "raw_msg", "is_at_bot",
+                 "_target_id", "_text", "_message", "_nickname")
+
+    # 字典式访问支持的键（与旧版 parsed_data 字典一致）
+    _KEYS = frozenset(("chat_type", "sender_id", "target_id", "raw_msg", "nickname", "is_at_bot", "data"))
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.chat_type = data.get("message_type")
+        self.sender_id = str(data.get("user_id", ""))
+        self._target_id: Optional[str] = None
+        self._text: Optional[str] = None
+        self._message: Optional[ParsedMessage] = None
+        self._nickname: Optional[str] = None
+
+        # Napcat可能发送 "raw_message": null
+        raw_message = data.get("raw_message") or ""
+        raw_msg = raw_message.strip()
+        is_at_bot = False
+        if self.chat_type == "group":
+            is_at_bot = mentions_qq(data.get("message"), raw_message, ROBOT_QQ)
+            if not is_at_bot and not isinstance(data.get("message"), list):
+                is_at_bot = f"@{ROBOT_QQ}" in raw_msg
+            if is_at_bot:
+                raw_msg = _strip_at_bot(raw_msg)
+        # 指令文本：去掉首尾空白和@机器人后的原始消息（插件指令匹配使用）
+        self.raw_msg = raw_msg
+        self.is_at_bot = is_at_bot
+
+    @property
+    def target_id(self) -> str:
+        """回复目标：群聊为群ID，私聊为发送者ID"""
+        if self._target_id is None:
+            key = "user_id" if self.chat_type == "private" else "group_id"
+            self._target_id = str(self.data.get(key, ""))
+        return self._target_id
+
+    @property
+    def message(self) -> ParsedMessage:
+        """解析后的消息段（首次访问时解析）"""
+        if self._message is None:
+            self._message = parse_message(self.data.get("message"), self.data.get("raw_message") or "")
+        return self._message
+
+    @property
+    def at_list(self) -> Tuple[str, ...]:
+        """消息中被@的QQ号列表（@全体成员为"all"）"""
+        return self.message.mentions
+
+    @property
+    def plain_text(self) -> str:
+        """所有文本段拼接后的纯文本（不含@、图片等非文本段）"""
+        return self.message.plain_text
+
+    @property
+    def reply_to(self) -> Optional[str]:
+        """回复的消息ID（非回复消息为None）"""
+        return self.message.reply_to
+
+    @property
+    def images(self) -> Tuple[str, ...]:
+        """消息中的图片地址"""
+        return self.message.images
+
+    @property
+    def text(self) -> str:
+        """规范化文本：纯文本中再移除 @QQ号 形式的内容，连续空白（含全角空格）合并为一个空格"""
+        if self._text is None:
+            text = _AT_TEXT_PATTERN.sub(" ", self.message.plain_text)
+            self._text = _WHITESPACE_PATTERN.sub(" ", text).strip()
+        return self._text
+
+    @property
+    def nickname(self) -> str:
+        """发送者显示名称：群名片 > QQ昵称 > 未知用户"""
+        if self._nickname is None:
+            sender = self.data.get("sender") or {}
+            self._nickname = sender.get("card") or sender.get("nickname") or "未知用户"
+        return self._nickname
+
+    @property
+    def is_master(self) -> bool:
+        """发送者是否为机器人主人"""
+        return self.sender_id == str(MASTER_QQ)
+
+    # 字典式访问（兼容旧版 parsed_data）
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self._KEYS:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._KEYS
+
+    def __repr__(self) -> str:
+        return f"Event(chat_type={self.chat_type!r}, sender_id={self.sender_id!r}, raw_msg={self.raw_msg[:20]!r})"
+
+
+def is_event_handler(plugin: Dict[str, Any]) -> bool:
+    """插件是否使用新签名 handler(event, bot)"""
+    return plugin.get("handler_style") == "event"
+
+
+def call_plugin_handler(plugin: Dict[str, Any], func, event: Event, bot, logger):
+    """按插件声明的签名调用处理函数（同步/异步入口共用）
+    旧签名插件收到原始事件字典，行为与之前保持一致
+    """
+    if is_event_handler(plugin):
+        return func(event, bot)
+    from core.plugin_manager import plugin_manager
+    return func(plugin_manager, bot, event.data, event.sender_id, event.chat_type, "all", logger)
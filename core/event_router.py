@@ -0,0 +1,117 @@
+"""事件路由模块
+按 (post_type, 子类型, sub_type) 注册非指令事件处理器（戳一戳、入群、好友请求等），
+启动时一次性建表，回调处理时只需一次字典查找即可得到处理器列表：
+- 核心处理器通过 event_router.register 注册
+- 插件在 PLUGIN_META["event_handlers"] 中声明，如 {"notice.notify.poke": "handle_poke_event"}
+- 路由键中的 "*" 或省略的层级表示通配，例如 "request.friend" 匹配所有好友请求
+- 事件键中未出现在任何路由规则里的取值先归一为None（只能被通配规则匹配），
+  缓存大小受已注册的取值组合限制，不随事件中任意的 sub_type 等取值增长
+"""
+
+import threading
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from core.utils import logger
+from core.security import sanitize_log
+
+EventKey = Tuple[Optional[str], Optional[str], Optional[str]]
+EventHandler = Callable[[Dict[str, Any]], Any]
+
+
+def parse_route(spec: str) -> EventKey:
+    """将 "notice.notify.poke" 形式的路由字符串解析为路由键（缺省/通配层级为None）"""
+    parts = [p.strip() or "*" for p in spec.split(".")][:3]
+    parts += ["*"] * (3 - len(parts))
+    return tuple(None if p == "*" else p for p in parts)
+
+
+def event_key(data: Dict[str, Any]) -> EventKey:
+    """提取事件的路由键：post_type + 对应子类型字段（message_type/notice_type/request_type/meta_event_type）+ sub_type"""
+    post_type = data.get("post_type")
+    return post_type, data.get(f"{post_type}_type"), data.get("sub_type")
+
+
+class EventRouter:
+    """事件路由表：注册阶段写入，运行阶段按具体事件键缓存合并后的处理器列表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._core_routes: List[Tuple[EventKey, str, EventHandler]] = []
+        self._plugin_routes: List[Tuple[EventKey, str, EventHandler]] = []
+        # 归一后的事件键 -> 处理器元组（包含精确匹配和通配匹配的处理器，按注册顺序）
+        self._resolved: Dict[EventKey, Tuple[Tuple[str, EventHandler], ...]] = {}
+        # 每一层级在路由规则中出现过的具体取值
+        self._known: Tuple[frozenset, ...] = (frozenset(), frozenset(), frozenset())
+
+    def register(self, route: str, handler: EventHandler, owner: str = "core") -> None:
+        """注册核心事件处理器
+        :param route: 路由字符串（如 "notice.group_increase"）
+        :param handler: 处理函数，参数为原始事件数据
+        :param owner: 处理器归属（用于日志）
+        """
+        with self._lock:
+            self._core_routes.append((parse_route(route), owner, handler))
+            self._reset_cache()
+        logger.debug(f"[事件路由] 注册处理器 {owner} -> {route}")
+
+    def load_plugin_routes(self, plugins: List[Dict]) -> None:
+        """根据插件注册池重建插件事件处理器（插件初始化/重载后调用）"""
+        routes = []
+        for plugin in plugins:
+            for route, handler in plugin.get("event_handler_funcs", []):
+                routes.append((parse_route(route), plugin["name"], handler))
+        with self._lock:
+            self._plugin_routes = routes
+            self._reset_cache()
+        if routes:
+            logger.info(f"📌 事件路由已加载 {len(routes)} 个插件事件处理器")
+
+    def _reset_cache(self):
+        """路由规则变化后清空缓存并重新收集各层级的具体取值（调用方持有锁）"""
+        keys = [route_key for route_key, _, _ in self._core_routes + self._plugin_routes]
+        self._known = tuple(frozenset(key[level] for key in keys if key[level] is not None) for level in range(3))
+        self._resolved = {}
+
+    def _normalize(self, key: EventKey) -> EventKey:
+        """未出现在路由规则中的取值归一为None（与只匹配通配规则的结果相同）"""
+        known = self._known
+        return tuple(value if value in known[level] else None for level, value in enumerate(key))
+
+    def _resolve(self, key: EventKey) -> Tuple[Tuple[str, EventHandler], ...]:
+        handlers = []
+        for (post_type, detail_type, sub_type), owner, handler in self._core_routes + self._plugin_routes:
+            if post_type is not None and post_type != key[0]:
+                continue
+            if detail_type is not None and detail_type != key[1]:
+                continue
+            if sub_type is not None and sub_type != key[2]:
+                continue
+            handlers.append((owner, handler))
+        return tuple(handlers)
+
+    def get_handlers(self, data: Dict[str, Any]) -> Tuple[Tuple[str, EventHandler], ...]:
+        """查找事件对应的处理器（同一事件键只在首次出现时合并通配规则）"""
+        key = self._normalize(event_key(data))
+        handlers = self._resolved.get(key)
+        if handlers is None:
+            with self._lock:
+                handlers = self._resolve(key)
+                self._resolved[key] = handlers
+        return handlers
+
+    def route(self, data: Dict[str, Any]) -> int:
+        """分发事件给所有匹配的处理器，单个处理器异常不影响其余处理器
+        :return: 执行的处理器数量
+        """
+        handlers = self.get_handlers(data)
+        for owner, handler in handlers:
+            try:
+                handler(data)
+            except Exception as e:
+                logger.error(sanitize_log(f"[事件路由] {owner} 处理 {'.'.join(map(str, event_key(data)))} 事件失败：{str(e)}"),
+                             exc_info=True)
+        return len(handlers)
+
+
+# 全局事件路由实例
+event_router = EventRouter()
@@ -1,45 +1,120 @@
 import json
-import requests
 import time
 import threading
 import sys
 from flask import request, jsonify
-from typing import Dict
+from typing import Dict, Optional, Tuple
 from core.config import (
     MASTER_QQ,
-    NAPCAT_HTTP_URL,
     AUTO_REPLIES,
     ROBOT_QQ
 )
-from core.utils import send_http_msg, logger
+from core.utils import send_http_msg, call_napcat_api, logger
 from core.security import sanitize_log
 from core.plugin_manager import plugin_manager, PLUGIN_REGISTRY
-from core.security_manager import security_manager
+from core.security_manager import security_manager, Permission
 from core.monitor import monitor_manager
+from core.dispatcher import event_dispatcher
+from core.event_router import event_router
+from core.dedup import event_deduplicator
+from core.admission import admission_controller
+from core.audit import audit_log
+from core.log_archive import log_archive, LEVELS
+from core.event import Event, call_plugin_handler
 from core.logger_manager import logger_manager
+from core import request_log
+from core.debug_trace import debug_tracer, TRACE_KIND_NAMES
 
 
 def register_plugin(plugin_meta: Dict):
     PLUGIN_REGISTRY.append(plugin_meta)
+    plugin_manager.rebuild_command_index()
 
 
-def callback_base():
+def register_core_event_routes():
+    """注册核心事件处理器（启动时调用一次）
+    自动同意好友/群邀请、入群欢迎依赖小禹插件的功能开关，插件缺失时只在启动时提示一次
+    """
     try:
-        # 获取客户端IP进行频率限制检查
-        client_ip = request.remote_addr
-        if not security_manager.check_rate_limit(client_ip):
-            logger.warning(f"[安全防护] 客户端IP {client_ip} 频率超限")
-            return jsonify({"retcode": 429, "msg": "请求频率过高，请稍后再试"}), 429
+        from plugins.XiaoYu_plugin.XiaoYu_plugin import FUNCTION_SWITCHES, send_welcome_msg
+    except ImportError:
+        logger.warning("⚠️ 小禹插件未加载，自动同意好友/群邀请、欢迎消息功能失效")
+        return
+
+    def on_friend_request(data: Dict):
+        if FUNCTION_SWITCHES.get("auto_accept_friend", False):
+            try:
+                call_napcat_api("set_friend_add_request", {"flag": data.get("flag"), "approve": True})
+                logger.info(sanitize_log(f"[好友事件] 自动同意好友请求（用户ID：{data.get('user_id')}）"))
+            except Exception as e:
+                logger.error(sanitize_log(f"[好友事件] 自动同意失败：{str(e)}"))
 
-        data = request.get_json()
+    def on_group_request(data: Dict):
+        if FUNCTION_SWITCHES.get("auto_join_group", False):
+            try:
+                call_napcat_api(
+                    "set_group_add_request",
+                    {"flag": data.get("flag"), "sub_type": data.get("sub_type"), "approve": True}
+                )
+                logger.info(sanitize_log(f"[群事件] 自动同意群邀请（群ID：{data.get('group_id')}）"))
+            except Exception as e:
+                logger.error(sanitize_log(f"[群事件] 自动同意失败：{str(e)}"))
+
+    def on_group_increase(data: Dict):
+        try:
+            group_id = str(data.get("group_id"))
+            user_id = str(data.get("user_id"))
+            nickname = data.get("user_info", {}).get("nickname", "未知用户")
+            send_welcome_msg(group_id, user_id, nickname)
+            logger.info(sanitize_log(f"[群事件] 新人入群（群ID：{group_id}，用户：{nickname}）"))
+        except Exception as e:
+            logger.error(sanitize_log(f"[群事件] 欢迎消息发送失败：{str(e)}"))
+
+    event_router.register("request.friend", on_friend_request, owner="XiaoYu_plugin")
+    event_router.register("request.group", on_group_request, owner="XiaoYu_plugin")
+    event_router.register("notice.group_increase", on_group_increase, owner="XiaoYu_plugin")
+
+
+def callback_base(data: Optional[Dict] = None):
+    """Flask回调基础处理：解析请求后交给process_callback_data
+    :param data: 已解析的请求体（为空时从当前请求读取）
+    :return: 消息事件返回Event对象，其余情况返回Flask响应
+    """
+    if data is None:
+        data = request.get_json(silent=True)
         if not data:
             logger.error(sanitize_log(f"[回调基础] 接收消息为空，请求体：{request.data[:50]}..."))
-            return jsonify({"retcode": 1, "msg": "消息为空"}), 400
+    parsed_data, body, status = process_callback_data(data, request.remote_addr)
+    if parsed_data is not None:
+        return parsed_data
+    return jsonify(body), status
+
+
+def process_callback_data(data: Optional[Dict], client_ip: str) -> Tuple[Optional[Event], Dict, int]:
+    """回调基础处理（不依赖Flask，HTTP/异步服务共用）
+    :param data: OneBot事件数据
+    :param client_ip: 客户端IP（用于频率限制）
+    :return: (消息事件Event或None, 响应体, HTTP状态码)
+    """
+    try:
+        # 获取客户端IP进行频率限制检查（Napcat所有事件来自同一来源，使用单独的总量限制）
+        if not security_manager.check_source_rate_limit(client_ip):
+            logger.warning(f"[安全防护] 客户端IP {client_ip} 频率超限")
+            return None, {"retcode": 429, "msg": "请求频率过高，请稍后再试"}, 429
 
-        # 输入验证
-        if not security_manager.validate_input(data):
-            logger.warning(f"[安全防护] 输入数据验证失败，可能包含恶意内容")
-            return jsonify({"retcode": 403, "msg": "输入内容不合法"}), 403
+        if not data:
+            return None, {"retcode": 1, "msg": "消息为空"}, 400
+
+        # 输入验证（按事件类型校验结构，拒绝时指明出错的字段）
+        valid, reason = security_manager.validate_event(data)
+        if not valid:
+            logger.warning(sanitize_log(f"[安全防护] 输入数据验证失败：{reason}"))
+            return None, {"retcode": 403, "msg": f"输入内容不合法：{reason}"}, 403
+
+        # 重复投递的事件（Napcat重试）直接返回成功，避免重复执行插件和AI调用
+        # （在限流和结构校验之后判断，被拒绝的事件不记录，重试时可正常处理）
+        if event_deduplicator.is_duplicate(data):
+            return None, {"retcode": 0}, 200
 
         # 只传递必要的信息，避免日志过于冗长
         simplified_context = {
@@ -57,63 +132,10 @@ def callback_base():
             context=simplified_context
         )
 
-        try:
-            from plugins.XiaoYu_plugin.XiaoYu_plugin import FUNCTION_SWITCHES, send_welcome_msg
-        except ImportError:
-            logger.warning("⚠️ 小禹插件未加载，自动同意好友/群邀请、欢迎消息功能失效")
-            FUNCTION_SWITCHES = {"auto_accept_friend": False, "auto_join_group": False}
-            send_welcome_msg = lambda x, y, z: None
-
-        if data.get("post_type") == "request" and data.get("request_type") == "friend":
-            if FUNCTION_SWITCHES.get("auto_accept_friend", False):
-                try:
-                    requests.post(
-                        f"{NAPCAT_HTTP_URL}/set_friend_add_request",
-                        json={"flag": data.get("flag"), "approve": True},
-                        timeout=10
-                    )
-                    logger.info(sanitize_log(f"[好友事件] 自动同意好友请求（用户ID：{data.get('user_id')}）"))
-                except Exception as e:
-                    logger.error(sanitize_log(f"[好友事件] 自动同意失败：{str(e)}"))
+        request_log.note(post_type=data.get("post_type"))
 
-        if data.get("post_type") == "request" and data.get("request_type") == "group":
-            if FUNCTION_SWITCHES.get("auto_join_group", False):
-                try:
-                    requests.post(
-                        f"{NAPCAT_HTTP_URL}/set_group_add_request",
-                        json={"flag": data.get("flag"), "sub_type": data.get("sub_type"), "approve": True},
-                        timeout=10
-                    )
-                    logger.info(sanitize_log(f"[群事件] 自动同意群邀请（群ID：{data.get('group_id')}）"))
-                except Exception as e:
-                    logger.error(sanitize_log(f"[群事件] 自动同意失败：{str(e)}"))
-
-        if data.get("post_type") == "notice" and data.get("notice_type") == "group_increase":
-            try:
-                group_id = str(data.get("group_id"))
-                user_id = str(data.get("user_id"))
-                nickname = data.get("user_info", {}).get("nickname", "未知用户")
-                send_welcome_msg(group_id, user_id, nickname)
-                logger.info(sanitize_log(f"[群事件] 新人入群（群ID：{group_id}，用户：{nickname}）"))
-            except Exception as e:
-                logger.error(sanitize_log(f"[群事件] 欢迎消息发送失败：{str(e)}"))
-
-        # 处理戳一戳事件（notify类型）
-        if data.get("post_type") == "notice" and data.get("notice_type") == "notify":
-            sub_type = data.get("sub_type", "")
-            # 检查是否是戳一戳事件
-            if sub_type in ["poke", "lucky_king"]:
-                try:
-                    from plugins.OpenAI_plugin.poke_handler import handle_poke_event
-                    # 调用戳一戳事件处理函数
-                    handle_poke_event(data)
-                    logger.info(sanitize_log(
-                        f"[戳一戳事件] 处理戳一戳事件（用户ID：{data.get('user_id')}，目标ID：{data.get('target_id')}）"))
-                except ImportError:
-                    logger.warning("[戳一戳事件] OpenAI插件错误，戳一戳功能不可用")
-                except Exception as e:
-                    logger.error(sanitize_log(f"[戳一戳事件] 处理失败：{str(e)}"))
-            return jsonify({"retcode": 0})
+        # 事件路由：戳一戳、入群、好友/群请求等由启动时注册的处理器处理
+        event_router.route(data)
 
         if data.get("post_type") != "message":
             # 记录非消息类型操作的审计日志
@@ -126,129 +148,281 @@ def callback_base():
                 details={"request_type": data.get("request_type"), "notice_type": data.get("notice_type")}
             )
             logger.debug(sanitize_log(f"[回调基础] 非消息类型（类型：{data.get('post_type')}），忽略处理"))
-            return jsonify({"retcode": 0})
+            return None, {"retcode": 0}, 200
 
-        chat_type = data.get("message_type")
-        sender_id = str(data.get("user_id", ""))
-        target_id = str(data.get("user_id" if chat_type == "private" else "group_id", ""))
-        raw_msg = data.get("raw_message", "").strip()
-        nickname = data.get("sender", {}).get("nickname", "未知用户")
+        # 消息事件只解析一次，后续准入控制、分发队列和插件共用同一个Event对象
+        event = Event(data)
+        sender_id = event.sender_id
+        request_log.note(chat_type=event.chat_type, user_id=sender_id, group_id=data.get("group_id"))
 
         # 对用户消息进行频率限制检查
-        if not security_manager.check_rate_limit(f"user_{sender_id}"):
-            logger.warning(f"[安全防护] 用户 {sender_id} 消息频率超限")
-            if chat_type == "private":
-                send_http_msg(sender_id, "您的消息发送频率过高，请稍后再试", "private")
-            return jsonify({"retcode": 0})
-
-        is_at_bot = False
-        # 关键修改：删除纳西妲昵称，统一用机器人QQ号触发
-        ROBOT_NICKNAME = ""
-
-        if chat_type == "group":
-            if isinstance(data.get("message"), list):
-                is_at_bot = any(
-                    item.get("type") == "at" and (
-                            str(item.get("data", {}).get("qq")) == ROBOT_QQ
-                    )
-                    for item in data["message"]
-                )
-            else:
-                is_at_bot = f"@{ROBOT_QQ}" in raw_msg
-            if is_at_bot:
-                raw_msg = raw_msg.replace(f"@{ROBOT_QQ}", "").strip()
+        rate_key = f"user_{sender_id}"
+        if not security_manager.check_rate_limit(rate_key):
+            # 同一用户每分钟只提醒一次，避免超限后每条消息都回复
+            if security_manager.rate_limiter.should_notify(rate_key):
+                logger.warning(f"[安全防护] 用户 {sender_id} 消息频率超限")
+                if event.chat_type == "private":
+                    send_http_msg(sender_id, "您的消息发送频率过高，请稍后再试", "private")
+            return None, {"retcode": 0}, 200
 
         if sender_id == str(ROBOT_QQ):
             logger.debug(sanitize_log(f"[过滤] 机器人自身消息（{ROBOT_QQ}），跳过处理"))
-            return jsonify({"retcode": 0})
-
-        return {
-            "chat_type": chat_type,
-            "sender_id": sender_id,
-            "target_id": target_id,
-            "raw_msg": raw_msg,
-            "nickname": nickname,
-            "is_at_bot": is_at_bot,
-            "data": data
-        }
+            return None, {"retcode": 0}, 200
+
+        return event, {"retcode": 0}, 200
     except Exception as e:
         logger.error(sanitize_log(f"[回调基础] 处理异常：{type(e).__name__}，原因：{str(e)}"))
-        return jsonify({"retcode": 1, "msg": f"回调处理异常：{str(e)}"}), 500
+        # 处理失败的事件不保留去重记录，Napcat重试时重新处理
+        if isinstance(data, dict):
+            event_deduplicator.forget(data)
+        return None, {"retcode": 1, "msg": f"回调处理异常：{str(e)}"}, 500
 
 
 def dispatch_plugin_cmd(parsed_data):
+    """在请求线程内同步分发指令，返回Flask响应（兼容旧调用方式）"""
     try:
-        chat_type = parsed_data["chat_type"]
-        sender_id = parsed_data["sender_id"]
-        target_id = parsed_data["target_id"]
-        raw_msg = parsed_data["raw_msg"]
-        is_at_bot = parsed_data["is_at_bot"]
-        nickname = parsed_data.get("nickname", "用户")
-        handled = False
-
-        # 记录消息审计日志
-        security_manager.log_audit_event(
-            user_id=sender_id,
-            action="message_received",
-            resource=None,
-            success=True,
-            event_type="message",
-            details={"chat_type": chat_type, "target_id": target_id, "command": raw_msg[:50]}
-        )
+        execute_plugin_cmd(parsed_data)
+        return jsonify({"retcode": 0})
+    except Exception as e:
+        # 安全处理raw_msg，避免日志记录异常
+        raw_msg = parsed_data.get("raw_msg", "") if isinstance(parsed_data, (dict, Event)) else ""
+        safe_msg = str(raw_msg)[:20] if raw_msg else ""
+        logger.error(sanitize_log(f"[指令分发] 异常（指令：{safe_msg}...）：{type(e).__name__}，原因：{str(e)}"))
+        return jsonify({"retcode": 1, "msg": f"指令处理异常：{str(e)}"}), 500
 
-        if raw_msg == "/关机":
-            # 检查是否是主人权限
-            is_master, msg = security_manager.check_master_permission(sender_id)
-            if is_master:
-                send_http_msg(target_id, "🛑 正在执行关机操作...机器人将在3秒后关闭", chat_type)
-                handled = True
-                logger.info(sanitize_log(f"[内置命令] 主人{sender_id}执行/关机命令，即将关闭机器人"))
-
-                # 延迟执行关机，给消息发送留出时间
-                def delayed_shutdown():
-                    time.sleep(3)
-                    try:
-                        from bot import safe_shutdown
-                        safe_shutdown()
-                    except ImportError:
-                        logger.error("[关机指令] 无法导入safe_shutdown函数")
-                        sys.exit(0)
-
-                threading.Thread(target=delayed_shutdown, daemon=True).start()
+
+def handle_pushed_event(data: Dict, source: str = "websocket") -> None:
+    """处理由长连接推送的事件（WebSocket传输），流程与/callback一致，但无需构造HTTP响应
+    :param data: OneBot事件数据
+    :param source: 事件来源标识（用于频率限制和日志）
+    """
+    monitor_manager.record_message_received()
+    start_time = time.time()
+    request_log.begin(str(start_time)[-6:], source=source)
+    try:
+        with request_log.stage("base"):
+            parsed_data, body, status = process_callback_data(data, source)
+        if parsed_data is None:
+            if status >= 400:
+                logger.warning(f"[事件推送] 事件被拒绝（{status}）：{body.get('msg', '')}")
+                monitor_manager.record_message_error()
+                request_log.note(outcome="rejected", status=status)
             else:
-                send_http_msg(target_id, "⚠️ 权限不足！只有机器人主人才可以执行关机操作", chat_type)
-                logger.warning(f"[安全防护] 用户{sender_id}尝试执行关机指令，权限不足")
-                handled = True
-
-        elif raw_msg == "/重启":
-            # 检查是否是主人权限
-            is_master, msg = security_manager.check_master_permission(sender_id)
-            if is_master:
-                send_http_msg(target_id, "🔄 正在执行重启操作...机器人将在5秒后重启", chat_type)
-                handled = True
-                logger.info(sanitize_log(f"[内置命令] 主人{sender_id}执行/重启命令，即将重启机器人"))
-
-                # 延迟执行重启，给消息发送留出时间
-                def delayed_restart():
-                    time.sleep(5)
-                    try:
-                        # 使用系统命令重启服务
-                        import subprocess
-                        # 假设机器人是通过systemctl管理的服务
-                        subprocess.Popen(["systemctl", "restart", "bot"])
-                    except Exception as e:
-                        logger.error(f"[重启指令] 执行重启失败: {str(e)}")
-
-                threading.Thread(target=delayed_restart, daemon=True).start()
+                monitor_manager.record_message_processed(time.time() - start_time)
+                request_log.note(outcome="ignored")
+            return
+
+        lane = admit_event(parsed_data)
+        if lane is None:
+            monitor_manager.record_message_processed(time.time() - start_time)
+            request_log.note(outcome="shed")
+            return
+
+        if event_dispatcher.is_enabled():
+            if not event_dispatcher.submit(parsed_data, received_at=start_time, lane_name=lane):
+                monitor_manager.record_message_error()
+                request_log.note(outcome="busy")
+            return
+
+        try:
+            with request_log.stage("dispatch"):
+                execute_plugin_cmd(parsed_data)
+        finally:
+            admission_controller.release()
+        monitor_manager.record_message_processed(time.time() - start_time)
+        request_log.note(outcome="ok")
+    except Exception as e:
+        logger.error(sanitize_log(f"[事件推送] 处理异常：{type(e).__name__}，原因：{str(e)}"), exc_info=True)
+        monitor_manager.record_message_error()
+    finally:
+        request_log.finish()
+
+
+def execute_plugin_cmd(parsed_data) -> bool:
+    """执行指令分发的核心逻辑（不依赖Flask请求上下文，可在工作线程中调用）
+
+    :param parsed_data: callback_base解析出的消息事件（Event）
+    :return: 是否被内置命令或插件处理
+    """
+    raw_msg = parsed_data["raw_msg"]
+
+    audit_message_received(parsed_data)
+
+    handled = handle_builtin_cmd(parsed_data)
+
+    throttled = False
+    if not handled:
+        matched_plugin = match_plugin(parsed_data)
+        if matched_plugin:
+            if acquire_rate_quota(parsed_data, plugin_rate_category(matched_plugin, raw_msg)):
+                handled = run_plugin(matched_plugin, parsed_data)
             else:
-                send_http_msg(target_id, "⚠️ 权限不足！只有机器人主人才可以执行重启操作", chat_type)
-                logger.warning(f"[安全防护] 用户{sender_id}尝试执行重启指令，权限不足")
-                handled = True
-
-        elif raw_msg == "/关于":
-            # 使用安全管理器验证命令执行
-            if security_manager.validate_command(raw_msg):
-                about_content = """🏷️ 机器人基础信息
+                throttled = True
+
+    if not handled and not throttled and needs_fallback_reply(parsed_data):
+        if not fallback_needs_ai(parsed_data) or acquire_rate_quota(parsed_data, "ai"):
+            handle_fallback_reply(parsed_data)
+
+    request_log.note(handled=handled)
+    logger.info(sanitize_log(f"[指令分发] 指令「{raw_msg[:20]}...」处理完成（handled：{handled}）"))
+    return handled
+
+
+def audit_message_received(parsed_data) -> None:
+    """记录消息审计日志"""
+    security_manager.log_audit_event(
+        user_id=parsed_data["sender_id"],
+        action="message_received",
+        resource=None,
+        success=True,
+        event_type="message",
+        details={"chat_type": parsed_data["chat_type"], "target_id": parsed_data["target_id"],
+                 "command": parsed_data["raw_msg"][:50]}
+    )
+
+
+# 内置命令 -> 是否仅主人可用
+BUILTIN_COMMANDS = {"/关机": True, "/重启": True, "/关于": False, "/审计": True, "/日志查询": True, "/调试追踪": True}
+# 可携带参数的内置命令（其余内置命令需完全匹配）
+BUILTIN_ARG_COMMANDS = ("/审计", "/日志查询", "/调试追踪")
+
+
+def get_builtin_command(raw_msg: str) -> Optional[str]:
+    """识别内置命令
+    :return: 命令名，非内置命令返回None
+    """
+    if raw_msg in BUILTIN_COMMANDS:
+        return raw_msg
+    cmd = raw_msg.split(maxsplit=1)[0] if raw_msg else ""
+    return cmd if cmd in BUILTIN_ARG_COMMANDS else None
+
+
+def classify_dispatch_lane(parsed_data) -> str:
+    """入队模式下的通道划分
+    :return: master（主人的非AI指令）、command（内置命令/插件指令）、ai（AI对话与自动回复兜底）
+    """
+    raw_msg = parsed_data["raw_msg"]
+    sender_id = parsed_data["sender_id"]
+    is_master = str(sender_id) == str(MASTER_QQ)
+
+    if get_builtin_command(raw_msg):
+        return "master" if is_master else "command"
+
+    plugin = plugin_manager.find_plugin(raw_msg, parsed_data["chat_type"], sender_id, parsed_data["is_at_bot"])
+    if plugin is None or plugin_rate_category(plugin, raw_msg) == "ai":
+        return "ai"
+    return "master" if is_master else "command"
+
+
+# 多级限流层级 -> 提示中的名称
+RATE_LIMIT_TIER_NAMES = {"global": "机器人整体", "group": "本群", "user": "你的"}
+
+
+def plugin_rate_category(plugin: Dict, raw_msg: str) -> str:
+    """插件指令的限流类别：消息以插件声明的ai_commands开头为ai，否则为command
+    按前缀判断（与插件提取对话内容的规则一致），避免参数中的URL（含“//”）把配置指令归入ai
+    """
+    return "ai" if any(raw_msg.startswith(cmd) for cmd in plugin.get("ai_commands", ())) else "command"
+
+
+def fallback_needs_ai(parsed_data) -> bool:
+    """兜底回复是否会调用AI（命中自动回复配置时不调用）"""
+    return parsed_data["raw_msg"] not in AUTO_REPLIES
+
+
+def acquire_rate_quota(parsed_data, category: str) -> bool:
+    """多级限流（全局 → 群 → 用户）：任一层级没有余量时拒绝，并按层级记录削减原因
+    :param category: ai（AI调用）/ command（插件指令）
+    :return: 放行返回True
+    """
+    group_id = parsed_data["target_id"] if parsed_data["chat_type"] == "group" else None
+    sender_id = parsed_data["sender_id"]
+    tier = security_manager.acquire_rate_quota(category, sender_id, group_id)
+    if tier is None:
+        return True
+
+    monitor_manager.record_event_shed(f"rate_limit_{category}_{tier}")
+    if security_manager.tiered_rate_limiter.should_notify(category, sender_id):
+        logger.warning(f"[频率限制] {category}请求触发{tier}级限流（用户：{sender_id}，群：{group_id or '-'}）")
+        kind = "AI对话" if category == "ai" else "指令"
+        send_http_msg(parsed_data["target_id"],
+                      f"⏳ {RATE_LIMIT_TIER_NAMES[tier]}{kind}请求过于频繁，请稍后再试", parsed_data["chat_type"])
+    return False
+
+
+def admit_event(parsed_data) -> Optional[str]:
+    """准入控制：划分通道并检查负载
+    :return: 接纳时返回所属通道（处理结束需调用admission_controller.release，入队模式由分发器释放），被削减返回None
+    """
+    lane = classify_dispatch_lane(parsed_data)
+    if admission_controller.try_admit(parsed_data, lane):
+        return lane
+    return None
+
+
+def handle_builtin_cmd(parsed_data) -> bool:
+    """处理内置命令（/关机、/重启、/关于）
+    :return: 是否为内置命令并已处理
+    """
+    chat_type = parsed_data["chat_type"]
+    sender_id = parsed_data["sender_id"]
+    target_id = parsed_data["target_id"]
+    raw_msg = parsed_data["raw_msg"]
+    handled = False
+
+    if raw_msg == "/关机":
+        # 检查是否是主人权限
+        is_master, msg = security_manager.check_master_permission(sender_id)
+        if is_master:
+            send_http_msg(target_id, "🛑 正在执行关机操作...机器人将在3秒后关闭", chat_type)
+            handled = True
+            logger.info(sanitize_log(f"[内置命令] 主人{sender_id}执行/关机命令，即将关闭机器人"))
+
+            # 延迟执行关机，给消息发送留出时间
+            def delayed_shutdown():
+                time.sleep(3)
+                try:
+                    from bot import safe_shutdown
+                    safe_shutdown()
+                except ImportError:
+                    logger.error("[关机指令] 无法导入safe_shutdown函数")
+                    sys.exit(0)
+
+            threading.Thread(target=delayed_shutdown, daemon=True).start()
+        else:
+            send_http_msg(target_id, "⚠️ 权限不足！只有机器人主人才可以执行关机操作", chat_type)
+            logger.warning(f"[安全防护] 用户{sender_id}尝试执行关机指令，权限不足")
+            handled = True
+
+    elif raw_msg == "/重启":
+        # 检查是否是主人权限
+        is_master, msg = security_manager.check_master_permission(sender_id)
+        if is_master:
+            send_http_msg(target_id, "🔄 正在执行重启操作...机器人将在5秒后重启", chat_type)
+            handled = True
+            logger.info(sanitize_log(f"[内置命令] 主人{sender_id}执行/重启命令，即将重启机器人"))
+
+            # 延迟执行重启，给消息发送留出时间
+            def delayed_restart():
+                time.sleep(5)
+                try:
+                    # 使用系统命令重启服务
+                    import subprocess
+                    # 假设机器人是通过systemctl管理的服务
+                    subprocess.Popen(["systemctl", "restart", "bot"])
+                except Exception as e:
+                    logger.error(f"[重启指令] 执行重启失败: {str(e)}")
+
+            threading.Thread(target=delayed_restart, daemon=True).start()
+        else:
+            send_http_msg(target_id, "⚠️ 权限不足！只有机器人主人才可以执行重启操作", chat_type)
+            logger.warning(f"[安全防护] 用户{sender_id}尝试执行重启指令，权限不足")
+            handled = True
+
+    elif raw_msg == "/关于":
+        # 使用安全管理器验证命令执行
+        if security_manager.validate_command(raw_msg):
+            about_content = """🏷️ 机器人基础信息
 • 机器人框架：GracyBot
 • 当前版本：v1.8.0
 • 核心定位：基于Python3.10编写的企业级安全QQ机器人框架，可对接NapCat，欢迎大佬来开发插件
@@ -269,118 +443,339 @@ def dispatch_plugin_cmd(parsed_data):
 📞 维护信息
 • 开发作者：QQ:192004908
 • 版本更新记录：v1.8.0 升级为企业级架构，新增安全管理器、配置管理器和日志管理器"""
-                send_http_msg(target_id, about_content, chat_type)
-                handled = True
-                logger.info(sanitize_log(f"[内置命令] 用户{sender_id}执行/关于命令，已返回框架信息"))
-            else:
-                logger.warning(f"[安全防护] 命令验证失败，拒绝执行：{raw_msg}")
-
-        if not handled:
-            # 插件执行前的安全检查 - 支持basic_query和use_plugins权限
-            has_basic_perm, _ = security_manager.check_permission(sender_id, "basic_query")
-            has_plugin_perm, _ = security_manager.check_permission(sender_id, "use_plugins")
-            has_permission = has_basic_perm or has_plugin_perm
-            if has_permission:
-                matched_plugin = plugin_manager.get_matched_plugin(raw_msg, chat_type, sender_id, is_at_bot)
-                if matched_plugin:
-                    # 验证插件命令安全性
-                    plugin_name = matched_plugin.get("name", "unknown")
-                    if security_manager.validate_plugin_access(plugin_name, sender_id):
-                        handler_func = matched_plugin["handler_func"]
-                        try:
-                            plugin_start_time = time.time()
-                            handler_func(
-                                plugin_manager,
-                                send_http_msg,
-                                parsed_data["data"],
-                                sender_id,
-                                chat_type,
-                                "all",
-                                logger
-                            )
-                            plugin_execution_time = time.time() - plugin_start_time
-                            monitor_manager.record_plugin_execution(plugin_name, plugin_execution_time, True)
-                            handled = True
-                            # 记录插件执行审计日志
-                            security_manager.log_audit_event(
-                                user_id=sender_id,
-                                action="plugin_executed",
-                                resource=plugin_name,
-                                success=True,
-                                event_type="plugin",
-                                details={"plugin_name": plugin_name, "command": raw_msg,
-                                         "execution_time": plugin_execution_time}
-                            )
-                            logger.info(sanitize_log(
-                                f"[插件执行] 插件 {plugin_name} 执行成功，耗时: {plugin_execution_time:.3f}s"))
-                        except Exception as e:
-                            plugin_execution_time = time.time() - plugin_start_time
-                            monitor_manager.record_plugin_execution(plugin_name, plugin_execution_time, False)
-                            logger.error(sanitize_log(
-                                f"[插件执行] 插件 {plugin_name} 执行异常：{str(e)}，耗时: {plugin_execution_time:.3f}s"))
-                            security_manager.log_audit_event(
-                                user_id=sender_id,
-                                action="plugin_executed",
-                                resource=plugin_name,
-                                success=False,
-                                event_type="plugin",
-                                details={"plugin_name": plugin_name, "command": raw_msg, "error": str(e),
-                                         "execution_time": plugin_execution_time}
-                            )
-                    else:
-                        logger.warning(f"[安全防护] 用户 {sender_id} 无权访问插件 {plugin_name}")
-                        security_manager.log_audit_event(
-                            user_id=sender_id,
-                            action="permission_denied",
-                            resource="plugin",
-                            success=False,
-                            event_type="security",
-                            details={"resource": "plugin", "plugin_name": plugin_name}
-                        )
-            else:
-                logger.warning(f"[安全防护] 用户 {sender_id} 无插件访问权限")
+            send_http_msg(target_id, about_content, chat_type)
+            handled = True
+            logger.info(sanitize_log(f"[内置命令] 用户{sender_id}执行/关于命令，已返回框架信息"))
+        else:
+            logger.warning(f"[安全防护] 命令验证失败，拒绝执行：{raw_msg}")
+
+    elif get_builtin_command(raw_msg) == "/审计":
+        is_master, msg = security_manager.check_master_permission(sender_id)
+        if is_master:
+            send_http_msg(target_id, handle_audit_cmd(raw_msg), chat_type)
+            logger.info(sanitize_log(f"[内置命令] 主人{sender_id}查询审计日志：{raw_msg}"))
+        else:
+            send_http_msg(target_id, "⚠️ 权限不足！只有机器人主人才可以查询审计日志", chat_type)
+            logger.warning(f"[安全防护] 用户{sender_id}尝试查询审计日志，权限不足")
+        handled = True
+
+    elif get_builtin_command(raw_msg) == "/日志查询":
+        is_master, msg = security_manager.check_master_permission(sender_id)
+        if is_master:
+            send_http_msg(target_id, handle_log_query_cmd(raw_msg), chat_type)
+            logger.info(sanitize_log(f"[内置命令] 主人{sender_id}查询运行日志：{raw_msg}"))
+        else:
+            send_http_msg(target_id, "⚠️ 权限不足！只有机器人主人才可以查询运行日志", chat_type)
+            logger.warning(f"[安全防护] 用户{sender_id}尝试查询运行日志，权限不足")
+        handled = True
+
+    elif get_builtin_command(raw_msg) == "/调试追踪":
+        is_master, msg = security_manager.check_master_permission(sender_id)
+        if is_master:
+            send_http_msg(target_id, handle_debug_trace_cmd(raw_msg), chat_type)
+            logger.info(sanitize_log(f"[内置命令] 主人{sender_id}管理调试追踪：{raw_msg}"))
+            security_manager.log_audit_event(
+                user_id=sender_id,
+                action="debug_trace",
+                resource="logging",
+                success=True,
+                event_type="admin",
+                details={"command": raw_msg[:100]}
+            )
+        else:
+            send_http_msg(target_id, "⚠️ 权限不足！只有机器人主人才可以管理调试追踪", chat_type)
+            logger.warning(f"[安全防护] 用户{sender_id}尝试管理调试追踪，权限不足")
+        handled = True
 
-        if not handled:
-            try:
-                from plugins.OpenAI_plugin.OpenAI_plugin import handle_auto_reply as openai_auto_reply
-                from core.config import AUTO_REPLIES
-
-                # 实现正确的优先级逻辑
-                # 1. 检查是否是特殊命令（如小禹帮助），排除调用AI
-                is_special_command = any(cmd in raw_msg for cmd in ["小禹帮助"])
-
-                # 2. 检查是否触发了自动回复配置，优先使用自动回复
-                is_auto_reply_match = raw_msg in AUTO_REPLIES
-
-                # 3. 检查是否是私信且没有特殊前缀，允许直接对话
-                is_private_direct_chat = chat_type == "private" and not (
-                            raw_msg.startswith("/") or raw_msg.startswith("//")) and not is_special_command
-
-                # 4. 群聊@机器人触发
-                is_group_at_reply = chat_type == "group" and is_at_bot
-
-                # 根据规则决定是否调用自动回复
-                if is_auto_reply_match or is_private_direct_chat or is_group_at_reply:
-                    # 确保nickname始终有值
-                    if not nickname:
-                        nickname = "用户"
-                    # 传递正确的user_id和nickname
-                    auto_reply = openai_auto_reply(raw_msg, sender_id, nickname)
-                    if auto_reply:
-                        if chat_type == "group":
-                            send_http_msg(target_id, auto_reply, "group")
-                        else:
-                            send_http_msg(sender_id, auto_reply, "private")
-            except ImportError:
-                logger.warning("⚠️ OpenAI插件未加载，自动回复功能失效")
-
-        logger.info(sanitize_log(f"[指令分发] 指令「{raw_msg[:20]}...」处理完成（handled：{handled}）"))
-        return jsonify({"retcode": 0})
+    return handled
+
+
+# /审计 指令参数名 -> 查询条件
+AUDIT_QUERY_KEYS = {"用户": "user_id", "user": "user_id", "操作": "action", "action": "action",
+                    "分钟": "minutes", "minutes": "minutes", "条数": "limit", "limit": "limit"}
+AUDIT_QUERY_MAX_LIMIT = 50
+
+
+def handle_audit_cmd(raw_msg: str) -> str:
+    """主人 /审计 指令：/审计 [用户=QQ] [操作=action] [分钟=N] [条数=N]
+    :return: 回复内容
+    """
+    conditions = {}
+    for arg in raw_msg.split()[1:]:
+        key, sep, value = arg.partition("=")
+        if not sep or key not in AUDIT_QUERY_KEYS or not value:
+            return ("❌ 参数格式错误\n用法：/审计 [用户=QQ] [操作=操作类型] [分钟=N] [条数=N]\n"
+                    "示例：/审计 用户=123456 分钟=60")
+        conditions[AUDIT_QUERY_KEYS[key]] = value
+
+    try:
+        limit = min(int(conditions.get("limit", 10)), AUDIT_QUERY_MAX_LIMIT)
+        minutes = float(conditions["minutes"]) if "minutes" in conditions else None
+    except ValueError:
+        return "❌ 分钟和条数必须是数字"
+
+    entries = audit_log.query(
+        user_id=conditions.get("user_id"),
+        action=conditions.get("action"),
+        since=time.time() - minutes * 60 if minutes else None,
+        limit=max(limit, 1)
+    )
+    if not entries:
+        return "📋 没有符合条件的审计记录"
+
+    lines = [f"📋 审计记录（最近 {len(entries)} 条）"]
+    for entry in entries:
+        result = "✅" if entry["success"] else ("❌" if entry["success"] is False else "•")
+        resource = f" {entry['resource']}" if entry["resource"] else ""
+        lines.append(f"{result} {time.strftime('%m-%d %H:%M:%S', time.localtime(entry['ts']))} "
+                     f"{entry['user_id']} {entry['action']}{resource}")
+    return "\n".join(lines)
+
+
+LOG_QUERY_USAGE = ("用法：/日志查询 <时间范围> [级别] [QQ号]\n"
+                   "时间范围：30m / 2h / 1d（最近一段时间）、2026-01-01（整天）、\n"
+                   "10:00~12:00（今天）、2026-01-01T10:00~2026-01-01T12:00\n"
+                   "级别：DEBUG/INFO/WARNING/ERROR/CRITICAL（该级别及以上）\n"
+                   "示例：/日志查询 2h ERROR 123456")
+LOG_QUERY_LIMIT = 20
+LOG_QUERY_LINE_CHARS = 200
+_RELATIVE_RANGE_UNITS = {"m": 60, "h": 3600, "d": 86400}
+
+
+def _parse_time_point(value: str, now: float) -> Optional[float]:
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            parsed = time.strptime(value, fmt)
+        except ValueError:
+            continue
+        today = time.localtime(now)
+        return time.mktime((today.tm_year, today.tm_mon, today.tm_mday,
+                            parsed.tm_hour, parsed.tm_min, parsed.tm_sec, 0, 0, -1))
+    return None
+
+
+def parse_log_time_range(value: str, now: Optional[float] = None) -> Optional[Tuple[float, float]]:
+    """解析 /日志查询 的时间范围
+    :return: (起始时间戳, 结束时间戳)，格式错误返回None
+    """
+    now = time.time() if now is None else now
+    unit = _RELATIVE_RANGE_UNITS.get(value[-1:].lower())
+    if unit and value[:-1].replace(".", "", 1).isdigit():
+        return now - float(value[:-1]) * unit, now
+    if "~" in value:
+        start, _, end = value.partition("~")
+        since, until = _parse_time_point(start, now), _parse_time_point(end, now)
+        if since is None or until is None or since > until:
+            return None
+        return since, until
+    since = _parse_time_point(value, now)
+    if since is None:
+        return None
+    # 只给日期表示整天
+    return (since, since + 86400 - 1) if "T" not in value and ":" not in value else (since, now)
+
+
+def handle_log_query_cmd(raw_msg: str) -> str:
+    """主人 /日志查询 指令：/日志查询 <时间范围> [级别] [QQ号]
+    :return: 回复内容
+    """
+    args = raw_msg.split()[1:]
+    if not args:
+        return f"❌ 缺少时间范围\n{LOG_QUERY_USAGE}"
+    time_range = parse_log_time_range(args[0])
+    if time_range is None:
+        return f"❌ 时间范围格式错误\n{LOG_QUERY_USAGE}"
+    level, user = None, None
+    for arg in args[1:]:
+        if arg.upper() in LEVELS:
+            level = arg.upper()
+        elif arg.isdigit():
+            user = arg
+        else:
+            return f"❌ 参数格式错误：{arg}\n{LOG_QUERY_USAGE}"
+
+    records = log_archive.query(time_range[0], time_range[1], level=level, user=user, limit=LOG_QUERY_LIMIT)
+    if not records:
+        return "📋 没有符合条件的日志"
+    lines = [f"📋 运行日志（最近 {len(records)} 条）"]
+    for record in records:
+        text = record["text"].split("\n", 1)[0]
+        lines.append(text if len(text) <= LOG_QUERY_LINE_CHARS else text[:LOG_QUERY_LINE_CHARS] + "...")
+    return "\n".join(lines)
+
+
+DEBUG_TRACE_USAGE = ("用法：/调试追踪 <用户|群|插件> <QQ号/群号/插件名> [分钟]\n"
+                     "/调试追踪 关闭 [用户|群|插件 <值>]（不带参数关闭全部）\n"
+                     "/调试追踪 列表\n"
+                     "示例：/调试追踪 用户 123456 15")
+# 指令中的追踪类型 -> debug_tracer 类型
+DEBUG_TRACE_KINDS = {name: kind for kind, name in TRACE_KIND_NAMES.items()}
+
+
+def handle_debug_trace_cmd(raw_msg: str) -> str:
+    """主人 /调试追踪 指令：按用户、群或插件在限定时间内开启DEBUG日志和阶段追踪
+    :return: 回复内容
+    """
+    args = raw_msg.split()[1:]
+    if not args or args[0] == "列表":
+        rules = debug_tracer.list_rules()
+        if not rules:
+            return "🔍 当前没有生效的调试追踪"
+        lines = [f"🔍 生效的调试追踪（{len(rules)} 条）"]
+        for kind, value, remaining in rules:
+            lines.append(f"• {TRACE_KIND_NAMES[kind]} {value}，剩余 {max(remaining, 0) / 60:.1f} 分钟")
+        return "\n".join(lines)
+
+    if args[0] == "关闭":
+        if len(args) == 1:
+            return f"✅ 已关闭全部调试追踪（{debug_tracer.remove()} 条）"
+        if len(args) != 3 or args[1] not in DEBUG_TRACE_KINDS:
+            return f"❌ 参数格式错误\n{DEBUG_TRACE_USAGE}"
+        if debug_tracer.remove(DEBUG_TRACE_KINDS[args[1]], args[2]):
+            return f"✅ 已关闭{args[1]} {args[2]} 的调试追踪"
+        return f"📋 {args[1]} {args[2]} 没有生效的调试追踪"
+
+    if args[0] not in DEBUG_TRACE_KINDS or len(args) not in (2, 3):
+        return f"❌ 参数格式错误\n{DEBUG_TRACE_USAGE}"
+    kind, value = DEBUG_TRACE_KINDS[args[0]], args[1]
+    if kind != "plugin" and not value.isdigit():
+        return f"❌ {args[0]}号必须是数字"
+    try:
+        minutes = float(args[2]) if len(args) == 3 else None
+        expires_at = debug_tracer.add(kind, value, minutes)
+    except ValueError:
+        return "❌ 追踪时长必须是大于0的数字（分钟）"
+    return (f"✅ 已开启{args[0]} {value} 的调试追踪，"
+            f"{time.strftime('%H:%M:%S', time.localtime(expires_at))} 到期\n"
+            f"命中的请求输出DEBUG日志和各阶段耗时，可用 /日志查询 30m DEBUG 查看")
+
+
+# 使用插件需要的权限（任意一项即可）
+PLUGIN_ACCESS_PERMISSIONS = Permission.BASIC_QUERY | Permission.USE_PLUGINS
+
+
+def match_plugin(parsed_data) -> Optional[Dict]:
+    """权限校验后匹配插件
+    :return: 匹配且允许访问的插件，否则返回None
+    """
+    sender_id = parsed_data["sender_id"]
+
+    # 插件执行前的安全检查 - 支持basic_query和use_plugins权限（命中决策缓存时为一次字典查找）
+    if not security_manager.has_permission(sender_id, PLUGIN_ACCESS_PERMISSIONS):
+        logger.warning(f"[安全防护] 用户 {sender_id} 无插件访问权限")
+        return None
+
+    matched_plugin = plugin_manager.get_matched_plugin(
+        parsed_data["raw_msg"], parsed_data["chat_type"], sender_id, parsed_data["is_at_bot"])
+    if not matched_plugin:
+        return None
+
+    # 验证插件命令安全性
+    plugin_name = matched_plugin.get("name", "unknown")
+    request_log.note(plugin=plugin_name)
+    if not security_manager.validate_plugin_access(plugin_name, sender_id):
+        logger.warning(f"[安全防护] 用户 {sender_id} 无权访问插件 {plugin_name}")
+        security_manager.log_audit_event(
+            user_id=sender_id,
+            action="permission_denied",
+            resource="plugin",
+            success=False,
+            event_type="security",
+            details={"resource": "plugin", "plugin_name": plugin_name}
+        )
+        return None
+    return matched_plugin
+
+
+def run_plugin(matched_plugin: Dict, parsed_data) -> bool:
+    """执行插件处理函数并记录耗时与审计日志
+    :return: 插件是否执行成功
+    """
+    plugin_start_time = time.time()
+    try:
+        with request_log.stage("plugin"):
+            call_plugin_handler(matched_plugin, matched_plugin["handler_func"], parsed_data, send_http_msg, logger)
     except Exception as e:
-        # 安全处理raw_msg，避免日志记录异常
-        safe_msg = str(raw_msg)[:20] if raw_msg else ""
-        logger.error(sanitize_log(f"[指令分发] 异常（指令：{safe_msg}...）：{type(e).__name__}，原因：{str(e)}"))
-        return jsonify({"retcode": 1, "msg": f"指令处理异常：{str(e)}"}), 500
+        record_plugin_result(matched_plugin, parsed_data, time.time() - plugin_start_time, e)
+        return False
+    record_plugin_result(matched_plugin, parsed_data, time.time() - plugin_start_time)
+    return True
+
+
+def record_plugin_result(matched_plugin: Dict, parsed_data, plugin_execution_time: float,
+                         error: Optional[Exception] = None) -> None:
+    """记录插件执行结果（监控统计、审计日志），同步/异步执行路径共用"""
+    plugin_name = matched_plugin.get("name", "unknown")
+    sender_id = parsed_data["sender_id"]
+    raw_msg = parsed_data["raw_msg"]
+    monitor_manager.record_plugin_execution(plugin_name, plugin_execution_time, error is None)
+    details = {"plugin_name": plugin_name, "command": raw_msg, "execution_time": plugin_execution_time}
+    if error is None:
+        logger.info(sanitize_log(
+            f"[插件执行] 插件 {plugin_name} 执行成功，耗时: {plugin_execution_time:.3f}s"))
+    else:
+        details["error"] = str(error)
+        logger.error(sanitize_log(
+            f"[插件执行] 插件 {plugin_name} 执行异常：{str(error)}，耗时: {plugin_execution_time:.3f}s"))
+    # 记录插件执行审计日志
+    security_manager.log_audit_event(
+        user_id=sender_id,
+        action="plugin_executed",
+        resource=plugin_name,
+        success=error is None,
+        event_type="plugin",
+        details=details
+    )
+
+
+def needs_fallback_reply(parsed_data) -> bool:
+    """判断未被处理的消息是否需要自动回复/AI对话兜底"""
+    chat_type = parsed_data["chat_type"]
+    raw_msg = parsed_data["raw_msg"]
+
+    # 实现正确的优先级逻辑
+    # 1. 检查是否是特殊命令（如小禹帮助），排除调用AI
+    is_special_command = any(cmd in raw_msg for cmd in ["小禹帮助"])
+
+    # 2. 检查是否触发了自动回复配置，优先使用自动回复
+    is_auto_reply_match = raw_msg in AUTO_REPLIES
+
+    # 3. 检查是否是私信且没有特殊前缀，允许直接对话
+    is_private_direct_chat = chat_type == "private" and not (
+                raw_msg.startswith("/") or raw_msg.startswith("//")) and not is_special_command
+
+    # 4. 群聊@机器人触发
+    is_group_at_reply = chat_type == "group" and parsed_data["is_at_bot"]
+
+    return is_auto_reply_match or is_private_direct_chat or is_group_at_reply
+
+
+def get_fallback_reply_target(parsed_data) -> Tuple[str, str]:
+    """兜底回复的发送目标：群聊回群，私聊回发送者"""
+    if parsed_data["chat_type"] == "group":
+        return parsed_data["target_id"], "group"
+    return parsed_data["sender_id"], "private"
+
+
+def handle_fallback_reply(parsed_data) -> None:
+    """自动回复/AI对话兜底（同步执行）"""
+    try:
+        from plugins.OpenAI_plugin.OpenAI_plugin import handle_auto_reply as openai_auto_reply
+    except ImportError:
+        logger.warning("⚠️ OpenAI插件未加载，自动回复功能失效")
+        return
+
+    # 确保nickname始终有值，传递正确的user_id和nickname
+    nickname = parsed_data.get("nickname") or "用户"
+    auto_reply = openai_auto_reply(parsed_data["raw_msg"], parsed_data["sender_id"], nickname)
+    if auto_reply:
+        target, chat_type = get_fallback_reply_target(parsed_data)
+        send_http_msg(target, auto_reply, chat_type)
 
 
 logger.info("✅ core/handler.py 加载完成")
\ No newline at end of file
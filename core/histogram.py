@@ -0,0 +1,136 @@
+"""延迟直方图模块
+对数线性分桶（HDR风格）的耗时直方图，用于统计 p50 / p95 / p99：
+- 以微秒为单位分桶：每个2的幂区间划分为 SUB_BUCKETS 个线性子桶，相对误差约 1/SUB_BUCKETS，
+  1微秒到数小时只需几百个桶，按字典稀疏存储（实际耗时通常集中在几十个桶内）
+- 记录一次只做一次整数运算和一次字典累加；直方图可直接合并（桶计数相加）
+- 滑动窗口按 SLOT_SECONDS 秒分槽，查询 1m / 5m / 1h 时合并窗口内的槽
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+# 每个2的幂区间的线性子桶数（必须是2的幂）
+SUB_BUCKETS = 16
+_SUB_BITS = SUB_BUCKETS.bit_length()  # log2(SUB_BUCKETS) + 1
+# 滑动窗口的槽长度（秒）
+SLOT_SECONDS = 10
+# 查询窗口：名称 -> 秒数
+WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+
+
+def bucket_index(micros: int) -> int:
+    """耗时（微秒）所在的桶编号"""
+    if micros < SUB_BUCKETS:
+        return micros
+    shift = micros.bit_length() - _SUB_BITS
+    return (shift + 1) * SUB_BUCKETS + (micros >> shift) - SUB_BUCKETS
+
+
+def bucket_range(index: int) -> tuple:
+    """桶编号对应的耗时范围（微秒，含两端）"""
+    if index < SUB_BUCKETS:
+        return index, index
+    shift = index // SUB_BUCKETS - 1
+    sub = index % SUB_BUCKETS + SUB_BUCKETS
+    return sub << shift, ((sub + 1) << shift) - 1
+
+
+class Histogram:
+    """单个时间段的耗时直方图"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        if seconds < 0:
+            seconds = 0.0
+        # 与bucket_index相同，内联以减少一次函数调用
+        micros = int(seconds * 1000000)
+        if micros < SUB_BUCKETS:
+            index = micros
+        else:
+            shift = micros.bit_length() - _SUB_BITS
+            index = (shift + 1) * SUB_BUCKETS + (micros >> shift) - SUB_BUCKETS
+        counts = self.counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        """合并另一个直方图（桶计数相加）"""
+        counts = self.counts
+        for index, count in other.counts.items():
+            counts[index] = counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+        return self
+
+    def percentile(self, q: float) -> float:
+        """分位数（秒，取所在桶的中点，不超过最大值）"""
+        if not self.count:
+            return 0.0
+        rank = max(math.ceil(self.count * q / 100), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = bucket_range(index)
+                return min((low + high) / 2000000, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        """次数、平均值和分位数（毫秒）"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 2),
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2)
+        }
+
+
+class SlidingHistogram:
+    """按时间分槽的滑动窗口直方图（线程安全）"""
+
+    def __init__(self, slot_seconds: int = SLOT_SECONDS, max_window: int = max(WINDOWS.values())):
+        self.slot_seconds = slot_seconds
+        self._slots: deque = deque(maxlen=math.ceil(max_window / slot_seconds))  # (槽编号, Histogram)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        slot_id = int(time.monotonic() // self.slot_seconds)
+        with self._lock:
+            slots = self._slots
+            if not slots or slots[-1][0] != slot_id:
+                slots.append((slot_id, Histogram()))
+            slots[-1][1].record(seconds)
+
+    def window(self, seconds: float) -> Histogram:
+        """合并最近 seconds 秒内各槽的直方图"""
+        first = int(time.monotonic() // self.slot_seconds) - math.ceil(seconds / self.slot_seconds) + 1
+        merged = Histogram()
+        with self._lock:
+            for slot_id, histogram in reversed(self._slots):
+                if slot_id < first:
+                    break
+                merged.merge(histogram)
+        return merged
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """各查询窗口的分位数"""
+        return {name: self.window(seconds).summary() for name, seconds in WINDOWS.items()}
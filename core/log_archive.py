@@ -0,0 +1,380 @@
+"""日志归档模块
+按天轮转出的日志文件（gracybot.log.2026-01-01 等）由后台线程压缩为带索引的归档文件（.garc）：
+- 日志按记录边界切分为约 log_archive_block_bytes 大小的块，每块单独zlib压缩
+- 索引记录每块的偏移、长度和时间范围（时间 -> 偏移），以及按级别、按用户（QQ号后4位的哈希）的块倒排表
+- 查询时先按文件名中的日期跳过时间范围外的归档，再按索引筛出可能命中的块，只解压这些块；
+  当天尚未轮转的日志从文件末尾分块倒序读取，早于查询范围即停止
+日志中的QQ号已脱敏为“用户****1234”，按用户查询时以QQ号后4位匹配
+
+归档文件格式：MAGIC | 压缩块... | 压缩的JSON索引 | 索引偏移(8字节) MAGIC
+归档文件名仍以日期结尾的形式命名（*.log.YYYY-MM-DD.garc），轮转处理器按 backupCount 清理时一并计入
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+from calendar import timegm
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core.config import LOG_ENCODING
+from core.config_manager import config_manager
+from core.logger_manager import logger_manager, LOG_DIR
+
+logger = logger_manager.get_logger("GracyBot-Logger")
+
+MAGIC = b"GLA1"
+ARCHIVE_SUFFIX = ".garc"
+_FOOTER = struct.Struct("<Q4s")
+
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+_LEVEL_RANK = {name: idx for idx, name in enumerate(LEVELS)}
+
+# 人类可读格式的记录首行：2026-01-01 12:00:00 - 日志器 - 级别 - 消息
+_TEXT_HEADER = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) - .*? - ([A-Z]+) - ")
+# 结构化（JSON）格式的记录：{"timestamp": "2026-01-01T04:00:00.000000Z", "level": "INFO", ...}
+_JSON_HEADER = re.compile(r'\{"timestamp": "(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})[^"]*", "level": "([A-Z]+)"')
+# 日志中的用户标识：脱敏后的 ****1234，或未脱敏的5~15位数字
+_USER_TOKEN = re.compile(r"\*{4}(\d{1,4})(?!\d)|(?<!\d)(\d{5,15})(?!\d)")
+# 轮转出的原始日志文件（尚未归档）
+_ROTATED_NAME = re.compile(r"^(.+\.log)\.(\d{4}-\d{2}-\d{2})$")
+# 归档文件名中的日期（轮转处理器以文件内容所属的日期命名）
+_ARCHIVE_DATE = re.compile(r"\.(\d{4}-\d{2}-\d{2})" + re.escape(ARCHIVE_SUFFIX) + "$")
+# 倒序读取当天日志时每次读取的字节数
+TAIL_CHUNK_BYTES = 65536
+# 多线程写入的日志时间戳可能略有乱序，倒序读取时早于查询起点超过该秒数才停止
+_ORDER_SLACK = 5
+
+
+def user_key(user_id: str) -> str:
+    """用户在索引中的键：QQ号后4位的哈希（日志中只保留了后4位）"""
+    return hashlib.blake2b(str(user_id)[-4:].encode(), digest_size=6).hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def _local_ts(stamp: str) -> float:
+    return time.mktime(time.strptime(stamp, "%Y-%m-%d %H:%M:%S"))
+
+
+@lru_cache(maxsize=4096)
+def _utc_ts(stamp: str) -> float:
+    return float(timegm(time.strptime(stamp, "%Y-%m-%dT%H:%M:%S")))
+
+
+def parse_header(line: str) -> Tuple[Optional[float], Optional[str]]:
+    """解析记录首行的时间戳和级别（续行，如异常堆栈，返回 (None, None)）"""
+    found = _TEXT_HEADER.match(line)
+    if found:
+        return _local_ts(found.group(1)), found.group(2)
+    found = _JSON_HEADER.match(line)
+    if found:
+        # 结构化日志的时间为UTC
+        return _utc_ts(found.group(1)), found.group(2)
+    return None, None
+
+
+def iter_records(lines) -> Iterator[Tuple[float, str, str]]:
+    """把日志行合并为记录（首行 + 续行）：(时间戳, 级别, 文本)
+    文件开头没有首行的续行归入时间戳为0的记录
+    """
+    ts, level, parts = 0.0, "INFO", []
+    for line in lines:
+        line_ts, line_level = parse_header(line)
+        if line_ts is not None:
+            if parts:
+                yield ts, level, "".join(parts)
+            ts, level, parts = line_ts, line_level, [line]
+        else:
+            parts.append(line)
+    if parts:
+        yield ts, level, "".join(parts)
+
+
+def iter_lines_reversed(path: str, encoding: str = LOG_ENCODING,
+                        chunk_bytes: int = TAIL_CHUNK_BYTES) -> Iterator[str]:
+    """从文件末尾分块读取，按从新到旧的顺序逐行返回（保留换行符）"""
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        rest = b""
+        while position > 0:
+            size = min(chunk_bytes, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + rest).splitlines(True)
+            # 块的第一行可能不完整，留到读取前一块时拼接
+            rest = lines.pop(0) if position > 0 and lines else b""
+            for line in reversed(lines):
+                yield line.decode(encoding, errors="replace")
+        if rest:
+            yield rest.decode(encoding, errors="replace")
+
+
+def iter_records_reversed(lines) -> Iterator[Tuple[float, str, str]]:
+    """iter_records的倒序版本：输入从新到旧的日志行，按从新到旧的顺序返回记录"""
+    parts: List[str] = []
+    for line in lines:
+        parts.append(line)
+        line_ts, line_level = parse_header(line)
+        if line_ts is not None:
+            yield line_ts, line_level, "".join(reversed(parts))
+            parts = []
+    if parts:
+        yield 0.0, "INFO", "".join(reversed(parts))
+
+
+def _day_end(date: str) -> float:
+    """日期（YYYY-MM-DD）次日零点的时间戳（本地时间）"""
+    year, month, day = map(int, date.split("-"))
+    return time.mktime((year, month, day + 1, 0, 0, 0, 0, 0, -1))
+
+
+def record_users(text: str) -> set:
+    """记录中出现的用户标识（QQ号后4位）"""
+    return {(masked or raw)[-4:] for masked, raw in _USER_TOKEN.findall(text)}
+
+
+def archive_file(path: str, block_bytes: int = 65536, encoding: str = LOG_ENCODING) -> str:
+    """将一个轮转出的日志文件压缩为归档文件（写完后删除原文件）
+    :return: 归档文件路径
+    """
+    target = path + ARCHIVE_SUFFIX
+    tmp = target + ".tmp"
+    blocks: List[List[Any]] = []
+    levels: Dict[str, set] = defaultdict(set)
+    users: Dict[str, set] = defaultdict(set)
+    records = 0
+
+    with open(path, "r", encoding=encoding, errors="replace") as src, open(tmp, "wb") as dst:
+        dst.write(MAGIC)
+        offset = len(MAGIC)
+        chunk: List[str] = []
+        size = 0
+        first_ts = last_ts = None
+
+        def flush_block():
+            nonlocal offset, chunk, size, first_ts, last_ts
+            data = zlib.compress("".join(chunk).encode("utf-8"), 6)
+            dst.write(data)
+            blocks.append([offset, len(data), first_ts or 0.0, last_ts or 0.0, len(chunk)])
+            offset += len(data)
+            chunk, size, first_ts, last_ts = [], 0, None, None
+
+        for ts, level, text in iter_records(src):
+            if size >= block_bytes:
+                flush_block()
+            block_id = len(blocks)
+            chunk.append(text)
+            size += len(text)
+            records += 1
+            if ts:
+                first_ts = ts if first_ts is None else first_ts
+                last_ts = ts
+            levels[level].add(block_id)
+            for user in record_users(text):
+                users[user_key(user)].add(block_id)
+        if chunk:
+            flush_block()
+
+        index = {
+            "version": 1,
+            "source": os.path.basename(path),
+            "records": records,
+            "blocks": blocks,
+            "levels": {name: sorted(ids) for name, ids in levels.items()},
+            "users": {key: sorted(ids) for key, ids in users.items()}
+        }
+        index_data = zlib.compress(json.dumps(index, separators=(",", ":")).encode("utf-8"), 6)
+        dst.write(index_data)
+        dst.write(_FOOTER.pack(offset, MAGIC))
+        dst.flush()
+        os.fsync(dst.fileno())
+
+    os.replace(tmp, target)
+    os.remove(path)
+    return target
+
+
+class ArchiveReader:
+    """读取归档文件：加载索引，按需解压块"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是日志归档文件：{path}")
+            f.seek(-_FOOTER.size, os.SEEK_END)
+            footer_pos = f.tell()
+            index_offset, magic = _FOOTER.unpack(f.read(_FOOTER.size))
+            if magic != MAGIC:
+                raise ValueError(f"归档文件不完整：{path}")
+            f.seek(index_offset)
+            self.index = json.loads(zlib.decompress(f.read(footer_pos - index_offset)))
+        self.blocks = self.index["blocks"]
+
+    def candidate_blocks(self, since: float, until: float, level: Optional[str] = None,
+                         user: Optional[str] = None) -> List[int]:
+        """按时间范围、最低级别和用户筛选可能命中的块"""
+        ids = {idx for idx, block in enumerate(self.blocks)
+               if not block[2] or (block[3] >= since and block[2] <= until)}
+        if level:
+            rank = _LEVEL_RANK.get(level, 0)
+            level_ids = set()
+            for name, posting in self.index["levels"].items():
+                if _LEVEL_RANK.get(name, len(LEVELS)) >= rank:
+                    level_ids.update(posting)
+            ids &= level_ids
+        if user:
+            ids &= set(self.index["users"].get(user_key(user), ()))
+        return sorted(ids)
+
+    def read_block(self, block_id: int) -> str:
+        offset, length = self.blocks[block_id][:2]
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length)).decode("utf-8")
+
+
+class LogArchive:
+    """日志归档：接管轮转处理器的rotator，在后台线程中压缩并建立索引；提供按时间/级别/用户的查询"""
+
+    def __init__(self):
+        self.enabled = config_manager.get("log_archive_enabled", True)
+        self.block_bytes = config_manager.get("log_archive_block_bytes", 65536)
+        self.log_dir = LOG_DIR
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        self.archived = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors = 0
+
+    # ---------- 归档 ----------
+    def attach(self, handler) -> None:
+        """让轮转处理器在轮转后把旧文件交给归档线程"""
+        if self.enabled:
+            handler.rotator = self.rotate
+
+    def rotate(self, source: str, dest: str) -> None:
+        """轮转处理器的rotator：先改名（与默认行为相同），压缩在后台线程进行"""
+        if os.path.exists(source):
+            os.rename(source, dest)
+            self.submit(dest)
+
+    def submit(self, path: str) -> None:
+        if not self._worker:
+            with self._start_lock:
+                if not self._worker:
+                    self._worker = threading.Thread(target=self._worker_loop, name="log-archiver", daemon=True)
+                    self._worker.start()
+        self._queue.put(path)
+
+    def archive_pending(self) -> int:
+        """提交之前轮转出但尚未归档的日志文件（如归档过程中进程退出）
+        :return: 提交的文件数
+        """
+        if not self.enabled or not os.path.isdir(self.log_dir):
+            return 0
+        count = 0
+        for name in sorted(os.listdir(self.log_dir)):
+            if _ROTATED_NAME.match(name):
+                self.submit(os.path.join(self.log_dir, name))
+                count += 1
+        return count
+
+    def _worker_loop(self):
+        while True:
+            path = self._queue.get()
+            if not os.path.exists(path):
+                continue
+            try:
+                size = os.path.getsize(path)
+                target = archive_file(path, self.block_bytes)
+                self.archived += 1
+                self.bytes_in += size
+                self.bytes_out += os.path.getsize(target)
+                logger.info(f"🗜️ 日志已归档：{os.path.basename(target)}（{size} → {os.path.getsize(target)} 字节）")
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"❌ 日志归档失败（{os.path.basename(path)}）：{str(e)}")
+
+    # ---------- 查询 ----------
+    def query(self, since: float, until: float, level: Optional[str] = None, user: Optional[str] = None,
+              limit: int = 20, base_name: str = "gracybot.log") -> List[Dict[str, Any]]:
+        """查询日志记录（返回时间范围内最新的limit条，按时间先后排列）
+        :param level: 最低级别（如WARNING表示WARNING及以上）
+        :param user: QQ号（按后4位匹配脱敏后的日志）
+        """
+        level = level.upper() if level else None
+        suffix = user[-4:] if user else None
+        rank = _LEVEL_RANK.get(level, 0) if level else 0
+        results: List[Dict[str, Any]] = []
+
+        def collect(records) -> bool:
+            """从新到旧收集记录，达到条数返回True"""
+            for ts, rec_level, text in records:
+                if not since <= ts <= until:
+                    continue
+                if level and _LEVEL_RANK.get(rec_level, len(LEVELS)) < rank:
+                    continue
+                if suffix and suffix not in record_users(text):
+                    continue
+                results.append({"ts": ts, "level": rec_level, "text": text.rstrip("\n")})
+                if len(results) >= limit:
+                    return True
+            return False
+
+        # 当天尚未轮转的日志：从末尾倒序读取，记录早于查询起点后停止
+        current = os.path.join(self.log_dir, base_name)
+        if os.path.exists(current) and os.path.getmtime(current) >= since:
+            records = itertools.takewhile(lambda record: record[0] >= since - _ORDER_SLACK or not record[0],
+                                          iter_records_reversed(iter_lines_reversed(current)))
+            if collect(records):
+                return results[::-1]
+
+        # 已归档的日志（新的在前）：文件名中的日期D表示记录都早于D次日零点，
+        # 且都晚于更早一份归档日期的次日零点，据此跳过时间范围外的归档，不打开文件
+        archives = []
+        for name in os.listdir(self.log_dir) if os.path.isdir(self.log_dir) else ():
+            found = _ARCHIVE_DATE.search(name)
+            if found and name.startswith(base_name + "."):
+                archives.append((found.group(1), name))
+        archives.sort(reverse=True)
+        for idx, (date, name) in enumerate(archives):
+            if _day_end(date) <= since:
+                break
+            if idx + 1 < len(archives) and _day_end(archives[idx + 1][0]) > until:
+                continue
+            try:
+                reader = ArchiveReader(os.path.join(self.log_dir, name))
+            except (OSError, ValueError, zlib.error) as e:
+                logger.error(f"❌ 读取日志归档 {name} 失败：{str(e)}")
+                continue
+            for block_id in reversed(reader.candidate_blocks(since, until, level, user)):
+                if collect(reversed(list(iter_records(reader.read_block(block_id).splitlines(True))))):
+                    return results[::-1]
+        return results[::-1]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """归档统计"""
+        return {
+            "enabled": self.enabled,
+            "pending": self._queue.qsize(),
+            "archived": self.archived,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "errors": self.errors
+        }
+
+
+# 全局日志归档实例
+log_archive = LogArchive()
@@ -0,0 +1,123 @@
+"""日志采样模块
+按调用点（源文件 + 行号）限制INFO及以下日志的输出频率：
+- 每个调用点每个时间窗口（log_site_window 秒）最多输出 log_site_limit 条，超出的只计数
+- log_site_rules 可按“文件名:行号”或“文件名”单独设置上限（-1为不限制，0为全部省略）
+- 每个时间窗口汇总一次被省略的条数（按调用点），以一条INFO日志输出
+- 开启请求摘要（log_canonical_requests）时，请求处理过程中的INFO及以下日志折叠进摘要行
+- 命中调试追踪（/调试追踪）的请求不参与采样
+WARNING及以上级别的日志从不采样；采样需通过 log_sampling_enabled 显式开启
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from core import request_log
+from core.config_manager import config_manager
+
+# 每次汇总列出的调用点数量
+REPORT_TOP_SITES = 5
+
+
+class LogSampler(logging.Filter):
+    """调用点限流过滤器（挂在输出处理器上，同一条记录只判断一次，结果记在记录的sampled属性上）"""
+
+    def __init__(self, limit: int = 30, window: float = 60, rules: Optional[Dict[str, int]] = None,
+                 max_level: int = logging.INFO):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.rules = dict(rules or {})
+        self.max_level = max_level
+        self._sites: Dict[Tuple[str, int], List[int]] = {}  # 调用点 -> [窗口编号, 本窗口条数]
+        self._limits: Dict[Tuple[str, int], int] = {}
+        self._suppressed: Dict[str, int] = {}
+        self._next_report = time.monotonic() + window
+
+        self.total_suppressed = 0
+        self.total_folded = 0
+        self.reports = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        decision = record.__dict__.get("sampled")
+        if decision is None:
+            decision = self._decide(record)
+            record.sampled = decision
+        return decision
+
+    def _decide(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or record.__dict__.get("sampling_exempt"):
+            return True
+        summary = request_log.current()
+        if summary is not None:
+            if summary.traced:
+                return True
+            if summary.canonical:
+                summary.folded += 1
+                self.total_folded += 1
+                return False
+
+        now = time.monotonic()
+        if now >= self._next_report:
+            self._report(now)
+        key = (record.pathname, record.lineno)
+        limit = self._limits.get(key)
+        if limit is None:
+            limit = self._limit_for(record)
+            self._limits[key] = limit
+        if limit < 0:
+            return True
+
+        window_id = int(now // self.window)
+        state = self._sites.get(key)
+        if state is None or state[0] != window_id:
+            state = self._sites[key] = [window_id, 0]
+        state[1] += 1
+        if state[1] <= limit:
+            return True
+        site = f"{record.filename}:{record.lineno}"
+        self._suppressed[site] = self._suppressed.get(site, 0) + 1
+        self.total_suppressed += 1
+        return False
+
+    def _limit_for(self, record: logging.LogRecord) -> int:
+        for key in (f"{record.filename}:{record.lineno}", record.filename):
+            if key in self.rules:
+                return int(self.rules[key])
+        return self.limit if self.limit > 0 else -1
+
+    def _report(self, now: float):
+        """输出上一个窗口被省略的日志条数"""
+        self._next_report = now + self.window
+        suppressed, self._suppressed = self._suppressed, {}
+        if not suppressed:
+            return
+        self.reports += 1
+        top = sorted(suppressed.items(), key=lambda item: item[1], reverse=True)[:REPORT_TOP_SITES]
+        sites = "，".join(f"{site}×{count}" for site, count in top)
+        more = f" 等{len(suppressed)}处" if len(suppressed) > REPORT_TOP_SITES else ""
+        logging.getLogger("GracyBot-Logger").info(
+            f"🔇 [日志采样] 过去{self.window:g}秒省略 {sum(suppressed.values())} 条日志：{sites}{more}",
+            extra={"sampling_exempt": True})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """采样统计"""
+        return {
+            "site_limit": self.limit,
+            "window": self.window,
+            "sites": len(self._sites),
+            "suppressed": self.total_suppressed,
+            "folded": self.total_folded,
+            "reports": self.reports
+        }
+
+
+def create_log_sampler() -> Optional[LogSampler]:
+    """按配置创建采样过滤器（未开启采样时返回None）"""
+    if not config_manager.get("log_sampling_enabled", False):
+        return None
+    return LogSampler(
+        limit=config_manager.get("log_site_limit", 30),
+        window=config_manager.get("log_site_window", 60),
+        rules=config_manager.get("log_site_rules", {})
+    )
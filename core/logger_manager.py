@@ -1,13 +1,17 @@
+import atexit
 import os
 import json
 import logging
 import logging.handlers
 import sys
+import threading
 import traceback
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 from core.config import LOG_ENCODING, LOG_LEVEL, DEBUG_MODE, ROBOT_QQ
+from core.config_manager import config_manager
 # 导入Logo模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from start_logo.gracybot_logo import GracyBotLogo
@@ -15,6 +19,19 @@ from start_logo.gracybot_logo import GracyBotLogo
 # 日志目录
 LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
 
+def context_text(record: logging.LogRecord) -> str:
+    """日志记录上下文的文本形式（同一记录经过多个处理器时只序列化一次）"""
+    text = getattr(record, 'context_text', None)
+    if text is None:
+        context = record.context
+        if isinstance(context, (dict, list)):
+            text = json.dumps(context, ensure_ascii=False, default=str)
+        else:
+            text = str(context)
+        record.context_text = text
+    return text
+
+
 class StructuredLogFormatter(logging.Formatter):
     """结构化日志格式化器，支持JSON格式输出"""
     def __init__(self, structured: bool = False, include_stack_info: bool = False):
@@ -30,6 +47,13 @@ class StructuredLogFormatter(logging.Formatter):
                 datefmt='%Y-%m-%d %H:%M:%S'
             )
     
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        formatted = super().formatMessage(record)
+        context = getattr(record, 'context', None)
+        if context:
+            formatted = f"{formatted} | 上下文: {context_text(record)}"
+        return formatted
+
     def format(self, record: logging.LogRecord) -> str:
         if self.structured:
             # 构建结构化日志数据
@@ -70,7 +94,7 @@ class StructuredLogFormatter(logging.Formatter):
             }
             reset = '\033[0m'
             
-            # 格式化原始记录
+            # 格式化原始记录（上下文由formatMessage追加在消息后）
             formatted = super().format(record)
             
             # 如果是控制台输出且支持颜色，添加颜色
@@ -85,6 +109,208 @@ class StructuredLogFormatter(logging.Formatter):
             
             return formatted
 
+class AsyncLogDispatcher:
+    """异步日志写出：请求线程只把记录追加到有界缓冲区，后台线程批量执行过滤器（脱敏）、格式化并写出
+    - 缓冲区达到容量的3/4后先丢弃DEBUG记录，完全写满后才丢弃其他级别的记录（均计数，并在下一批写出时提示）
+    - 每个输出处理器每批只加锁、写入和flush一次；按时间轮转的文件处理器在批内仍按条检查是否需要轮转
+    - 记录的参数在后台线程才格式化，日志参数中的可变对象在写出前被修改时，输出的是修改后的内容
+    - 停止后转为同步写出（关闭过程中的日志不会丢失）
+    """
+
+    def __init__(self, capacity: int = 10000, batch_size: int = 256, flush_interval: float = 0.2):
+        self.capacity = capacity
+        self.debug_limit = capacity * 3 // 4
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # (处理器, 日志器名称)：名称不为空时只写出该日志器及其子日志器的记录
+        self.routes: List[Tuple[logging.Handler, str]] = []
+        self.filters: List[Any] = []
+
+        self._buffer: deque = deque()
+        self._wakeup = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.dropped_debug = 0
+        self.filter_errors = 0
+        self._reported_drops = 0
+
+    def add_route(self, handler: logging.Handler, logger_name: str = ""):
+        self.routes.append((handler, logger_name))
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- 写入端（请求线程） ----------
+    def enqueue(self, record: logging.LogRecord):
+        if not self._running:
+            with self._write_lock:
+                self._write_batch([record])
+            return
+        buffer = self._buffer
+        size = len(buffer)
+        if size >= self.debug_limit and record.levelno <= logging.DEBUG:
+            self.dropped_debug += 1
+            return
+        if size >= self.capacity:
+            self.dropped += 1
+            return
+        buffer.append(record)
+        if record.levelno >= logging.ERROR or size + 1 >= self.batch_size:
+            self._wakeup.set()
+
+    # ---------- 后台写出线程 ----------
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self) -> int:
+        """写出缓冲区中的全部记录
+        :return: 本次写出条数
+        """
+        total = 0
+        with self._write_lock:
+            buffer = self._buffer
+            while buffer:
+                batch = []
+                while buffer and len(batch) < self.batch_size:
+                    batch.append(buffer.popleft())
+                total += len(batch)
+                self._write_batch(batch)
+            drops = self.dropped + self.dropped_debug
+            if drops > self._reported_drops:
+                record = logging.getLogger("GracyBot-Logger").makeRecord(
+                    "GracyBot-Logger", logging.WARNING, __file__, 0,
+                    f"⚠️ 日志缓冲区已满，累计丢弃 {drops} 条日志（其中DEBUG {self.dropped_debug} 条）", None, None)
+                self._reported_drops = drops
+                self._write_batch([record])
+        return total
+
+    def _write_batch(self, records: List[logging.LogRecord]):
+        if self.filters:
+            kept = []
+            for record in records:
+                try:
+                    if all(f.filter(record) if hasattr(f, "filter") else f(record) for f in self.filters):
+                        kept.append(record)
+                except Exception as e:
+                    # 过滤器（脱敏）失败时不写出原始内容，只保留级别和时间并计数
+                    self.filter_errors += 1
+                    kept.append(self._redacted(record, e))
+            records = kept
+        for handler, logger_name in self.routes:
+            if isinstance(handler, logging.StreamHandler):
+                self._write_stream(handler, logger_name, records)
+                continue
+            for record in records:
+                if self._accepts(handler, logger_name, record):
+                    handler.handle(record)
+        self.written += len(records)
+        self.batches += 1
+
+    @staticmethod
+    def _redacted(record: logging.LogRecord, error: Exception) -> logging.LogRecord:
+        """过滤失败的记录：替换为不含原始内容的占位记录"""
+        return logging.getLogger(record.name).makeRecord(
+            record.name, record.levelno, record.pathname, record.lineno,
+            f"[日志过滤异常：{type(error).__name__}，原内容已隐藏]", None, None)
+
+    @staticmethod
+    def _accepts(handler: logging.Handler, logger_name: str, record: logging.LogRecord) -> bool:
+        if record.levelno < handler.level:
+            return False
+        if logger_name and record.name != logger_name and not record.name.startswith(logger_name + "."):
+            return False
+        return bool(handler.filter(record))
+
+    def _write_stream(self, handler: logging.StreamHandler, logger_name: str, records: List[logging.LogRecord]):
+        """同一处理器的一批记录拼接后一次写入"""
+        rotating = isinstance(handler, logging.handlers.BaseRotatingHandler)
+        chunks: List[str] = []
+        last = None
+        handler.acquire()
+        try:
+            for record in records:
+                if not self._accepts(handler, logger_name, record):
+                    continue
+                try:
+                    if rotating and handler.shouldRollover(record):
+                        self._flush_chunks(handler, chunks, last)
+                        chunks = []
+                        handler.doRollover()
+                    chunks.append(handler.format(record) + handler.terminator)
+                    last = record
+                except Exception:
+                    handler.handleError(record)
+            self._flush_chunks(handler, chunks, last)
+        finally:
+            handler.release()
+
+    @staticmethod
+    def _flush_chunks(handler: logging.StreamHandler, chunks: List[str], last: Optional[logging.LogRecord]):
+        if not chunks:
+            return
+        try:
+            if handler.stream is None and isinstance(handler, logging.FileHandler):
+                handler.stream = handler._open()
+            handler.stream.write("".join(chunks))
+            handler.flush()
+        except Exception:
+            handler.handleError(last)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓冲区积压与写出统计"""
+        return {
+            "enabled": self._running,
+            "pending": len(self._buffer),
+            "capacity": self.capacity,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "dropped_debug": self.dropped_debug,
+            "filter_errors": self.filter_errors
+        }
+
+    def shutdown(self, timeout: float = 5):
+        """停止后台线程并写完缓冲区中的记录（之后的日志同步写出）"""
+        if self._running:
+            self._running = False
+            self._wakeup.set()
+            if self._thread is not None and self._thread is not threading.current_thread():
+                self._thread.join(timeout=timeout)
+        self.flush()
+
+
+class AsyncLogHandler(logging.Handler):
+    """挂在根日志器上的处理器：只把记录交给异步写出线程"""
+
+    def __init__(self, dispatcher: AsyncLogDispatcher):
+        super().__init__(logging.NOTSET)
+        self.dispatcher = dispatcher
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # 不需要Handler.handle的加锁，入队本身是线程安全的；
+        # 过滤器（日志采样）在调用线程执行，被省略的记录不进入队列
+        if self.filters and not self.filter(record):
+            return False
+        self.dispatcher.enqueue(record)
+        return True
+
+    def emit(self, record: logging.LogRecord):
+        self.dispatcher.enqueue(record)
+
+
 class LoggerManager:
     """企业级日志管理器"""
     _instance = None
@@ -94,6 +320,9 @@ class LoggerManager:
             cls._instance = super().__new__(cls)
             cls._instance._loggers = {}
             cls._instance._setup_completed = False
+            cls._instance._async = None  # 异步写出线程（log_async关闭时为None）
+            cls._instance._output_handlers = []
+            cls._instance._sampler = None  # 调用点日志采样（log_sampling_enabled关闭时为None）
         return cls._instance
     
     def setup_logging(self, log_level: str = LOG_LEVEL, debug_mode: bool = False) -> bool:
@@ -113,7 +342,10 @@ class LoggerManager:
             root_logger = logging.getLogger()
             root_logger.setLevel(getattr(logging, log_level))
             
-            # 清除已有的处理器
+            # 清除已有的处理器（重复初始化时先写完并停止之前的异步写出线程）
+            if self._async is not None:
+                self._async.shutdown()
+                self._async = None
             for handler in root_logger.handlers[:]:
                 root_logger.removeHandler(handler)
             
@@ -186,11 +418,56 @@ class LoggerManager:
             http_handler.setLevel(logging.INFO)
             http_formatter = StructuredLogFormatter(structured=structured)
             http_handler.setFormatter(http_formatter)
+
+            # 轮转出的旧日志交给归档线程压缩并建立索引（供 /日志查询 使用）
+            from core.log_archive import log_archive
+            for handler in (file_handler, error_handler, http_handler):
+                log_archive.attach(handler)
+            log_archive.archive_pending()
             
             # 清除HTTP日志器的处理器，只保留我们的文件处理器
             for handler in http_logger.handlers[:]:
                 http_logger.removeHandler(handler)
-            http_logger.addHandler(http_handler)
+
+            self._output_handlers = [console_handler, file_handler, error_handler]
+
+            # 按调用点限流INFO及以下日志（开启请求摘要时折叠请求处理过程中的日志）
+            from core.log_sampling import create_log_sampler
+            self._sampler = create_log_sampler()
+            # 定向调试追踪：追踪期间根日志器降到DEBUG，只放行被追踪请求的DEBUG日志
+            from core import request_log
+            from core.debug_trace import DebugTraceFilter, debug_tracer
+            debug_tracer.rebase()
+            record_filters = [DebugTraceFilter(debug_tracer, request_log.current)]
+            if self._sampler is not None:
+                record_filters.append(self._sampler)
+
+            if config_manager.get("log_async", True):
+                # 异步模式：输出处理器交给后台线程，根日志器上只保留入队处理器
+                # （HTTP日志器的记录经传播进入同一队列，按日志器名称路由到HTTP日志文件）
+                for handler in self._output_handlers:
+                    root_logger.removeHandler(handler)
+                dispatcher = AsyncLogDispatcher(
+                    capacity=config_manager.get("log_queue_size", 10000),
+                    batch_size=config_manager.get("log_batch_size", 256),
+                    flush_interval=config_manager.get("log_flush_interval", 0.2)
+                )
+                for handler in self._output_handlers:
+                    dispatcher.add_route(handler)
+                dispatcher.add_route(http_handler, http_logger.name)
+                dispatcher.start()
+                async_handler = AsyncLogHandler(dispatcher)
+                for record_filter in record_filters:
+                    async_handler.addFilter(record_filter)
+                root_logger.addHandler(async_handler)
+                self._async = dispatcher
+                atexit.register(self.shutdown)
+            else:
+                http_logger.addHandler(http_handler)
+                # 采样结果缓存在记录上，同一条记录在各处理器上只判断一次
+                for handler in self._output_handlers + [http_handler]:
+                    for record_filter in record_filters:
+                        handler.addFilter(record_filter)
             
             self._setup_completed = True
             
@@ -233,8 +510,11 @@ class LoggerManager:
                 # 设置根日志器级别
                 root_logger = logging.getLogger()
                 root_logger.setLevel(log_level)
+                # 调试追踪生效时以新级别为原级别，根日志器保持DEBUG
+                from core.debug_trace import debug_tracer
+                debug_tracer.rebase()
                 # 更新所有处理器的级别
-                for handler in root_logger.handlers:
+                for handler in root_logger.handlers + (self._output_handlers if self._async else []):
                     if isinstance(handler, logging.StreamHandler):
                         handler.setLevel(log_level)
                 self.get_logger('GracyBot-Logger').info(f"🔄 全局日志级别设置为 {level}")
@@ -244,41 +524,60 @@ class LoggerManager:
             print(f"❌ 设置日志级别失败: {str(e)}")
             return False
     
-    def log_with_context(self, logger, level, message="无日志消息", context=None, exc_info=False, **kwargs) -> None:
-        """带上下文信息的日志记录"""
-        import traceback
-        try:
-            # 检查logger是否为字符串类型（可能传入的是logger名称）
-            if isinstance(logger, str):
-                logger = self.get_logger(logger)
-            
-            # 确保logger是有效的logging.Logger对象
-            if not hasattr(logger, 'log'):
-                print(f"❌ 无效的logger对象: {type(logger)}")
-                return
-            
-            # 构建日志消息（包含上下文信息）
-            if context:
-                if isinstance(context, dict):
-                    context_str = json.dumps(context, ensure_ascii=False)
-                else:
-                    context_str = str(context)
-                full_message = f"{message} | 上下文: {context_str}"
+    def add_record_filter(self, record_filter, logger_names=("",)) -> None:
+        """添加作用于日志记录的过滤器（如日志脱敏）
+        异步模式下由后台写出线程在格式化前对所有记录执行一次；同步模式下挂到指定的日志器上
+        """
+        if self._async is not None:
+            self._async.filters.append(record_filter)
+        else:
+            for name in logger_names:
+                self.get_logger(name).addFilter(record_filter)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """异步日志写出统计（同步模式下只返回enabled=False）和日志采样统计"""
+        stats = self._async.get_stats() if self._async is not None else {"enabled": False}
+        if self._sampler is not None:
+            stats["sampling"] = self._sampler.get_stats()
+        return stats
+
+    def flush(self) -> None:
+        """写完异步缓冲区中的日志"""
+        if self._async is not None:
+            self._async.flush()
+
+    def shutdown(self) -> None:
+        """停止异步写出线程并写完剩余日志（之后的日志同步写出）"""
+        if self._async is not None:
+            self._async.shutdown()
+
+    def log_with_context(self, logger, level, message="无日志消息", context=None, exc_info=False,
+                         extra: Optional[Dict[str, Any]] = None, **kwargs) -> None:
+        """带上下文信息的日志记录
+        级别未启用时直接返回（不构造记录、不序列化上下文）；上下文作为记录的context属性，
+        由格式化器在输出时序列化一次（JSON格式输出为独立的context字段，人类可读格式追加在消息后）
+        :param level: 日志级别（logging.INFO 或 'INFO'）
+        :param context: 上下文（一般为字典），其余关键字参数合并到上下文中
+        :param extra: 附加到日志记录上的其他属性
+        """
+        if isinstance(logger, str):
+            logger = self.get_logger(logger)
+        if level.__class__ is not int:
+            level = logging.getLevelName(str(level).upper())
+            if not isinstance(level, int):
+                level = logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        if kwargs:
+            if isinstance(context, dict):
+                context = {**context, **kwargs}
+            elif context:
+                context = {"context": context, **kwargs}
             else:
-                full_message = message
-            
-            # 尝试使用基本日志记录（不使用extra参数）
-            try:
-                logger.log(level, full_message, exc_info=exc_info)
-                print(f"✅ 日志记录成功: {logger.name if hasattr(logger, 'name') else 'unknown'}")
-            except Exception as inner_e:
-                print(f"❌ 日志记录失败: {str(inner_e)}")
-                # 作为最后的手段，尝试直接调用error方法
-                if hasattr(logger, 'error'):
-                    logger.error(f"日志记录失败: {full_message}", exc_info=exc_info)
-        except Exception as e:
-            print(f"❌ log_with_context异常: {str(e)}")
-            traceback.print_exc()
+                context = kwargs
+        if context:
+            extra = {**extra, "context": context} if extra else {"context": context}
+        logger.log(level, message, exc_info=exc_info, extra=extra, stacklevel=2)
 
 # 创建全局日志管理器实例
 logger_manager = LoggerManager()
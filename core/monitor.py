@@ -6,11 +6,14 @@ import time
 import psutil
 import threading
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable
 from collections import deque
 import flask
 
-from core.utils import logger
+from core.utils import logger, logger_manager
+from core.log_archive import log_archive
+from core.debug_trace import debug_tracer
+from core.histogram import SlidingHistogram
 
 class MonitorManager:
     """监控管理器，负责收集和管理系统监控数据"""
@@ -35,6 +38,8 @@ class MonitorManager:
             "total_received": 0,
             "total_processed": 0,
             "total_errors": 0,
+            "total_duplicates": 0,  # 被去重缓存丢弃的重复投递事件
+            "shed": {},  # 准入控制削减的事件（原因 -> 数量）
             "response_times": deque(maxlen=100),  # 最近100次响应时间
             "per_minute": deque(maxlen=60)  # 每分钟消息统计
         }
@@ -42,6 +47,14 @@ class MonitorManager:
         # 插件执行统计
         self.plugin_stats = {}
         
+        # 耗时直方图（指标名 -> 滑动窗口直方图）：callback 整个回调、plugin.<插件名>、
+        # napcat_send 消息发送、openai AI接口调用
+        self.latency: Dict[str, SlidingHistogram] = {}
+        self._latency_lock = threading.Lock()
+        
+        # 外部组件指标提供者（名称 -> 返回指标字典的函数），如分发队列
+        self.metrics_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        
         # 系统启动时间
         self.start_time = time.time()
         
@@ -100,6 +113,7 @@ class MonitorManager:
         """记录处理完成的消息和响应时间"""
         self.message_stats["total_processed"] += 1
         self.message_stats["response_times"].append(processing_time * 1000)  # 转换为毫秒
+        self.record_latency("callback", processing_time)
         # 更新最近一分钟的统计
         if self.message_stats["per_minute"]:
             self.message_stats["per_minute"][-1]["processed"] += 1
@@ -111,6 +125,15 @@ class MonitorManager:
         if self.message_stats["per_minute"]:
             self.message_stats["per_minute"][-1]["errors"] += 1
     
+    def record_duplicate_event(self):
+        """记录被丢弃的重复投递事件"""
+        self.message_stats["total_duplicates"] += 1
+    
+    def record_event_shed(self, reason: str):
+        """记录被准入控制削减的事件"""
+        shed = self.message_stats["shed"]
+        shed[reason] = shed.get(reason, 0) + 1
+    
     def record_plugin_execution(self, plugin_name: str, execution_time: float, success: bool):
         """记录插件执行情况"""
         if plugin_name not in self.plugin_stats:
@@ -127,6 +150,34 @@ class MonitorManager:
             stats["successful_executions"] += 1
         stats["total_time"] += execution_time
         stats["avg_execution_time"] = stats["total_time"] / stats["total_executions"]
+        self.record_latency(f"plugin.{plugin_name}", execution_time)
+    
+    def record_latency(self, metric: str, seconds: float):
+        """记录一次耗时到指标的直方图（首次记录时创建）"""
+        histogram = self.latency.get(metric)
+        if histogram is None:
+            with self._latency_lock:
+                histogram = self.latency.setdefault(metric, SlidingHistogram())
+        histogram.record(seconds)
+    
+    def get_latency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各指标在 1m / 5m / 1h 窗口内的次数、平均值和 p50 / p95 / p99（毫秒）"""
+        return {metric: histogram.summary() for metric, histogram in sorted(self.latency.items())}
+    
+    def register_metrics_provider(self, name: str, provider: Callable[[], Dict[str, Any]]):
+        """注册外部组件指标提供者，其指标会合并到状态和性能指标输出中"""
+        self.metrics_providers[name] = provider
+    
+    def _collect_provider_metrics(self) -> Dict[str, Any]:
+        """收集所有外部组件的指标，单个提供者异常不影响整体输出"""
+        collected = {}
+        for name, provider in list(self.metrics_providers.items()):
+            try:
+                collected[name] = provider()
+            except Exception as e:
+                logger.error(f"收集组件 {name} 指标失败: {str(e)}")
+                collected[name] = {"error": str(e)}
+        return collected
     
     def get_system_status(self) -> Dict[str, Any]:
         """获取系统当前状态"""
@@ -160,9 +211,13 @@ class MonitorManager:
                 "total_received": self.message_stats["total_received"],
                 "total_processed": self.message_stats["total_processed"],
                 "total_errors": self.message_stats["total_errors"],
+                "total_duplicates": self.message_stats["total_duplicates"],
+                "shed_by_reason": dict(self.message_stats["shed"]),
                 "error_rate_percent": round(error_rate, 2),
                 "avg_response_time_ms": round(avg_response_time, 2)
-            }
+            },
+            "latency": self.get_latency_stats(),
+            "components": self._collect_provider_metrics()
         }
     
     def get_health_check(self) -> Dict[str, Any]:
@@ -190,7 +245,9 @@ class MonitorManager:
                 "minute_history": list(self.message_stats["per_minute"]),
                 "response_times": list(self.message_stats["response_times"])
             },
-            "plugin_stats": self.plugin_stats
+            "plugin_stats": self.plugin_stats,
+            "latency": self.get_latency_stats(),
+            "components": self._collect_provider_metrics()
         }
     
     def _format_uptime(self, seconds: float) -> str:
@@ -219,6 +276,9 @@ class MonitorManager:
 
 # 创建全局单例实例
 monitor_manager = MonitorManager()
+monitor_manager.register_metrics_provider("logging", logger_manager.get_stats)
+monitor_manager.register_metrics_provider("log_archive", log_archive.get_stats)
+monitor_manager.register_metrics_provider("debug_trace", debug_tracer.get_stats)
 
 # Flask路由函数
 def register_health_check_routes(app: flask.Flask):
@@ -243,3 +303,34 @@ def register_health_check_routes(app: flask.Flask):
         """系统状态端点"""
         status = monitor_manager.get_system_status()
         return flask.jsonify(status)
+
+
+def register_async_health_check_routes(app, run_sync):
+    """注册健康检查相关路由（aiohttp异步服务版本，与Flask路由输出一致）
+    :param run_sync: 在线程池中执行同步函数的协程函数（AsyncServer.run_sync），
+                     指标汇总会调用各指标提供者（SQLite查询、文件统计等），不能在事件循环中执行
+    """
+    import json
+    from functools import partial
+    from aiohttp import web
+    
+    # 指标中包含datetime对象，序列化时转为字符串
+    dumps = partial(json.dumps, ensure_ascii=False, default=str)
+    
+    async def health_check(request):
+        """健康检查端点"""
+        health_info = await run_sync(monitor_manager.get_health_check)
+        status_code = 200 if health_info["status"] == "healthy" else 503
+        return web.json_response(health_info, status=status_code, dumps=dumps)
+    
+    async def get_metrics(request):
+        """性能指标端点"""
+        return web.json_response(await run_sync(monitor_manager.get_performance_metrics), dumps=dumps)
+    
+    async def get_status(request):
+        """系统状态端点"""
+        return web.json_response(await run_sync(monitor_manager.get_system_status), dumps=dumps)
+    
+    app.router.add_get('/health', health_check)
+    app.router.add_get('/metrics', get_metrics)
+    app.router.add_get('/status', get_status)
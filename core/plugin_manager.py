@@ -1,10 +1,14 @@
 import os
+import inspect
+import logging
 import importlib.util
 from typing import Dict, List, Callable, Optional, Set, Tuple
 import re
 # 使用相对导入
 from .utils import logger
 from .config import ROBOT_QQ, MASTER_QQ
+from .command_index import CommandIndex
+from .event_router import event_router
 
 # 全局插件注册池：存储所有合法插件的元信息+处理函数
 PLUGIN_REGISTRY: List[Dict] = []
@@ -13,6 +17,8 @@ LOADED_PLUGIN_VERSIONS: Dict[str, str] = {}
 # 用于检测循环依赖
 DEPENDENCY_GRAPH: Dict[str, List[str]] = {}
 VISITED: Set[str] = set()
+# 指令索引：注册池编译后的多模式匹配自动机
+_command_index = CommandIndex()
 
 
 class PluginManager:
@@ -150,6 +156,22 @@ class PluginManager:
             # 默认handler命名规则
             meta["handler"] = f"handle_{plugin_name.replace('_plugin', '').replace('-', '_')}"
         
+        # 处理可选的处理函数签名声明（"event"=handler(event, bot)，缺省为旧版7参数签名）
+        if "handler_style" in adapter_data:
+            meta["handler_style"] = adapter_data["handler_style"]
+        
+        # 处理可选的异步入口
+        if "async_handler" in adapter_data:
+            meta["async_handler"] = adapter_data["async_handler"]
+        
+        # 处理可选的事件处理器
+        if "event_handlers" in adapter_data:
+            meta["event_handlers"] = adapter_data["event_handlers"]
+        
+        # 处理可选的AI指令声明（入队模式下进入ai通道）
+        if "ai_commands" in adapter_data:
+            meta["ai_commands"] = adapter_data["ai_commands"]
+        
         # 处理依赖项
         if "dependencies" in adapter_data:
             meta["dependencies"] = adapter_data["dependencies"]
@@ -189,6 +211,7 @@ class PluginManager:
         self._load_plugins_by_dependency(plugins_meta, plugin_dir)
         
         self._initialized = True
+        self.rebuild_command_index()
         # 打印注册结果（关键调试信息，明确注册成功数量）
         logger.info(f"\n✅ 插件管理器初始化完成！")
         logger.info(f"📊 共注册成功 {len(PLUGIN_REGISTRY)} 个插件：")
@@ -359,10 +382,35 @@ class PluginManager:
                     logger.error(f"❌ 插件 {plugin_name} 中 {handler_func_name} 不是可调用函数，跳过加载")
                     return False
                 
+                handler_style = plugin_meta.get("handler_style", "legacy")
+                if handler_style not in ("event", "legacy"):
+                    logger.warning(f"⚠️ 插件 {plugin_name} 的 handler_style「{handler_style}」无效，按旧版签名调用")
+                    plugin_meta["handler_style"] = "legacy"
+                
+                # 可选的异步入口（asyncio服务模式下优先使用，缺失时回退到同步入口）
+                async_handler_func = None
+                async_handler_name = plugin_meta.get("async_handler")
+                if async_handler_name:
+                    async_handler_func = getattr(plugin_core_module, async_handler_name, None)
+                    if not inspect.iscoroutinefunction(async_handler_func):
+                        logger.warning(f"⚠️ 插件 {plugin_name} 中 {async_handler_name} 不是协程函数，异步模式下将使用同步入口")
+                        async_handler_func = None
+                
+                # 可选的事件处理器（如 {"notice.notify.poke": "handle_poke_event"}），由事件路由表分发
+                event_handler_funcs = []
+                for route, func_name in plugin_meta.get("event_handlers", {}).items():
+                    event_func = getattr(plugin_core_module, func_name, None)
+                    if not callable(event_func):
+                        logger.warning(f"⚠️ 插件 {plugin_name} 中缺失事件处理函数 {func_name}（{route}），已忽略")
+                        continue
+                    event_handler_funcs.append((route, event_func))
+                
                 # 注册插件
                 registered_plugin = {
                     **plugin_meta,  # 插件元信息（名称、指令、版本、依赖等）
                     "handler_func": handler_func,  # 插件核心处理函数
+                    "async_handler_func": async_handler_func,  # 插件异步处理函数（可选）
+                    "event_handler_funcs": event_handler_funcs,  # 插件事件处理函数（可选）
                     "core_module": plugin_core_module  # 插件核心模块（备用）
                 }
                 PLUGIN_REGISTRY.append(registered_plugin)
@@ -385,32 +433,35 @@ class PluginManager:
             if plugin_name not in loaded:
                 load_plugin(plugin_name)
 
+    def rebuild_command_index(self) -> None:
+        """按当前注册池重建指令索引和事件路由（初始化、重载或动态注册插件后调用）"""
+        _command_index.rebuild(PLUGIN_REGISTRY)
+        event_router.load_plugin_routes(PLUGIN_REGISTRY)
+        logger.debug(f"[插件匹配] 指令索引已重建，插件数量：{len(PLUGIN_REGISTRY)}")
+
+    def find_plugin(self, raw_msg: str, chat_type: str, sender_id: str, is_at_bot: bool) -> Optional[Dict]:
+        """查找消息对应的插件（不记录日志，供分发通道划分等场景复用）"""
+        # 兜底：注册池被直接修改（如handler.register_plugin）后自动重建索引
+        if _command_index.size != len(PLUGIN_REGISTRY):
+            self.rebuild_command_index()
+        is_master = str(sender_id) == str(MASTER_QQ)
+        return _command_index.match(raw_msg, chat_type, is_master, is_at_bot)
+
     def get_matched_plugin(self, raw_msg: str, chat_type: str, sender_id: str, is_at_bot: bool) -> Optional[Dict]:
-        """公共方法：根据用户消息匹配对应的插件（供handler调用，优化匹配逻辑）"""
-        logger.debug(f"\n[插件匹配] 开始匹配指令：{raw_msg[:20]}... | 聊天类型：{chat_type} | 发送者ID：{sender_id} | @机器人：{is_at_bot}")
-        logger.debug(f"[插件匹配] 当前注册池插件数量：{len(PLUGIN_REGISTRY)}")
-        
-        for plugin in PLUGIN_REGISTRY:
-            # 1. 校验聊天场景（私聊/群聊）是否匹配
-            if chat_type not in plugin["chat_type"]:
-                logger.debug(f"[插件匹配] 插件 {plugin['name']} v{plugin.get('version', 'N/A')} 场景不匹配（支持：{plugin['chat_type']}，当前：{chat_type}），跳过")
-                continue
-            # 2. 校验权限（仅主人可用的插件需过滤非主人用户）
-            if plugin["permission"] == "master" and str(sender_id) != str(MASTER_QQ):
-                logger.debug(f"[插件匹配] 插件 {plugin['name']} v{plugin.get('version', 'N/A')} 权限不足（仅主人可用），跳过")
-                continue
-            # 3. 群聊场景需@机器人的插件，校验是否@机器人
-            if chat_type == "group" and plugin.get("is_at_required", False) and not is_at_bot:
-                logger.debug(f"[插件匹配] 插件 {plugin['name']} v{plugin.get('version', 'N/A')} 群聊需@机器人，当前未@，跳过")
-                continue
-            # 4. 指令匹配（消息包含插件任一触发指令即匹配，优化匹配逻辑）
-            matched_cmd = [cmd for cmd in plugin["commands"] if cmd in raw_msg]
-            if matched_cmd:
-                logger.debug(f"[插件匹配] 插件 {plugin['name']} v{plugin.get('version', 'N/A')} 匹配成功！触发指令：{matched_cmd}")
-                return plugin
-        
-        # 无匹配插件返回None，打印调试日志
-        logger.warning(f"[插件匹配] 无插件匹配指令：{raw_msg[:20]}...")
+        """公共方法：根据用户消息匹配对应的插件（供handler调用）
+        基于预编译的指令索引单次扫描消息，优先级与注册顺序一致
+        """
+        plugin = self.find_plugin(raw_msg, chat_type, sender_id, is_at_bot)
+
+        if plugin is not None:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"[插件匹配] 插件 {plugin['name']} v{plugin.get('version', 'N/A')} 匹配成功！"
+                             f"指令：{raw_msg[:20]}... | 聊天类型：{chat_type} | @机器人：{is_at_bot}")
+            return plugin
+
+        # 无匹配插件返回None（普通聊天消息的常态，只记录调试日志）
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"[插件匹配] 无插件匹配指令：{raw_msg[:20]}...")
         return None
     
     def get_plugin_metadata(self, plugin_name: str) -> Optional[Dict]:
@@ -453,7 +504,8 @@ class PluginManager:
         try:
             # 从注册池中移除插件
             # 由于这些变量已经在模块级别定义为全局变量，不需要额外声明global
-            PLUGIN_REGISTRY = [p for p in PLUGIN_REGISTRY if p.get('name') != plugin_name]
+            PLUGIN_REGISTRY[:] = [p for p in PLUGIN_REGISTRY if p.get('name') != plugin_name]
+            self.rebuild_command_index()
             if plugin_name in LOADED_PLUGIN_VERSIONS:
                 del LOADED_PLUGIN_VERSIONS[plugin_name]
             
@@ -494,6 +546,7 @@ class PluginManager:
         PLUGIN_REGISTRY.clear()
         LOADED_PLUGIN_VERSIONS.clear()
         DEPENDENCY_GRAPH.clear()
+        self.rebuild_command_index()
         
         self._initialized = False
         logger.info("✅ 插件管理器已关闭")
@@ -0,0 +1,139 @@
+"""请求摘要日志（canonical log line）
+开启 log_canonical_requests 后，每个请求（一次回调或推送事件）在处理结束时只输出一行结构化摘要：
+请求ID、事件类型、会话、匹配的插件、处理结果、总耗时和各阶段耗时；
+请求处理过程中产生的INFO及以下日志由采样过滤器折叠进摘要（只计数），WARNING及以上照常输出
+
+有调试追踪规则时（core.debug_trace）同样为每个请求建立摘要，记录用户、群、插件字段时判定是否被追踪：
+被追踪的请求输出全部DEBUG日志、每个阶段的耗时和摘要行
+
+摘要对象保存在contextvars中：
+- 异步服务在线程池中执行同步阶段时复制上下文，摘要随之传递
+- 入队模式下由 handoff() 把摘要交给分发工作线程，工作线程 resume() 后在执行结束时输出
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from core.config_manager import config_manager
+from core.debug_trace import debug_tracer
+from core.logger_manager import logger_manager
+
+logger = logger_manager.get_logger("GracyBot-Request")
+
+_current: ContextVar[Optional["RequestSummary"]] = ContextVar("gracy_request_summary", default=None)
+
+
+class RequestSummary:
+    """单个请求的摘要"""
+
+    __slots__ = ("request_id", "started", "fields", "stages", "folded", "handed_off", "canonical", "traced")
+
+    def __init__(self, request_id: str, fields: Dict[str, Any], canonical: bool = True):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.fields = fields
+        self.stages: Dict[str, float] = {}
+        self.folded = 0
+        self.handed_off = False
+        self.canonical = canonical  # 摘要模式（折叠请求内的日志）
+        self.traced = False  # 命中调试追踪规则
+
+    def add_stage(self, name: str, seconds: float):
+        """累加阶段耗时（同一阶段多次出现时合计，如多次发送消息）"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def to_dict(self, outcome: str) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "outcome": outcome,
+            **self.fields,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()},
+            "folded_logs": self.folded
+        }
+
+
+def enabled() -> bool:
+    return config_manager.get("log_canonical_requests", False)
+
+
+def current() -> Optional[RequestSummary]:
+    """当前上下文中的请求摘要（未开启或不在请求中时为None）"""
+    return _current.get()
+
+
+def begin(request_id: str, **fields) -> Optional[RequestSummary]:
+    """开始一个请求的摘要（未开启摘要模式且没有调试追踪时返回None，后续调用均为空操作）"""
+    canonical = enabled()
+    if not canonical and not debug_tracer.active():
+        return None
+    summary = RequestSummary(request_id, fields, canonical)
+    _current.set(summary)
+    return summary
+
+
+def note(**fields) -> None:
+    """记录摘要字段（如插件名、会话类型），记录用户、群、插件时判定是否命中调试追踪"""
+    summary = _current.get()
+    if summary is not None:
+        summary.fields.update(fields)
+        if not summary.traced and debug_tracer.matches(fields):
+            summary.traced = True
+            debug_tracer.traced_requests += 1
+            logger.debug(f"[调试追踪] 请求 {summary.request_id} 命中追踪规则：{summary.fields}")
+
+
+@contextmanager
+def stage(name: str):
+    """统计一个处理阶段的耗时"""
+    summary = _current.get()
+    if summary is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        summary.add_stage(name, elapsed)
+        if summary.traced:
+            logger.debug(f"[调试追踪] 请求 {summary.request_id} 阶段 {name} 耗时 {elapsed * 1000:.1f}ms")
+
+
+def handoff() -> Optional[RequestSummary]:
+    """把摘要交给其他线程继续（入队模式），当前上下文的finish不再输出"""
+    summary = _current.get()
+    if summary is not None:
+        summary.handed_off = True
+        _current.set(None)
+    return summary
+
+
+def resume(summary: Optional[RequestSummary]) -> None:
+    """在工作线程中接管摘要"""
+    if summary is not None:
+        summary.handed_off = False
+    _current.set(summary)
+
+
+def finish(outcome: Optional[str] = None, **fields) -> None:
+    """结束当前请求并输出摘要行
+    :param outcome: 处理结果（为空时取处理过程中 note(outcome=...) 记录的结果，都没有则为error）
+    """
+    summary = _current.get()
+    if summary is None:
+        return
+    _current.set(None)
+    if summary.handed_off or not (summary.canonical or summary.traced):
+        return
+    summary.fields.update(fields)
+    noted = summary.fields.pop("outcome", None)
+    outcome = outcome or noted or "error"
+    data = summary.to_dict(outcome)
+    # 摘要行本身不参与调用点采样
+    logger_manager.log_with_context(
+        logger, logging.INFO, f"[请求摘要] {outcome}（{data['total_ms']}ms）", context=data,
+        extra={"sampling_exempt": True})
@@ -0,0 +1,249 @@
+"""OneBot事件结构校验模块
+启动时按事件类型（message / message_sent / notice / request / meta_event）把结构声明编译为校验节点树，
+每个事件只做一次有界遍历：
+- 检查必填字段、字段类型和取值范围，嵌套的消息段数组同样限制段数和每个字符串的长度
+- 整个事件的节点数、嵌套深度和字符串总长度共用一份预算，超出即停止遍历（不再用json.dumps重新序列化测量大小）
+- 校验失败时抛出 SchemaError，指明出错的字段路径（如 message[3].data.text）
+未声明的字段按通用规则检查（只受长度、深度和总量预算约束），未知的事件类型只检查公共字段
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+# 遍历的最大嵌套深度和最大节点数（防止超大或超深的结构占用CPU）
+MAX_DEPTH = 10
+MAX_NODES = 5000
+
+
+class SchemaError(ValueError):
+    """事件结构校验失败（字段路径在错误向上传递时由外层节点逐级补全）"""
+
+    def __init__(self, reason: str, path: str = ""):
+        self.path = path
+        self.reason = reason
+        super().__init__(reason)
+
+    def prefix(self, key) -> "SchemaError":
+        """在路径前补上外层的字段名或数组下标"""
+        if isinstance(key, int):
+            self.path = f"[{key}]{'.' if self.path and self.path[0] != '[' else ''}{self.path}"
+        else:
+            self.path = f"{key}{'.' if self.path and self.path[0] != '[' else ''}{self.path}"
+        return self
+
+    def __str__(self) -> str:
+        return f"字段 {self.path} {self.reason}" if self.path else self.reason
+
+
+class _Budget:
+    """一次校验共用的遍历预算"""
+
+    __slots__ = ("nodes", "chars", "max_chars")
+
+    def __init__(self, max_chars: int):
+        self.nodes = MAX_NODES
+        self.chars = max_chars
+        self.max_chars = max_chars
+
+    def spend(self, chars: int = 0):
+        self.nodes -= 1
+        self.chars -= chars
+        if self.nodes < 0:
+            raise SchemaError(f"所在事件结构过大（超过 {MAX_NODES} 个节点）")
+        if self.chars < 0:
+            raise SchemaError(f"所在事件内容过长（字符串总长度超过 {self.max_chars}）")
+
+
+class _Any:
+    """未声明字段：只受字符串长度、深度和总量预算约束"""
+
+    __slots__ = ("max_len",)
+
+    def __init__(self, max_len: int):
+        self.max_len = max_len
+
+    def check(self, value: Any, budget: _Budget, depth: int):
+        if depth > MAX_DEPTH:
+            raise SchemaError(f"嵌套层级超过 {MAX_DEPTH}")
+        if isinstance(value, str):
+            if len(value) > self.max_len:
+                raise SchemaError(f"长度 {len(value)} 超过上限 {self.max_len}")
+            budget.spend(len(value))
+        elif isinstance(value, dict):
+            budget.spend()
+            for key, item in value.items():
+                try:
+                    self.check(item, budget, depth + 1)
+                except SchemaError as e:
+                    raise e.prefix(key)
+        elif isinstance(value, list):
+            budget.spend()
+            for idx, item in enumerate(value):
+                try:
+                    self.check(item, budget, depth + 1)
+                except SchemaError as e:
+                    raise e.prefix(idx)
+        else:
+            budget.spend()
+
+
+class _Str:
+    __slots__ = ("max_len", "choices")
+
+    def __init__(self, max_len: int, choices: Optional[Tuple[str, ...]] = None):
+        self.max_len = max_len
+        self.choices = choices
+
+    def check(self, value: Any, budget: _Budget, depth: int):
+        if not isinstance(value, str):
+            raise SchemaError("类型应为字符串")
+        if len(value) > self.max_len:
+            raise SchemaError(f"长度 {len(value)} 超过上限 {self.max_len}")
+        if self.choices is not None and value not in self.choices:
+            raise SchemaError(f"取值 {value[:20]!r} 不在 {'/'.join(self.choices)} 中")
+        budget.spend(len(value))
+
+
+class _Id:
+    """QQ号/群号/消息ID：整数或数字字符串"""
+
+    __slots__ = ()
+
+    def check(self, value: Any, budget: _Budget, depth: int):
+        if value.__class__ is not int and not (
+                isinstance(value, str) and len(value) <= 32 and value.lstrip("-").isdigit()):
+            raise SchemaError("类型应为整数或数字字符串")
+        budget.spend()
+
+
+class _Int:
+    __slots__ = ()
+
+    def check(self, value: Any, budget: _Budget, depth: int):
+        if value.__class__ is not int and value.__class__ is not float:
+            raise SchemaError("类型应为数字")
+        budget.spend()
+
+
+class _Dict:
+    """字典节点：已声明字段按声明校验，其余字段按通用规则校验"""
+
+    __slots__ = ("fields", "required", "extra")
+
+    def __init__(self, fields: Dict[str, Any], required: Tuple[str, ...], extra: _Any):
+        self.fields = fields
+        self.required = required
+        self.extra = extra
+
+    def check(self, value: Any, budget: _Budget, depth: int):
+        if not isinstance(value, dict):
+            raise SchemaError("类型应为对象")
+        if depth > MAX_DEPTH:
+            raise SchemaError(f"嵌套层级超过 {MAX_DEPTH}")
+        budget.spend()
+        for name in self.required:
+            if name not in value:
+                raise SchemaError("为必填字段", name)
+        fields = self.fields
+        extra = self.extra
+        depth += 1
+        for key, item in value.items():
+            try:
+                if item is not None:
+                    fields.get(key, extra).check(item, budget, depth)
+            except SchemaError as e:
+                raise e.prefix(key)
+
+
+class _List:
+    __slots__ = ("item", "max_items")
+
+    def __init__(self, item, max_items: int):
+        self.item = item
+        self.max_items = max_items
+
+    def check(self, value: Any, budget: _Budget, depth: int):
+        if not isinstance(value, list):
+            raise SchemaError("类型应为数组")
+        if len(value) > self.max_items:
+            raise SchemaError(f"元素数量 {len(value)} 超过上限 {self.max_items}")
+        budget.spend()
+        check = self.item.check
+        depth += 1
+        for idx, element in enumerate(value):
+            try:
+                check(element, budget, depth)
+            except SchemaError as e:
+                raise e.prefix(idx)
+
+
+class _Message:
+    """消息内容：消息段数组或CQ码字符串"""
+
+    __slots__ = ("as_list", "as_str")
+
+    def __init__(self, as_list: _List, as_str: _Str):
+        self.as_list = as_list
+        self.as_str = as_str
+
+    def check(self, value: Any, budget: _Budget, depth: int):
+        (self.as_list if isinstance(value, list) else self.as_str).check(value, budget, depth)
+
+
+class EventValidator:
+    """按事件类型编译的校验器集合"""
+
+    def __init__(self, max_string_length: int = 5000, max_total_chars: int = 50000, max_segments: int = 200):
+        self.max_string_length = max_string_length
+        self.max_total_chars = max_total_chars
+        self.max_segments = max_segments
+        self._schemas: Dict[str, _Dict] = {}
+        self._common: Optional[_Dict] = None
+        self.compile()
+
+    def compile(self):
+        """根据当前限制编译各事件类型的校验节点树"""
+        extra = _Any(self.max_string_length)
+        text = _Str(self.max_string_length)
+        short = _Str(128)
+        id_ = _Id()
+        num = _Int()
+
+        def obj(fields: Dict[str, Any], required: Tuple[str, ...] = ()) -> _Dict:
+            return _Dict(fields, required, extra)
+
+        common = {"time": num, "self_id": id_, "post_type": short}
+        segment = obj({"type": short, "data": obj({})}, ("type",))
+        message = _Message(_List(segment, self.max_segments), text)
+        sender = obj({"user_id": id_, "nickname": text, "card": text, "role": short, "sex": short, "age": num})
+        message_fields = {
+            **common,
+            "message_type": _Str(16, ("private", "group")),
+            "sub_type": short,
+            "message_id": id_,
+            "user_id": id_,
+            "group_id": id_,
+            "message": message,
+            "raw_message": text,
+            "font": num,
+            "sender": sender
+        }
+        self._common = obj(common, ("post_type",))
+        self._schemas = {
+            "message": obj(message_fields, ("post_type", "message_type", "user_id")),
+            "message_sent": obj(message_fields, ("post_type", "message_type")),
+            "notice": obj({**common, "notice_type": short, "sub_type": short, "user_id": id_, "group_id": id_,
+                           "operator_id": id_, "target_id": id_, "message_id": id_},
+                          ("post_type", "notice_type")),
+            "request": obj({**common, "request_type": short, "sub_type": short, "user_id": id_, "group_id": id_,
+                            "comment": text, "flag": _Str(256)},
+                           ("post_type", "request_type", "flag")),
+            "meta_event": obj({**common, "meta_event_type": short, "sub_type": short},
+                              ("post_type", "meta_event_type"))
+        }
+
+    def validate(self, data: Any) -> None:
+        """校验一个事件，不合法时抛出SchemaError"""
+        if not isinstance(data, dict):
+            raise SchemaError("事件应为JSON对象")
+        schema = self._schemas.get(data.get("post_type")) or self._common
+        schema.check(data, _Budget(self.max_total_chars), 0)
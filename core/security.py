@@ -145,82 +145,146 @@ def sanitize_input(content: str, max_length: int = 1000) -> str:
         
         return content
 
-# ========== 日志安全脱敏工具（终极版：覆盖所有QQ/ID格式，无死角） ==========
+# ========== 日志安全脱敏工具（单次扫描：所有规则编译为一个正则，按命中的规则分派替换） ==========
+class SanitizedStr(str):
+    """已脱敏的日志文本（sanitize_log的返回值，再次脱敏或经过过滤器时直接跳过）"""
+    __slots__ = ()
+
+
+# 快速预判：所有脱敏规则都至少需要数字、@、=或以下关键字之一，不含这些内容的日志直接跳过
+_SANITIZE_PREFILTER = re.compile(r'[\d@=]|密码|sk-|SK-|API_KEY|api_key')
+
+# 数字ID后紧跟邮箱域名时（如QQ邮箱 123456@qq.com），整段按邮箱隐藏
+_EMAIL_TAIL = r'(?P<{}>@[a-zA-Z0-9.-]+\.[a-zA-Z]{{2,}})?'
+
+# 脱敏规则（同一位置同时命中多条规则时取靠前的规则）
+_SANITIZE_RULES = (
+    # 裸QQ/ID（无任何前缀，纯数字，如192004908 → 用户****4908）
+    ("bare_id", r'(?<!\w)(?P<bare_num>\d{5,15})(?!\w)' + _EMAIL_TAIL.format("bare_mail")),
+    # 带前缀用户ID（用户123456 → 用户****3456）
+    ("user_id", r'用户(?P<user_num>\d+)' + _EMAIL_TAIL.format("user_mail")),
+    # 括号包裹ID（【123456】→ 【用户****3456】）
+    ("bracket_id", r'【(?P<bracket_num>\d+)】'),
+    # 群ID（群ID：123 → 群ID：****123；5~15位的独立数字按裸ID规则处理，与原先的逐条替换结果一致）
+    ("group_id", r'群ID：(?!\d{5,15}(?!\w))(?P<group_num>\d+)' + _EMAIL_TAIL.format("group_mail")),
+    # 目标ID（目标ID：123456 → 目标ID：用户****3456）
+    ("target_id", r'目标ID：(?P<target_num>\d+)' + _EMAIL_TAIL.format("target_mail")),
+    # 消息发送目标（发送private消息到123456 → 发送private消息到【用户****3456】）
+    ("send_target", r'发送(?P<send_type>private|group)消息到(?P<send_num>\d+)'),
+    # 密码（完全隐藏，适配密码:xxx/密码=xxx格式）
+    ("password", r'密码[:=]\s*[^\s]+'),
+    # 邮箱
+    ("email", r'(?<![a-zA-Z0-9._%+-])[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'),
+    # API密钥（sk-/API_KEY等格式）
+    ("api_key", r'(?:API_KEY|api_key|sk-|SK-)[\s:]*[a-zA-Z0-9]{6}[a-zA-Z0-9]*|(?:sk-|API_KEY=)[\w-]{4,}'),
+    # URL中的敏感查询参数
+    ("secret_param", r'(?P<param_name>password|secret|token)=[^&]+'),
+    # 手机号（前面紧跟文字、不满足裸ID规则时）
+    ("phone", r'(?<!\d)(?P<phone_num>1[3-9]\d{9})(?!\d)'),
+)
+
+# 各规则可能的首字符组成前置断言，中文内容的大部分位置只需一次字符集判断
+_SANITIZE_PATTERN = re.compile(r'(?=[\da-zA-Z._%+\-用【群目发密])(?:'
+                               + "|".join(f"(?P<{name}>{pattern})" for name, pattern in _SANITIZE_RULES) + ")")
+
+# API密钥先保留前6位再隐藏剩余部分（与原先两条规则依次替换的结果一致）
+_API_KEY_KEEP = re.compile(r'(API_KEY|api_key|sk-|SK-)[\s:]*([a-zA-Z0-9]{6})[a-zA-Z0-9]*')
+_API_KEY_HIDE = re.compile(r'(sk-|API_KEY=)[\w-]{4,}')
+_MASKED_EMAIL = "****@****.***"
+
+
+def _mask_id(prefix: str, number: str, mail: Optional[str], suffix: str = "") -> str:
+    if mail:
+        return f"{prefix}****{_MASKED_EMAIL}"
+    return f"{prefix}****{number[-4:]}{suffix}"
+
+
+def _mask_api_key(match) -> str:
+    return _API_KEY_HIDE.sub(r'\1****', _API_KEY_KEEP.sub(r'\1\2****', match.group()))
+
+
+# 规则名 -> 替换函数
+_SANITIZE_DISPATCH = {
+    "bare_id": lambda m: _mask_id("用户", m.group("bare_num"), m.group("bare_mail")),
+    "user_id": lambda m: _mask_id("用户", m.group("user_num"), m.group("user_mail")),
+    "bracket_id": lambda m: _mask_id("【用户", m.group("bracket_num"), None, "】"),
+    "group_id": lambda m: _mask_id("群ID：", m.group("group_num"), m.group("group_mail")),
+    "target_id": lambda m: _mask_id("目标ID：用户", m.group("target_num"), m.group("target_mail")),
+    "send_target": lambda m: _mask_id(f"发送{m.group('send_type')}消息到【用户", m.group("send_num"), None, "】"),
+    "password": lambda m: "密码: ******",
+    "email": lambda m: _MASKED_EMAIL,
+    "api_key": _mask_api_key,
+    "secret_param": lambda m: f"{m.group('param_name')}=****",
+    "phone": lambda m: f"1****{m.group('phone_num')[-4:]}",
+}
+
+
+def _replace_sensitive(match) -> str:
+    # 各规则外层命名分组最后闭合，lastgroup即命中的规则名
+    return _SANITIZE_DISPATCH[match.lastgroup](match)
+
+
 def sanitize_log(content: str) -> str:
     """
-    日志内容脱敏（隐藏所有用户ID/QQ/群ID，保护隐私安全）
+    日志内容脱敏（隐藏所有用户ID/QQ/群ID、密码、密钥、邮箱、手机号，保护隐私安全）
     :param content: 原始日志内容
-    :return: 脱敏后的日志内容
+    :return: 脱敏后的日志内容（SanitizedStr，经过日志过滤器时不再重复处理）
     """
-    # 1. 裸QQ/ID脱敏（无任何前缀，纯数字，如192004908 → 用户****4908）
-    content = re.sub(r'(?<!\w)(\d{5,15})(?!\w)', lambda m: f"用户****{m.group(1)[-4:]}", content)
-    # 2. 带前缀用户ID脱敏（格式1：用户123456 → 用户****456）
-    content = re.sub(r'用户(\d{1,})', lambda m: f"用户****{m.group(1)[-4:]}", content)
-    # 3. 括号包裹ID脱敏（格式2：【123456】→ 【用户****456】）
-    content = re.sub(r'【(\d{1,})】', lambda m: f"【用户****{m.group(1)[-4:]}】", content)
-    # 4. 群ID脱敏（格式：群ID：123456 → 群ID：****456）
-    content = re.sub(r'群ID：(\d{1,})', lambda m: f"群ID：****{m.group(1)[-4:]}", content)
-    # 5. 目标ID脱敏（格式：目标ID：123456 → 目标ID：用户****456）
-    content = re.sub(r'目标ID：(\d{1,})', lambda m: f"目标ID：用户****{m.group(1)[-4:]}", content)
-    # 6. 消息发送目标脱敏（格式：发送private消息到123456 → 发送private消息到【用户****456】）
-    content = re.sub(r'发送(private|group)消息到(\d{1,})', lambda m: f"发送{m.group(1)}消息到【用户****{m.group(2)[-4:]}】", content)
-    # 7. 密码脱敏（完全隐藏，适配密码:xxx/密码=xxx格式）
-    content = re.sub(r'密码[:=]\s*[^\s]+', '密码: ******', content)
-    # 8. API密钥脱敏（保留前6位，适配sk-/API_KEY等格式）
-    content = re.sub(r'(API_KEY|api_key|sk-|SK-)[\s:]*([a-zA-Z0-9]{6})[a-zA-Z0-9]*', r'\1\2****', content)
-    return content
+    if type(content) is SanitizedStr:
+        return content
+    if not isinstance(content, str):
+        content = str(content)
+    if _SANITIZE_PREFILTER.search(content) is None:
+        return SanitizedStr(content)
+    return SanitizedStr(_SANITIZE_PATTERN.sub(_replace_sensitive, content))
+
+def _sanitize_context(value):
+    """日志上下文脱敏（逐个字段处理，数字形式的QQ号/群号同样隐藏）"""
+    if isinstance(value, str):
+        return sanitize_log(value)
+    if isinstance(value, dict):
+        return {key: _sanitize_context(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_sanitize_context(item) for item in value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        masked = sanitize_log(str(value))
+        return value if masked == str(value) else masked
+    return value
 
 # ========== 日志自动脱敏过滤器（全局生效，无需手动调用） ==========
 class SanitizeLogFilter(logging.Filter):
-    """日志过滤器：所有日志输出前自动脱敏，彻底隐藏QQ/ID"""
-    def __init__(self, name: str = ""):
-        super().__init__(name)
-        # 增加更多类型的敏感信息脱敏规则
-        self.sensitive_patterns = [
-            # API密钥模式
-            (r'(sk-|API_KEY=|token=)[\w-]{4,}', r'\1****'),
-            # 邮箱模式
-            (r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', '****@****.***'),
-            # 手机号模式
-            (r'(?<!\d)(1[3-9]\d{9})(?!\d)', '1****' + '\1'[-4:] if '\1' else '1**********'),
-            # URL中的查询参数
-            (r'(password|secret|token)=([^&]+)', r'\1=****'),
-        ]
-    
+    """日志过滤器：所有日志输出前自动脱敏，彻底隐藏QQ/ID
+    同一条日志记录经过多个日志器/处理器上的过滤器时只处理一次（记录上带有sanitized标记）
+    """
+
     def filter(self, record: logging.LogRecord) -> bool:
-        # 对日志消息进行自动脱敏（兼容带参数/无参数日志）
+        if getattr(record, "sanitized", False):
+            return True
         try:
-            # 先使用基础脱敏
             if record.args:
                 try:
-                    formatted_msg = record.msg % record.args
-                    record.msg = sanitize_log(formatted_msg)
-                    record.args = ()  # 清空参数，避免重复格式化
+                    record.msg = sanitize_log(record.msg % record.args)
                 except (TypeError, ValueError):
                     # 处理参数格式错误的情况
-                    record.msg = f"{record.msg} [参数: {sanitize_log(str(record.args))}]"
-                    record.args = ()
-            else:
-                # 直接脱敏普通日志（含裸ID格式）
+                    record.msg = sanitize_log(f"{record.msg} [参数: {record.args}]")
+                record.args = ()  # 清空参数，避免重复格式化
+            elif type(record.msg) is not SanitizedStr:
                 record.msg = sanitize_log(str(record.msg))
-            
-            # 应用额外的敏感信息脱敏规则
-            for pattern, replacement in self.sensitive_patterns:
-                # 使用函数处理replacement中的捕获组引用
-                def replace_with_groups(match):
-                    if '\1' in replacement:
-                        # 保留第一个捕获组的一部分
-                        if match.group(1):
-                            if '\1****' in replacement:
-                                return match.group(1) + '****'
-                    return replacement
-                
-                # 使用re.sub和回调函数
-                import re
-                record.msg = re.sub(pattern, replace_with_groups, record.msg)
+            context = getattr(record, "context", None)
+            if context:
+                record.context = _sanitize_context(context)
+            record.sanitized = True
         except Exception as e:
-            # 脱敏失败不影响日志输出，仅记录异常（使用通用日志器避免循环）
-            logging.getLogger("GracyBot-HTTP").error(f"[日志脱敏过滤器] 处理异常：{str(e)}")
+            # 脱敏失败时隐藏原始内容（不能输出未脱敏的日志），并记录异常类型；
+            # 这条异常日志标记为已脱敏，避免脱敏持续失败时反复触发自身
+            record.msg = f"[日志脱敏失败：{type(e).__name__}，原内容已隐藏]"
+            record.args = ()
+            record.context = None
+            record.exc_info = None
+            record.exc_text = None
+            record.sanitized = True
+            logging.getLogger("GracyBot-HTTP").error(f"[日志脱敏过滤器] 处理异常：{type(e).__name__}",
+                                                     extra={"sanitized": True})
         return True
 
 
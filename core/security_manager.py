@@ -3,14 +3,18 @@ import time
 import hashlib
 import logging
 import logging
-import json
+import threading
 from typing import Dict, List, Tuple, Optional, Any
 from datetime import datetime
-from enum import Enum
+from enum import Enum, IntFlag
 
 # 导入配置和日志管理器
 from .config_manager import config_manager
 from .logger_manager import logger_manager
+from .audit import audit_log
+from .content_filter import ContentFilter
+from .schema import EventValidator, SchemaError
+from .state_backend import StateBackend, MemoryStateBackend, create_state_backend
 
 # 获取日志器
 logger = logger_manager.get_logger("security")
@@ -21,6 +25,29 @@ class UserRole(Enum):
     SELF = "self"    # QQ本身
     MASTER = "master"  # 主人
 
+# 权限位：角色的权限集合预编译为位掩码，权限判断只需一次按位与
+class Permission(IntFlag):
+    NONE = 0
+    BASIC_QUERY = 1
+    USE_PLUGINS = 2
+    MANAGE_PLUGINS = 4
+    SYSTEM_ADMIN = 8
+
+# 权限名称 -> 权限位（兼容以字符串传入权限的旧调用）
+PERMISSION_FLAGS = {
+    "basic_query": Permission.BASIC_QUERY,
+    "use_plugins": Permission.USE_PLUGINS,
+    "manage_plugins": Permission.MANAGE_PLUGINS,
+    "system_admin": Permission.SYSTEM_ADMIN
+}
+
+PERMISSION_BITS = {name: int(flag) for name, flag in PERMISSION_FLAGS.items()}
+
+# 权限决策缓存上限（超过后整体清空重建）
+PERMISSION_CACHE_SIZE = 10000
+# 共享状态后端下检查黑名单版本的间隔（秒）
+STATE_SYNC_INTERVAL = 1.0
+
 # 输入验证器类
 class InputValidator:
     """
@@ -82,48 +109,165 @@ class InputValidator:
 class RateLimiter:
     """
     频率限制器，防止暴力攻击和滥用
+    每个键保存分钟/小时两个滑动窗口计数器（上一窗口计数按剩余比例加权 + 当前窗口计数），每次检查为O(1)；
+    计数器存放在状态后端（core.state_backend）中：默认为进程内存储，多进程部署时共享同一个SQLite状态库
     """
-    def __init__(self):
-        self.requests: Dict[str, List[float]] = {}
+    _WINDOWS = (("minute", 60), ("hour", 3600))
+
+    def __init__(self, name: str = "user", max_per_minute: int = 60, max_per_hour: int = 1000,
+                 metrics: bool = True, backend: Optional[StateBackend] = None):
+        self.name = name
         self.config = {
-            'max_requests_per_minute': 60,
-            'max_requests_per_hour': 1000,
+            'max_requests_per_minute': max_per_minute,
+            'max_requests_per_hour': max_per_hour,
             'block_duration_seconds': 300  # 5分钟
         }
-    
+        self.backend = backend or MemoryStateBackend()
+        # 上限为0的窗口不限制也不计数
+        limits = (max_per_minute, max_per_hour)
+        self._window_names = tuple(name for (name, _), limit in zip(self._WINDOWS, limits) if limit)
+        self._windows = tuple((seconds, limit) for (_, seconds), limit in zip(self._WINDOWS, limits) if limit)
+        self.stats = {"allowed": 0, "limited_minute": 0, "limited_hour": 0}
+        self._registered = not metrics  # 作为多级限流的层级时由上层统一输出指标
+
+    def hit(self, key: str, now: Optional[float] = None, record: bool = True) -> Optional[str]:
+        """检查并记录一次请求
+        :param record: 为False时只检查不计数
+        :return: 放行返回None，超限返回超限的窗口（"minute"/"hour"，超限请求不计数）
+        """
+        if not self._registered:
+            self._register_metrics()
+        if self._windows:
+            limited = self.backend.hit(self.name, ((key, self._windows),), time.time() if now is None else now, record)
+            if limited is not None:
+                window = self._window_names[limited[1]]
+                self.stats[f"limited_{window}"] += 1
+                return window
+        if record:
+            self.stats["allowed"] += 1
+        return None
+
+    def allow(self, key: str) -> bool:
+        """检查并记录一次请求，未超限返回True"""
+        return self.hit(key) is None
+
     def check_rate_limit(self, key: str) -> Tuple[bool, Optional[str]]:
         """
         检查请求是否超过频率限制
         :param key: 用户标识（如QQ号）
         :return: (是否允许请求, 错误信息)
         """
-        current_time = time.time()
-        
-        # 初始化请求记录
-        if key not in self.requests:
-            self.requests[key] = []
-        
-        # 清理过期记录
-        self.requests[key] = [t for t in self.requests[key] if current_time - t < 3600]
-        
-        # 检查1分钟内的请求数
-        minute_requests = [t for t in self.requests[key] if current_time - t < 60]
-        if len(minute_requests) >= self.config['max_requests_per_minute']:
-            return False, "请求过于频繁，请稍后再试（每分钟最多60次）"
-        
-        # 检查1小时内的请求数
-        if len(self.requests[key]) >= self.config['max_requests_per_hour']:
-            return False, "请求过于频繁，请稍后再试（每小时最多1000次）"
-        
-        # 记录本次请求
-        self.requests[key].append(current_time)
-        
-        # 记录频率信息（DEBUG级别）
-        logger.debug(f"[频率限制] 用户{key}请求频率: 1分钟内{len(minute_requests)+1}次, 1小时内{len(self.requests[key])}次")
-        
+        window = self.hit(key)
+        if window == "minute":
+            return False, f"请求过于频繁，请稍后再试（每分钟最多{self.config['max_requests_per_minute']}次）"
+        if window == "hour":
+            return False, f"请求过于频繁，请稍后再试（每小时最多{self.config['max_requests_per_hour']}次）"
         return True, None
 
-# 安全管理器单例类
+    def should_notify(self, key: str) -> bool:
+        """超限提醒去重：同一个键每个分钟窗口只提醒一次（共享后端下所有进程合计一次）"""
+        return self.backend.claim(self.name, key, int(time.time() // 60))
+
+    def _register_metrics(self):
+        """首次使用时注册监控指标（监控管理器经core.utils间接导入本模块，不能在导入时注册）"""
+        self._registered = True
+        from core.monitor import monitor_manager
+        monitor_manager.register_metrics_provider(f"rate_limit_{self.name}", self.get_stats)
+        monitor_manager.register_metrics_provider("state_backend", self.backend.get_stats)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """频率限制统计（跟踪的键数量、本进程放行/超限次数）"""
+        return {
+            "keys": self.backend.count_keys(self.name),
+            "max_per_minute": self.config['max_requests_per_minute'],
+            "max_per_hour": self.config['max_requests_per_hour'],
+            **self.stats
+        }
+
+# 多级限流的层级（由外到内），请求需在每一层都有余量才放行
+RATE_LIMIT_TIERS = ("global", "group", "user")
+DEFAULT_RATE_LIMIT_TIERS = {
+    "ai": {
+        "global": {"per_minute": 30, "per_hour": 600},
+        "group": {"per_minute": 10, "per_hour": 200},
+        "user": {"per_minute": 5, "per_hour": 60}
+    },
+    "command": {
+        "global": {"per_minute": 300, "per_hour": 0},
+        "group": {"per_minute": 60, "per_hour": 0},
+        "user": {"per_minute": 20, "per_hour": 0}
+    }
+}
+
+
+class TieredRateLimiter:
+    """
+    多级频率限制：全局 → 群 → 用户，AI请求和插件指令分别配置
+    一个繁忙的群只会耗尽自己的群额度，不会挤占其他群的AI配额和消息发送额度；
+    每个类别为状态后端中的一个命名空间，键为 层级:ID
+    """
+    def __init__(self, tiers_config: Dict[str, Dict[str, Dict[str, int]]], backend: Optional[StateBackend] = None):
+        self.backend = backend or MemoryStateBackend()
+        self.limits: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._windows: Dict[str, Dict[str, tuple]] = {}
+        for category, defaults in DEFAULT_RATE_LIMIT_TIERS.items():
+            category_config = (tiers_config or {}).get(category, {})
+            self.limits[category] = {}
+            self._windows[category] = {}
+            for tier in RATE_LIMIT_TIERS:
+                limits = {**defaults[tier], **(category_config.get(tier) or {})}
+                self.limits[category][tier] = {"per_minute": limits.get("per_minute", 0),
+                                               "per_hour": limits.get("per_hour", 0)}
+                self._windows[category][tier] = tuple(
+                    (seconds, limits.get(field, 0))
+                    for field, seconds in (("per_minute", 60), ("per_hour", 3600)) if limits.get(field, 0))
+        self.throttled = {category: {tier: 0 for tier in RATE_LIMIT_TIERS} for category in self.limits}
+        self.allowed = {category: 0 for category in self.limits}
+        self._registered = False
+
+    def acquire(self, category: str, user_id: str, group_id: Optional[str] = None) -> Optional[str]:
+        """申请一次请求额度（私聊没有群层级）
+        :param category: ai（AI调用）/ command（插件指令）
+        :return: 放行返回None，否则返回限流的层级（global/group/user）
+        """
+        windows = self._windows.get(category)
+        if windows is None:
+            return None
+        if not self._registered:
+            self._registered = True
+            from core.monitor import monitor_manager
+            monitor_manager.register_metrics_provider("rate_limit_tiers", self.get_stats)
+        tiers, entries = [], []
+        for tier, key in (("global", "*"), ("group", group_id), ("user", user_id)):
+            if key and windows[tier]:
+                tiers.append(tier)
+                entries.append((f"{tier}:{key}", windows[tier]))
+        # 所有层级在状态后端中一次原子检查，全部有余量后再统一计数，被拒绝的请求不占用外层额度
+        limited = self.backend.hit(category, entries, time.time()) if entries else None
+        if limited is not None:
+            tier = tiers[limited[0]]
+            self.throttled[category][tier] += 1
+            return tier
+        self.allowed[category] += 1
+        return None
+
+    def should_notify(self, category: str, user_id: str) -> bool:
+        """限流提醒去重：同一用户每个分钟窗口只提醒一次"""
+        return self.backend.claim(category, f"notice:{user_id}", int(time.time() // 60))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各类别放行次数、按层级统计的限流次数与各层级配置"""
+        return {
+            category: {
+                "allowed": self.allowed[category],
+                "throttled": dict(self.throttled[category]),
+                "limits": {tier: {**limits, "keys": self.backend.count_keys(category, f"{tier}:")}
+                           for tier, limits in tier_limits.items()}
+            }
+            for category, tier_limits in self.limits.items()
+        }
+
+
 class SecurityManager:
     """
     企业级安全管理器，统一管理所有安全相关功能
@@ -139,7 +283,29 @@ class SecurityManager:
     def _initialize(self):
         # 初始化组件
         self.validator = InputValidator()
-        self.rate_limiter = RateLimiter()
+        # 频率限制计数器和黑名单的状态后端（进程内存储，或多进程共享的SQLite状态库）
+        self.state_backend = create_state_backend(
+            config_manager.get("state_backend", "memory"),
+            config_manager.get("state_backend_path", "")
+        )
+        # 共享后端下定期检查黑名单版本，其他进程修改黑名单后清空本进程的权限决策缓存
+        self._blacklist_version = self.state_backend.blacklist_version()
+        self._next_state_sync = 0.0
+        # 用户消息频率限制，以及回调来源（Napcat连接）的总量限制
+        self.rate_limiter = RateLimiter(
+            "user",
+            config_manager.get("rate_limit_per_minute", 60),
+            config_manager.get("rate_limit_per_hour", 1000),
+            backend=self.state_backend
+        )
+        self.source_rate_limiter = RateLimiter(
+            "source",
+            config_manager.get("rate_limit_source_per_minute", 1200),
+            config_manager.get("rate_limit_source_per_hour", 0),
+            backend=self.state_backend
+        )
+        # AI调用/插件指令的全局 → 群 → 用户多级限流
+        self.tiered_rate_limiter = TieredRateLimiter(config_manager.get("rate_limit_tiers", {}), self.state_backend)
         
         # 角色权限映射
         self.role_permissions = {
@@ -148,29 +314,33 @@ class SecurityManager:
             UserRole.MASTER: ['basic_query', 'use_plugins', 'manage_plugins', 'system_admin']  # 主人有所有权限
         }
         
+        # 角色 -> 权限位掩码（由role_permissions编译）
+        self.role_masks: Dict[UserRole, Permission] = {}
+        
+        # 用户ID -> 权限位掩码（int）的决策缓存（无效ID、黑名单用户为0），黑名单/角色/配置变化时清空
+        self._permission_cache: Dict[str, int] = {}
+        # 用户ID -> 角色的缓存（审计日志等只需角色的场景使用），与权限决策缓存一同清空
+        self._role_cache: Dict[str, UserRole] = {}
+        
         # 用户角色映射（可从配置加载）
         self.user_roles: Dict[str, UserRole] = {}
         
-        # 黑名单
-        self.blacklist: Dict[str, Dict[str, Any]] = {}
-        
-        # 危险命令列表
-        self.dangerous_commands = [
-            r"rm\s+-rf",          # 强制删除命令
-            r"shutdown",          # 关机命令
-            r"init\s+0",          # 系统停机命令
-            r"reboot",            # 重启命令
-            r"mkfs|mke2fs",       # 格式化命令
-            r"dd\s+if=.*of=.*",   # 磁盘写入命令
-            r"chmod\s+777",       # 危险权限设置
-            r"sudo\s+su",         # 提权至root
-        ]
+        # 回调事件结构校验器（按事件类型预先编译）
+        self.event_validator = EventValidator(
+            config_manager.get("input_max_string_length", 5000),
+            config_manager.get("input_max_total_chars", 50000),
+            config_manager.get("input_max_segments", 200)
+        )
         
-        # 敏感操作审计日志
-        self.audit_logs: List[Dict[str, Any]] = []
+        # 内容过滤规则（内置危险命令/注入字符/SQL注入规则 + content_filter_rules配置），编译为单个正则
+        self.content_filter = ContentFilter(config_manager.get("content_filter_rules", []))
         
         # 加载配置
         self._load_config()
+        self.compile_role_permissions()
+        
+        # 配置重新加载或动态修改后重新读取角色并清空决策缓存
+        config_manager.add_listener(self._on_config_changed)
     
     def _load_config(self):
         """从配置管理器加载安全配置"""
@@ -181,6 +351,79 @@ class SecurityManager:
         
         # 移除管理员角色，不再加载管理员列表
     
+    def _on_config_changed(self, key: Optional[str]):
+        """配置变更监听：主人QQ等配置可能变化，重新加载角色"""
+        self.user_roles = {uid: role for uid, role in self.user_roles.items() if role != UserRole.MASTER}
+        self._load_config()
+        self.invalidate_permission_cache()
+        if key in (None, "content_filter_rules"):
+            self.content_filter.load(config_manager.get("content_filter_rules", []))
+    
+    def compile_role_permissions(self):
+        """将角色的权限名称列表编译为权限位掩码（修改role_permissions后需重新调用）"""
+        self.role_masks = {
+            role: Permission(sum(PERMISSION_FLAGS[name] for name in set(names) if name in PERMISSION_FLAGS))
+            for role, names in self.role_permissions.items()
+        }
+        self.invalidate_permission_cache()
+    
+    def invalidate_permission_cache(self):
+        """清空权限决策缓存和角色缓存（黑名单、角色或配置变化时调用）"""
+        self._permission_cache = {}
+        self._role_cache = {}
+    
+    def set_user_role(self, user_id: str, role: UserRole):
+        """设置用户角色"""
+        self.user_roles[str(user_id)] = role
+        self.invalidate_permission_cache()
+    
+    @property
+    def blacklist(self) -> Dict[str, Dict[str, Any]]:
+        """黑名单快照（用户ID -> 拉黑原因/时间/时长），修改请使用add_to_blacklist/remove_from_blacklist"""
+        return self.state_backend.blacklist_all()
+    
+    def _sync_shared_state(self):
+        """共享状态后端：每秒最多检查一次黑名单版本，发生变化时清空权限决策缓存"""
+        now = time.time()
+        if now < self._next_state_sync:
+            return
+        self._next_state_sync = now + STATE_SYNC_INTERVAL
+        version = self.state_backend.blacklist_version()
+        if version != self._blacklist_version:
+            self._blacklist_version = version
+            self.invalidate_permission_cache()
+    
+    def get_permission_mask(self, user_id: str) -> int:
+        """获取用户的权限位掩码（命中缓存时为一次字典查找）"""
+        if self.state_backend.shared:
+            self._sync_shared_state()
+        mask = self._permission_cache.get(user_id)
+        if mask is None:
+            if not self.validator.is_valid_qq(user_id) or self.state_backend.blacklist_get(user_id) is not None:
+                mask = 0
+            else:
+                mask = int(self.role_masks.get(self.get_cached_role(user_id), Permission.NONE))
+            cache = self._permission_cache
+            if len(cache) >= PERMISSION_CACHE_SIZE:
+                cache = self._permission_cache = {}
+            cache[user_id] = mask
+        return mask
+    
+    def has_permission(self, user_id: str, permissions: Permission) -> bool:
+        """快速权限判断：用户拥有permissions中任意一项即返回True（不记录日志）"""
+        return bool(self.get_permission_mask(user_id) & int(permissions))
+    
+    def get_cached_role(self, user_id: str) -> UserRole:
+        """获取用户角色（命中缓存时为一次字典查找，缓存随权限决策缓存一同清空）"""
+        role = self._role_cache.get(user_id)
+        if role is None:
+            role = self.get_user_role(user_id)
+            cache = self._role_cache
+            if len(cache) >= PERMISSION_CACHE_SIZE:
+                cache = self._role_cache = {}
+            cache[user_id] = role
+        return role
+    
     def get_user_role(self, user_id: str) -> UserRole:
         """
         获取用户角色
@@ -206,41 +449,22 @@ class SecurityManager:
         :param permission: 权限名称
         :return: (是否有权限, 提示信息)
         """
-        # 验证输入
+        flag = PERMISSION_BITS.get(permission, 0)
+        # 放行路径：一次字典查找 + 按位与，不记录日志
+        if self.get_permission_mask(user_id) & flag:
+            return True, "权限校验通过"
+        
+        # 拒绝路径：给出具体原因
         if not self.validator.is_valid_qq(user_id):
             return False, "无效的用户ID"
         
-        # 检查黑名单
-        if user_id in self.blacklist:
-            blacklist_info = self.blacklist[user_id]
+        blacklist_info = self.state_backend.blacklist_get(user_id)
+        if blacklist_info is not None:
             return False, f"您已被禁止使用此功能（原因：{blacklist_info.get('reason', '未指定')}）"
         
-        # 获取用户角色
         role = self.get_user_role(user_id)
-        
-        # 检查权限
-        if permission in self.role_permissions[role]:
-            logger_manager.log_with_context(
-                "info",
-                "权限校验通过",
-                context={
-                    "user_id": user_id,
-                    "role": role.value,
-                    "permission": permission
-                }
-            )
-            return True, f"权限校验通过（{role.value}）"
-        else:
-            logger_manager.log_with_context(
-                "warning",
-                "权限校验失败",
-                context={
-                    "user_id": user_id,
-                    "role": role.value,
-                    "permission": permission
-                }
-            )
-            return False, f"权限不足！需要{permission}权限，当前角色：{role.value}"
+        logger.warning(f"权限校验失败（用户：{user_id}，角色：{role.value}，权限：{permission}）")
+        return False, f"权限不足！需要{permission}权限，当前角色：{role.value}"
     
     def check_master_permission(self, user_id: str) -> Tuple[bool, str]:
         """
@@ -256,49 +480,15 @@ class SecurityManager:
         :param content: 待检查内容
         :return: (是否安全, 错误信息)
         """
-        # 净化内容
-        content = self.validator.sanitize_input(content)
+        # 对原始文本单次扫描所有规则（不再先做HTML转义，转义产生的&;#会被误判为注入字符）
+        matched = self.content_filter.match(content)
+        if matched is None:
+            return True, None
         
-        # 检查危险命令
-        for pattern in self.dangerous_commands:
-            if re.search(pattern, content, re.IGNORECASE):
-                logger_manager.log_with_context(
-                    "error",
-                    "检测到危险命令",
-                    context={"pattern": pattern, "content_preview": content[:100]}
-                )
-                return False, f"检测到危险命令模式：{pattern}"
-        
-        # 检查敏感字符（防注入）- 排除命令前缀斜杠
-        sensitive_pattern = r'[\;\&\|\$\<\>\'\"\`]'
-        # 允许命令前缀的斜杠，但检查其他位置的敏感字符
-        content_without_prefix = content[1:] if content.startswith('/') else content
-        if re.search(sensitive_pattern, content_without_prefix):
-            logger_manager.log_with_context(
-                    "warning",
-                    "检测到敏感字符",
-                    context={"content_preview": content[:100]}
-                )
-            return False, "内容包含敏感字符，可能存在安全风险"
-        
-        # 检查SQL注入
-        sql_patterns = [
-            r'\b(select|insert|update|delete|drop|truncate|alter)\b.*?\b(from|into|table|database)\b',
-            r'\bunion\s+select\b',
-            r'--|#',
-            r';\s*[a-zA-Z]'
-        ]
-        for pattern in sql_patterns:
-            if re.search(pattern, content, re.IGNORECASE):
-                logger_manager.log_with_context(
-                    logger,
-                    logging.ERROR,
-                    "检测到SQL注入尝试",
-                    context={"pattern": pattern, "content_preview": content[:100]}
-                )
-                return False, "检测到潜在的SQL注入攻击"
-        
-        return True, None
+        rule = matched.rule
+        log = logger.error if rule.category != "sensitive_char" else logger.warning
+        log(f"[内容过滤] 命中规则 {rule.id}（{rule.category}），内容预览：{content[:100]!r}")
+        return False, f"{rule.message}（规则：{rule.id}）"
     
     def log_audit_event(self, user_id: str, action: str, resource: str = None, success: bool = None, event_type: str = None, details: dict = None):
         """
@@ -311,29 +501,18 @@ class SecurityManager:
         :param details: 详细信息（兼容旧调用）
         """
         audit_entry = {
-            'timestamp': datetime.now().isoformat(),
+            'ts': time.time(),
             'user_id': user_id,
-            'role': self.get_user_role(user_id).value,
+            'role': self.get_cached_role(user_id).value,
             'action': action,
             'resource': resource,
             'success': success,
-            'ip_address': 'N/A'  # 可从请求中获取
+            'event_type': event_type,
+            'details': details
         }
         
-        # 记录到内存（可扩展为存储到文件或数据库）
-        self.audit_logs.append(audit_entry)
-        
-        # 保留最近1000条记录
-        if len(self.audit_logs) > 1000:
-            self.audit_logs = self.audit_logs[-1000:]
-        
-        # 记录到日志文件
-        logger_manager.log_with_context(
-            logger,
-            logging.INFO if success else logging.WARNING,
-            "审计日志",
-            context=audit_entry
-        )
+        # 写入审计库：只追加到环形缓冲区，由后台线程批量落盘，不阻塞请求线程（/审计 查询时先写出缓冲区）
+        audit_log.record(audit_entry)
     
     def add_to_blacklist(self, user_id: str, reason: str, duration: int = 0):
         """
@@ -342,11 +521,13 @@ class SecurityManager:
         :param reason: 拉黑原因
         :param duration: 拉黑时长（秒，0表示永久）
         """
-        self.blacklist[user_id] = {
+        self.state_backend.blacklist_set(user_id, {
             'reason': reason,
             'added_at': time.time(),
             'duration': duration
-        }
+        })
+        self._blacklist_version = self.state_backend.blacklist_version()
+        self.invalidate_permission_cache()
         
         logger = logger_manager.get_logger('GracyBot-Security')
         logger_manager.log_with_context(
@@ -365,8 +546,9 @@ class SecurityManager:
         从黑名单移除用户
         :param user_id: 用户ID
         """
-        if user_id in self.blacklist:
-            del self.blacklist[user_id]
+        if self.state_backend.blacklist_delete(user_id):
+            self._blacklist_version = self.state_backend.blacklist_version()
+            self.invalidate_permission_cache()
             logger = logger_manager.get_logger('GracyBot-Security')
             logger_manager.log_with_context(
                 logger,
@@ -413,37 +595,28 @@ class SecurityManager:
         except:
             return False
             
+    def validate_event(self, data: Any) -> Tuple[bool, Optional[str]]:
+        """
+        按事件类型校验回调数据的结构（必填字段、类型、嵌套长度和总量）
+        :param data: 回调事件数据
+        :return: (是否合法, 不合法时出错的字段和原因)
+        """
+        try:
+            self.event_validator.validate(data)
+        except SchemaError as e:
+            return False, str(e)
+        return True, None
+    
     def validate_input(self, data: Dict) -> bool:
         """
-        验证输入数据是否合法
+        验证输入数据是否合法（validate_event的布尔形式）
         :param data: 输入数据字典
         :return: 是否合法
         """
-        try:
-            # 基本类型检查
-            if not isinstance(data, dict):
-                return False
-            
-            # 放宽验证规则，允许正常的消息处理
-            # 只进行基本的安全检查，不再使用filter_dangerous_content进行严格过滤
-            
-            # 检查数据大小，防止过大的请求，但设置更大的阈值
-            data_str = json.dumps(data, ensure_ascii=False)
-            if len(data_str) > 50000:
-                logger.warning(f"[安全防护] 请求数据过大：{len(data_str)} 字符")
-                return False
-            
-            # 只对明显超长的字符串进行限制
-            for key, value in data.items():
-                if isinstance(value, str) and len(value) > 5000:
-                    logger.warning(f"[安全防护] 字段 {key} 值过长")
-                    return False
-            
-            return True
-        except Exception as e:
-            logger.error(f"[安全防护] 输入验证异常：{str(e)}")
-            # 为了让机器人正常工作，即使验证过程出错也返回True
-            return True
+        valid, reason = self.validate_event(data)
+        if not valid:
+            logger.warning(f"[安全防护] 输入数据验证失败：{reason}")
+        return valid
             
     def validate_command(self, command: str) -> bool:
         """
@@ -492,12 +665,29 @@ class SecurityManager:
             logger.error(f"插件访问验证异常: {str(e)}")
             return False
     
-    def check_rate_limit(self, key: str) -> Tuple[bool, Optional[str]]:
+    def check_rate_limit(self, key: str) -> bool:
         """
-        检查请求是否超过频率限制（代理到RateLimiter）
+        检查用户请求是否超过频率限制（代理到RateLimiter）
         :param key: 用户标识（如QQ号）
-        :return: (是否允许请求, 错误信息)
+        :return: 未超限返回True
+        """
+        return self.rate_limiter.allow(key)
+    
+    def acquire_rate_quota(self, category: str, user_id: str, group_id: Optional[str] = None) -> Optional[str]:
+        """
+        多级限流：全局、群、用户每一层都有余量时才放行（主人不受限）
+        :param category: ai（AI调用）/ command（插件指令）
+        :return: 放行返回None，否则返回限流的层级（global/group/user）
+        """
+        if self.get_permission_mask(str(user_id)) & PERMISSION_BITS["system_admin"]:
+            return None
+        return self.tiered_rate_limiter.acquire(category, user_id, group_id)
+    
+    def check_source_rate_limit(self, source: str) -> bool:
+        """
+        检查回调来源（客户端IP/WebSocket连接）的总请求量
+        :return: 未超限返回True
         """
-        return self.rate_limiter.check_rate_limit(key)
+        return self.source_rate_limiter.allow(source)
 
 security_manager = SecurityManager()
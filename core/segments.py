@@ -0,0 +1,150 @@
+"""消息段解析模块
+将OneBot消息数组（[{"type": "text", "data": {...}}, ...]）和CQ码字符串统一解析为紧凑的类型化消息段，
+每个事件只解析一次，同时预先提取路由和插件常用的信息：
+- mentions：被@的QQ号列表（@全体成员为"all"）
+- plain_text：所有文本段拼接后的纯文本
+- reply_to：回复的消息ID
+- images：图片地址（url缺失时为file字段）
+只需判断是否@某人时（如构建事件时判断@机器人）使用 mentions_qq，不构建消息段
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# CQ码：[CQ:类型,键=值,键=值]
+_CQ_CODE_PATTERN = re.compile(r"\[CQ:([A-Za-z_\-]+)((?:,[^\]]*)?)\]")
+_CQ_UNESCAPE = (("&#44;", ","), ("&#91;", "["), ("&#93;", "]"), ("&amp;", "&"))
+
+
+def _cq_unescape(value: str) -> str:
+    if "&" not in value:
+        return value
+    for escaped, char in _CQ_UNESCAPE:
+        value = value.replace(escaped, char)
+    return value
+
+
+def _parse_cq_params(params: str) -> Dict[str, str]:
+    """解析CQ码参数部分（",qq=123,name=xx"）"""
+    data = {}
+    for item in params.split(",")[1:]:
+        key, sep, value = item.partition("=")
+        if sep:
+            data[key] = _cq_unescape(value)
+    return data
+
+
+class Segment:
+    """单个消息段（类型 + 数据）"""
+
+    __slots__ = ("type", "data")
+
+    def __init__(self, seg_type: str, data: Dict[str, Any]):
+        self.type = seg_type
+        self.data = data
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Segment) and self.type == other.type and self.data == other.data
+
+    def __repr__(self) -> str:
+        return f"Segment({self.type!r}, {self.data!r})"
+
+
+def parse_cq_string(raw: str) -> List[Segment]:
+    """将CQ码字符串解析为消息段列表（CQ码之间的内容作为text段）"""
+    if "[CQ:" not in raw:
+        return [Segment("text", {"text": _cq_unescape(raw)})] if raw else []
+    # split按捕获组展开：[文本, 类型, 参数, 文本, 类型, 参数, ..., 文本]
+    parts = _CQ_CODE_PATTERN.split(raw)
+    segments = []
+    for i in range(0, len(parts) - 1, 3):
+        if parts[i]:
+            segments.append(Segment("text", {"text": _cq_unescape(parts[i])}))
+        segments.append(Segment(parts[i + 1], _parse_cq_params(parts[i + 2])))
+    if parts[-1]:
+        segments.append(Segment("text", {"text": _cq_unescape(parts[-1])}))
+    return segments
+
+
+def parse_segment_array(message: List[Any]) -> List[Segment]:
+    """将OneBot消息数组解析为消息段列表（忽略格式不正确的元素）"""
+    segments = []
+    for item in message:
+        if isinstance(item, dict) and item.get("type"):
+            segments.append(Segment(item["type"], item.get("data") or {}))
+    return segments
+
+
+class ParsedMessage:
+    """解析后的消息：消息段列表 + 一次遍历预先提取的常用信息"""
+
+    __slots__ = ("segments", "mentions", "plain_text", "reply_to", "images")
+
+    def __init__(self, segments: List[Segment]):
+        self.segments = segments
+        mentions: List[str] = []
+        texts: List[str] = []
+        images: List[str] = []
+        reply_to: Optional[str] = None
+        for seg in segments:
+            seg_type = seg.type
+            if seg_type == "text":
+                texts.append(str(seg.data.get("text", "")))
+            elif seg_type == "at":
+                mentions.append(str(seg.data.get("qq")))
+            elif seg_type == "reply":
+                if reply_to is None and seg.data.get("id") is not None:
+                    reply_to = str(seg.data["id"])
+            elif seg_type == "image":
+                image = seg.data.get("url") or seg.data.get("file")
+                if image:
+                    images.append(str(image))
+        self.mentions: Tuple[str, ...] = tuple(mentions)
+        self.plain_text = "".join(texts).strip()
+        self.reply_to = reply_to
+        self.images: Tuple[str, ...] = tuple(images)
+
+    def is_at(self, qq) -> bool:
+        """消息是否@了指定QQ号"""
+        return str(qq) in self.mentions
+
+    @property
+    def at_all(self) -> bool:
+        """消息是否@全体成员"""
+        return "all" in self.mentions
+
+    def __repr__(self) -> str:
+        return (f"ParsedMessage(mentions={self.mentions!r}, reply_to={self.reply_to!r}, "
+                f"images={len(self.images)}, plain_text={self.plain_text[:20]!r})")
+
+
+def parse_message(message: Any, raw_message: str = "") -> ParsedMessage:
+    """解析事件中的消息内容
+    :param message: 事件的message字段（消息数组或CQ码字符串）
+    :param raw_message: 事件的raw_message字段（message缺失时使用）
+    """
+    if isinstance(message, list):
+        return ParsedMessage(parse_segment_array(message))
+    if isinstance(message, str) and message:
+        return ParsedMessage(parse_cq_string(message))
+    return ParsedMessage(parse_cq_string(raw_message or ""))
+
+
+def mentions_qq(message: Any, raw_message: str, qq) -> bool:
+    """消息是否@了指定QQ号（与 parse_message(message, raw_message).is_at(qq) 结果一致，但不解析消息段）"""
+    qq = str(qq)
+    if isinstance(message, list):
+        for item in message:
+            if isinstance(item, dict) and item.get("type") == "at" and str((item.get("data") or {}).get("qq")) == qq:
+                return True
+        return False
+    text = message if isinstance(message, str) and message else (raw_message or "")
+    # 子串查找 [CQ:at,qq=QQ号，其后须为下一个参数或CQ码结束（排除以该QQ号为前缀的更长号码）
+    needle = f"[CQ:at,qq={qq}"
+    end = len(needle)
+    idx = text.find(needle)
+    while idx >= 0:
+        if text[idx + end:idx + end + 1] in (",", "]"):
+            return True
+        idx = text.find(needle, idx + end)
+    return False
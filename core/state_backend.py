@@ -0,0 +1,437 @@
+"""共享状态后端模块
+频率限制计数器和黑名单存放在状态后端中，由 state_backend 配置选择实现：
+- memory：进程内存储（默认），计数器按锁分段存放，每次检查为O(1)
+- sqlite：同一主机上多个机器人进程共享的SQLite库（WAL模式），检查和计数在同一个写事务（BEGIN IMMEDIATE）中完成，
+  多进程并发时计数为原子操作，限额和拉黑在所有进程间生效，无需额外的网络服务
+
+计数器为滑动窗口估算：每个窗口保存上一窗口计数和当前窗口计数，估算值 = 上一窗口计数 × 剩余比例 + 当前窗口计数
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.logger_manager import logger_manager, LOG_DIR
+
+logger = logger_manager.get_logger("security")
+
+# 单个计数器的窗口配置：((窗口秒数, 上限), ...)，上限为0的窗口由调用方省略
+Windows = Tuple[Tuple[int, int], ...]
+# 一次检查涉及的计数器：((键, 窗口配置), ...)
+HitEntries = Sequence[Tuple[str, Windows]]
+
+
+def _window_estimate(window_id: int, prev: int, cur: int, window: int, now: float) -> Tuple[int, int, int, float]:
+    """滚动到当前窗口并估算滑动窗口内的请求数
+    :return: (当前窗口编号, 上一窗口计数, 当前窗口计数, 估算请求数)
+    """
+    current_id = int(now // window)
+    if current_id != window_id:
+        prev = cur if current_id == window_id + 1 else 0
+        cur = 0
+    return current_id, prev, cur, prev * (1 - (now % window) / window) + cur
+
+
+class StateBackend:
+    """状态后端接口"""
+
+    name = "base"
+    shared = False  # 是否在多个进程间共享（共享后端需定期同步黑名单版本）
+
+    def hit(self, namespace: str, entries: HitEntries, now: float, record: bool = True) -> Optional[Tuple[int, int]]:
+        """原子地检查一组计数器，全部未超限时（record为True）各计数一次
+        :param namespace: 命名空间（如限流器名称），不同命名空间的键互不影响
+        :param entries: ((键, ((窗口秒数, 上限), ...)), ...)
+        :return: 放行返回None，否则返回超限的 (计数器下标, 窗口下标)，超限时不计数
+        """
+        raise NotImplementedError
+
+    def claim(self, namespace: str, key: str, window_id: int) -> bool:
+        """标记键在某个窗口内已处理（如超限提醒去重），该窗口内首次调用返回True"""
+        raise NotImplementedError
+
+    def count_keys(self, namespace: str, prefix: str = "") -> int:
+        """命名空间内跟踪的计数器键数量"""
+        raise NotImplementedError
+
+    def blacklist_get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取黑名单记录（reason/added_at/duration），不在黑名单中返回None"""
+        raise NotImplementedError
+
+    def blacklist_set(self, user_id: str, info: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def blacklist_delete(self, user_id: str) -> bool:
+        """移除黑名单记录，记录存在时返回True"""
+        raise NotImplementedError
+
+    def blacklist_all(self) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    def blacklist_version(self) -> int:
+        """黑名单版本号（每次修改加一），用于发现其他进程的修改"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class _CounterStore:
+    """单个命名空间的进程内计数器：键按锁分段存放，每段内按最近访问时间有序"""
+
+    def __init__(self, stripes: int):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        self.stripes: List["OrderedDict[str, list]"] = [OrderedDict() for _ in range(stripes)]
+        # 空闲超过最长窗口的键计数已基本归零，可直接淘汰
+        self.idle_ttl = 60
+
+
+class MemoryStateBackend(StateBackend):
+    """进程内状态后端（默认）"""
+
+    name = "memory"
+    STRIPES = 16
+    # 计数器状态下标：最近访问时间、已标记的窗口编号，之后每个窗口依次为 窗口编号/上一窗口计数/当前窗口计数
+    _SEEN, _CLAIMED = 0, 1
+
+    def __init__(self):
+        self._stores: Dict[str, _CounterStore] = {}
+        self._stores_lock = threading.Lock()
+        self._blacklist: Dict[str, Dict[str, Any]] = {}
+        self._blacklist_version = 0
+        self.evicted = 0
+
+    def _store(self, namespace: str) -> _CounterStore:
+        store = self._stores.get(namespace)
+        if store is None:
+            with self._stores_lock:
+                store = self._stores.setdefault(namespace, _CounterStore(self.STRIPES))
+        return store
+
+    def _state(self, store: _CounterStore, idx: int, key: str, slots: int, now: float) -> list:
+        """获取（不存在时创建）键状态并淘汰该分段中的空闲键，调用方需持有分段锁"""
+        stripe = store.stripes[idx]
+        state = stripe.get(key)
+        if state is None:
+            state = [now, -1]
+            stripe[key] = state
+        else:
+            stripe.move_to_end(key)
+        if len(state) < 2 + 3 * slots:
+            state.extend([0] * (2 + 3 * slots - len(state)))
+        state[self._SEEN] = now
+
+        expire_before = now - store.idle_ttl
+        while stripe:
+            oldest_key, oldest = next(iter(stripe.items()))
+            if oldest[self._SEEN] >= expire_before:
+                break
+            del stripe[oldest_key]
+            self.evicted += 1
+        return state
+
+    def hit(self, namespace: str, entries: HitEntries, now: float, record: bool = True) -> Optional[Tuple[int, int]]:
+        store = self._stores.get(namespace) or self._store(namespace)
+        if len(entries) == 1:
+            return self._hit_one(store, entries[0][0], entries[0][1], now, record)
+        indexes = [hash(key) % self.STRIPES for key, _ in entries]
+        # 多个计数器按分段编号顺序加锁，避免死锁
+        locks = [store.locks[idx] for idx in sorted(set(indexes))]
+        for lock in locks:
+            lock.acquire()
+        try:
+            states = []
+            for (key, windows), idx in zip(entries, indexes):
+                for window, _ in windows:
+                    if window > store.idle_ttl:
+                        store.idle_ttl = window
+                state = self._state(store, idx, key, len(windows), now)
+                for slot, (window, limit) in enumerate(windows):
+                    base = 2 + 3 * slot
+                    state[base], state[base + 1], state[base + 2], estimate = _window_estimate(
+                        state[base], state[base + 1], state[base + 2], window, now)
+                    if estimate >= limit:
+                        return len(states), slot
+                states.append((state, len(windows)))
+            if record:
+                for state, slots in states:
+                    for slot in range(slots):
+                        state[4 + 3 * slot] += 1
+            return None
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def _hit_one(self, store: _CounterStore, key: str, windows: Windows, now: float, record: bool) -> Optional[Tuple[int, int]]:
+        """单个计数器的检查（单级限流的常见路径，只需一个分段锁）"""
+        idx = hash(key) % self.STRIPES
+        with store.locks[idx]:
+            if windows[-1][0] > store.idle_ttl:
+                store.idle_ttl = max(window for window, _ in windows)
+            state = self._state(store, idx, key, len(windows), now)
+            base = 2
+            for slot, (window, limit) in enumerate(windows):
+                window_id = int(now // window)
+                if window_id != state[base]:
+                    state[base + 1] = state[base + 2] if window_id == state[base] + 1 else 0
+                    state[base + 2] = 0
+                    state[base] = window_id
+                if state[base + 1] * (1 - (now % window) / window) + state[base + 2] >= limit:
+                    return 0, slot
+                base += 3
+            if record:
+                for base in range(4, 4 + 3 * len(windows), 3):
+                    state[base] += 1
+        return None
+
+    def claim(self, namespace: str, key: str, window_id: int) -> bool:
+        store = self._store(namespace)
+        idx = hash(key) % self.STRIPES
+        with store.locks[idx]:
+            state = self._state(store, idx, key, 0, time.time())
+            if state[self._CLAIMED] == window_id:
+                return False
+            state[self._CLAIMED] = window_id
+        return True
+
+    def count_keys(self, namespace: str, prefix: str = "") -> int:
+        store = self._stores.get(namespace)
+        if store is None:
+            return 0
+        if not prefix:
+            return sum(len(stripe) for stripe in store.stripes)
+        return sum(1 for stripe in store.stripes for key in list(stripe) if key.startswith(prefix))
+
+    def blacklist_get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._blacklist.get(user_id)
+
+    def blacklist_set(self, user_id: str, info: Dict[str, Any]) -> None:
+        self._blacklist[user_id] = info
+        self._blacklist_version += 1
+
+    def blacklist_delete(self, user_id: str) -> bool:
+        if self._blacklist.pop(user_id, None) is None:
+            return False
+        self._blacklist_version += 1
+        return True
+
+    def blacklist_all(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._blacklist)
+
+    def blacklist_version(self) -> int:
+        return self._blacklist_version
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "namespaces": {namespace: self.count_keys(namespace) for namespace in list(self._stores)},
+            "evicted": self.evicted,
+            "blacklist_size": len(self._blacklist)
+        }
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_counters (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    window_id INTEGER NOT NULL,
+    prev INTEGER NOT NULL,
+    cur INTEGER NOT NULL,
+    seen REAL NOT NULL,
+    PRIMARY KEY (namespace, key, window)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rate_counters_seen ON rate_counters (seen);
+CREATE TABLE IF NOT EXISTS claims (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    window_id INTEGER NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS blacklist (
+    user_id TEXT PRIMARY KEY,
+    reason TEXT,
+    added_at REAL,
+    duration INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('blacklist_version', 0);
+"""
+
+
+class SQLiteStateBackend(StateBackend):
+    """同一主机多进程共享的SQLite状态后端（WAL模式）
+    每个线程使用独立连接；检查与计数在 BEGIN IMMEDIATE 写事务中完成，进程间串行，计数不会丢失或超发。
+    后端出错时放行请求并记录错误（频率限制不应因状态库故障阻断所有消息）
+    """
+
+    name = "sqlite"
+    shared = True
+    # 清理空闲计数器的间隔（秒）
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path: str = "", timeout: float = 5.0):
+        self.path = os.path.abspath(path or os.path.join(LOG_DIR, "state.db"))
+        self.timeout = timeout
+        self._local = threading.local()
+        self._next_purge = 0.0
+        self.errors = 0
+        self.purged = 0
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn().executescript(_SQLITE_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None：事务由BEGIN IMMEDIATE/COMMIT显式控制
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _on_error(self, action: str, error: Exception):
+        self.errors += 1
+        logger.error(f"[状态后端] {action}失败：{str(error)}")
+
+    def hit(self, namespace: str, entries: HitEntries, now: float, record: bool = True) -> Optional[Tuple[int, int]]:
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = []
+                for entry_idx, (key, windows) in enumerate(entries):
+                    for slot, (window, limit) in enumerate(windows):
+                        row = conn.execute(
+                            "SELECT window_id, prev, cur FROM rate_counters WHERE namespace = ? AND key = ? AND window = ?",
+                            (namespace, key, window)).fetchone()
+                        window_id, prev, cur, estimate = _window_estimate(*(row or (-1, 0, 0)), window, now)
+                        if estimate >= limit:
+                            conn.execute("COMMIT")
+                            return entry_idx, slot
+                        rows.append((namespace, key, window, window_id, prev, cur + 1, now))
+                if record and rows:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO rate_counters (namespace, key, window, window_id, prev, cur, seen) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                if now >= self._next_purge:
+                    self._next_purge = now + self.PURGE_INTERVAL
+                    # 空闲超过窗口长度的计数器已基本归零
+                    self.purged += conn.execute("DELETE FROM rate_counters WHERE seen < ? - window", (now,)).rowcount
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            self._on_error("频率计数", e)
+        return None
+
+    def claim(self, namespace: str, key: str, window_id: int) -> bool:
+        try:
+            conn = self._conn()
+            cursor = conn.execute(
+                "INSERT INTO claims (namespace, key, window_id) VALUES (?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET window_id = excluded.window_id "
+                "WHERE claims.window_id != excluded.window_id",
+                (namespace, key, window_id))
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            self._on_error("标记", e)
+            return True
+
+    def count_keys(self, namespace: str, prefix: str = "") -> int:
+        try:
+            row = self._conn().execute(
+                "SELECT COUNT(DISTINCT key) FROM rate_counters WHERE namespace = ? AND substr(key, 1, ?) = ?",
+                (namespace, len(prefix), prefix)).fetchone()
+            return row[0]
+        except sqlite3.Error as e:
+            self._on_error("统计", e)
+            return 0
+
+    def blacklist_get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            row = self._conn().execute(
+                "SELECT reason, added_at, duration FROM blacklist WHERE user_id = ?", (user_id,)).fetchone()
+        except sqlite3.Error as e:
+            self._on_error("读取黑名单", e)
+            return None
+        return None if row is None else {"reason": row[0], "added_at": row[1], "duration": row[2]}
+
+    def _write_blacklist(self, sql: str, params: tuple) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            changed = conn.execute(sql, params).rowcount
+            if changed:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'blacklist_version'")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return changed
+
+    def blacklist_set(self, user_id: str, info: Dict[str, Any]) -> None:
+        try:
+            self._write_blacklist(
+                "INSERT OR REPLACE INTO blacklist (user_id, reason, added_at, duration) VALUES (?, ?, ?, ?)",
+                (user_id, info.get("reason"), info.get("added_at"), info.get("duration", 0)))
+        except sqlite3.Error as e:
+            self._on_error("写入黑名单", e)
+
+    def blacklist_delete(self, user_id: str) -> bool:
+        try:
+            return self._write_blacklist("DELETE FROM blacklist WHERE user_id = ?", (user_id,)) > 0
+        except sqlite3.Error as e:
+            self._on_error("移除黑名单", e)
+            return False
+
+    def blacklist_all(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            rows = self._conn().execute("SELECT user_id, reason, added_at, duration FROM blacklist").fetchall()
+        except sqlite3.Error as e:
+            self._on_error("读取黑名单", e)
+            return {}
+        return {row[0]: {"reason": row[1], "added_at": row[2], "duration": row[3]} for row in rows}
+
+    def blacklist_version(self) -> int:
+        try:
+            return self._conn().execute("SELECT value FROM meta WHERE name = 'blacklist_version'").fetchone()[0]
+        except sqlite3.Error as e:
+            self._on_error("读取黑名单版本", e)
+            return -1
+
+    def get_stats(self) -> Dict[str, Any]:
+        try:
+            conn = self._conn()
+            counters = conn.execute("SELECT COUNT(*) FROM rate_counters").fetchone()[0]
+            blacklist_size = conn.execute("SELECT COUNT(*) FROM blacklist").fetchone()[0]
+        except sqlite3.Error as e:
+            self._on_error("统计", e)
+            counters = blacklist_size = -1
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "counters": counters,
+            "blacklist_size": blacklist_size,
+            "purged": self.purged,
+            "errors": self.errors
+        }
+
+
+def create_state_backend(kind: str = "memory", path: str = "") -> StateBackend:
+    """按配置创建状态后端（共享后端初始化失败时退回进程内存储）"""
+    if kind == "sqlite":
+        try:
+            backend = SQLiteStateBackend(path)
+            logger.info(f"[状态后端] 使用共享SQLite状态库：{backend.path}")
+            return backend
+        except (sqlite3.Error, OSError) as e:
+            logger.error(f"[状态后端] 共享状态库初始化失败，退回进程内存储：{str(e)}")
+    return MemoryStateBackend()
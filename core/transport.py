@@ -0,0 +1,304 @@
+"""Napcat传输层模块
+提供OneBot v11 WebSocket传输，作为HTTP POST回调 + HTTP API调用的替代方案：
+- 正向WS（forward）：机器人主动连接Napcat的WS服务，断线自动重连
+- 反向WS（reverse）：机器人监听WS端口，由Napcat主动连接
+事件推送和API调用复用同一条长连接，API响应通过echo字段关联
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Any, Callable, Optional
+
+from core.utils import logger
+from core.config_manager import config_manager
+
+
+class NapcatApiError(Exception):
+    """Napcat API调用失败（连接不可用、超时等）"""
+
+
+class WebSocketTransport:
+    """OneBot v11 WebSocket传输：在独立线程的事件循环中维护长连接"""
+
+    def __init__(self):
+        self.mode = config_manager.get("napcat_ws_mode", "forward")
+        self.url = config_manager.get("napcat_ws_url", "ws://localhost:3001")
+        self.listen_port = config_manager.get("napcat_ws_listen_port", 3003)
+        self.access_token = config_manager.get("napcat_access_token", "")
+        self.api_timeout = config_manager.get("napcat_ws_timeout", 10)
+        self.max_pending = config_manager.get("napcat_ws_max_pending", 128)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ws = None
+        self._connected = threading.Event()
+        self._running = False
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._echo_counter = itertools.count(1)
+        self._event_handler: Optional[Callable[[Dict[str, Any]], Any]] = None
+        # 已交给线程池但尚未处理完的事件数（只在事件循环线程中增加，工作线程中减少）
+        self._pending_events = 0
+        self._pending_lock = threading.Lock()
+        self._last_drop_warning = 0.0
+        self.stats = {"events": 0, "dropped": 0, "api_calls": 0, "api_errors": 0, "reconnects": 0}
+
+    # ========== 生命周期 ==========
+    def start(self, event_handler: Callable[[Dict[str, Any]], Any]):
+        """启动传输线程
+        :param event_handler: 收到事件时调用的同步函数（在线程池中执行）
+        """
+        if self._running:
+            return
+        self._event_handler = event_handler
+        self._running = True
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="napcat-ws", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        main = self._forward_loop() if self.mode == "forward" else self._reverse_server()
+        try:
+            self._loop.run_until_complete(main)
+        except Exception as e:
+            logger.error(f"[WS传输] 事件循环异常退出：{str(e)}", exc_info=True)
+
+    def shutdown(self, timeout: float = 5):
+        """关闭连接并停止传输线程"""
+        if not self._running:
+            return
+        self._running = False
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._close_ws(), self._loop)
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        logger.info("[WS传输] 已关闭")
+
+    async def _close_ws(self):
+        if self._ws is not None and not self._ws.closed:
+            await self._ws.close()
+
+    def _auth_headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"} if self.access_token else {}
+
+    # ========== 正向WS：主动连接 + 自动重连 ==========
+    async def _forward_loop(self):
+        import aiohttp
+
+        backoff = 1
+        async with aiohttp.ClientSession() as session:
+            while self._running:
+                try:
+                    async with session.ws_connect(self.url, headers=self._auth_headers(), heartbeat=30) as ws:
+                        logger.info(f"[WS传输] 已连接Napcat：{self.url}")
+                        backoff = 1
+                        await self._serve_connection(ws)
+                except Exception as e:
+                    logger.warning(f"[WS传输] 连接Napcat失败：{str(e)}")
+                if not self._running:
+                    break
+                self.stats["reconnects"] += 1
+                logger.info(f"[WS传输] {backoff}秒后重连")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    # ========== 反向WS：等待Napcat连接 ==========
+    async def _reverse_server(self):
+        from aiohttp import web
+
+        async def ws_endpoint(request: web.Request):
+            if self.access_token:
+                token = request.headers.get("Authorization", "").replace("Bearer ", "", 1) \
+                    or request.query.get("access_token", "")
+                if token != self.access_token:
+                    logger.warning(f"[WS传输] 拒绝未授权的反向WS连接：{request.remote}")
+                    return web.Response(status=401)
+            ws = web.WebSocketResponse(heartbeat=30)
+            await ws.prepare(request)
+            logger.info(f"[WS传输] Napcat已通过反向WS连接：{request.remote}")
+            await self._serve_connection(ws)
+            return ws
+
+        app = web.Application()
+        app.router.add_get("/", ws_endpoint)
+        app.router.add_get("/onebot/v11/ws", ws_endpoint)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", self.listen_port).start()
+        logger.info(f"[WS传输] 反向WS监听端口：{self.listen_port}")
+        try:
+            while self._running:
+                await asyncio.sleep(1)
+        finally:
+            await runner.cleanup()
+
+    # ========== 连接读循环 ==========
+    async def _serve_connection(self, ws):
+        """读取单条连接上的帧：echo响应唤醒等待方，事件交给事件处理函数"""
+        from aiohttp import WSMsgType
+
+        self._ws = ws
+        self._connected.set()
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    if msg.type == WSMsgType.ERROR:
+                        logger.warning(f"[WS传输] 连接错误：{ws.exception()}")
+                    continue
+                try:
+                    frame = json.loads(msg.data)
+                except ValueError:
+                    logger.warning("[WS传输] 收到无法解析的帧，已忽略")
+                    continue
+                self._handle_frame(frame)
+        finally:
+            self._connected.clear()
+            if self._ws is ws:
+                self._ws = None
+            # 连接断开时，所有未完成的API调用立即失败，避免调用方等到超时
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(NapcatApiError("WebSocket连接已断开"))
+            self._pending.clear()
+            logger.warning("[WS传输] 连接已断开")
+
+    def _handle_frame(self, frame: Dict[str, Any]):
+        echo = frame.get("echo")
+        if echo is not None and "post_type" not in frame:
+            future = self._pending.pop(str(echo), None)
+            if future is not None and not future.done():
+                future.set_result(frame)
+            return
+        if "post_type" in frame and self._event_handler is not None:
+            self.stats["events"] += 1
+            # 事件处理包含同步插件调用，放到线程池中执行，不阻塞读循环；
+            # 线程池的任务队列无上限，因此限制待处理事件数，超出时直接丢弃（读循环不能等待，
+            # 否则工作线程中等待API响应的调用会与读循环互相阻塞）
+            with self._pending_lock:
+                if self._pending_events >= self.max_pending:
+                    accepted = False
+                else:
+                    self._pending_events += 1
+                    accepted = True
+            if not accepted:
+                self._drop_event(frame)
+                return
+            self._loop.run_in_executor(None, self._run_event_handler, frame)
+
+    def _drop_event(self, frame: Dict[str, Any]):
+        self.stats["dropped"] += 1
+        now = time.monotonic()
+        # 积压期间每10秒最多输出一次警告
+        if now - self._last_drop_warning >= 10:
+            self._last_drop_warning = now
+            logger.warning(f"[WS传输] 待处理事件已达上限（{self.max_pending}），丢弃新事件"
+                           f"（post_type：{frame.get('post_type')}，累计丢弃：{self.stats['dropped']}）")
+
+    def _run_event_handler(self, frame: Dict[str, Any]):
+        try:
+            self._event_handler(frame)
+        except Exception as e:
+            logger.error(f"[WS传输] 事件处理异常：{str(e)}", exc_info=True)
+        finally:
+            with self._pending_lock:
+                self._pending_events -= 1
+
+    # ========== API调用 ==========
+    async def _call(self, action: str, params: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        ws = self._ws
+        if ws is None or ws.closed:
+            raise NapcatApiError("WebSocket未连接")
+        echo = str(next(self._echo_counter))
+        future = self._loop.create_future()
+        self._pending[echo] = future
+        try:
+            await ws.send_str(json.dumps({"action": action, "params": params, "echo": echo}, ensure_ascii=False))
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise NapcatApiError(f"API调用超时（{timeout}秒）：{action}")
+        finally:
+            self._pending.pop(echo, None)
+
+    def call_api(self, action: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """同步调用OneBot API（线程安全，可在任意非传输线程中调用）
+        :return: OneBot响应（包含status/retcode/data）
+        """
+        timeout = timeout or self.api_timeout
+        if not self._running or self._loop is None:
+            raise NapcatApiError("WebSocket传输未启动")
+        # 短暂等待连接建立（启动阶段或重连中）
+        if not self._connected.wait(timeout):
+            raise NapcatApiError("WebSocket未连接")
+        self.stats["api_calls"] += 1
+        future: Future = asyncio.run_coroutine_threadsafe(self._call(action, params, timeout), self._loop)
+        try:
+            return future.result(timeout + 1)
+        except Exception:
+            self.stats["api_errors"] += 1
+            raise
+
+    async def call_api_async(self, action: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """异步调用OneBot API（可在其他事件循环中await，如asyncio服务模式）"""
+        timeout = timeout or self.api_timeout
+        if not self._running or self._loop is None:
+            raise NapcatApiError("WebSocket传输未启动")
+        self.stats["api_calls"] += 1
+        future = asyncio.run_coroutine_threadsafe(self._call(action, params, timeout), self._loop)
+        try:
+            return await asyncio.wrap_future(future)
+        except Exception:
+            self.stats["api_errors"] += 1
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接状态与收发统计"""
+        return {
+            "mode": self.mode,
+            "connected": self._connected.is_set(),
+            "pending_calls": len(self._pending),
+            **self.stats
+        }
+
+
+class NapcatTransport:
+    """传输选择器：根据配置 napcat_transport 决定使用HTTP还是WebSocket"""
+
+    def __init__(self):
+        self.kind = config_manager.get("napcat_transport", "http")
+        self.ws: Optional[WebSocketTransport] = None
+
+    def is_ws(self) -> bool:
+        """当前是否通过WebSocket收发"""
+        return self.ws is not None
+
+    def start(self, event_handler: Callable[[Dict[str, Any]], Any]) -> bool:
+        """按配置启动传输（HTTP模式无需启动）
+        :return: 是否启用了WebSocket传输
+        """
+        if self.kind != "ws":
+            logger.info("📌 Napcat传输：HTTP（POST回调 + HTTP API）")
+            return False
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            logger.error("❌ WebSocket传输依赖缺失，请执行 pip install aiohttp，已回退到HTTP传输")
+            return False
+
+        self.ws = WebSocketTransport()
+        self.ws.start(event_handler)
+        from core.monitor import monitor_manager
+        monitor_manager.register_metrics_provider("napcat_ws", self.ws.get_stats)
+        logger.info(f"📌 Napcat传输：WebSocket（{self.ws.mode}）")
+        return True
+
+    def shutdown(self):
+        if self.ws is not None:
+            self.ws.shutdown()
+
+
+# 全局传输实例
+napcat_transport = NapcatTransport()
@@ -1,6 +1,7 @@
 import requests
 import json
 import logging
+import time
 from typing import Optional, Dict, Any
 
 # 从core包导入配置模块
@@ -23,6 +24,7 @@ logger_manager.setup_logging(
 
 # 再导入其他需要的模块
 from .security import SanitizeLogFilter
+from . import request_log
 
 # 创建日志实例
 logger = logger_manager.get_logger('GracyBot-HTTP-Pure')
@@ -30,18 +32,37 @@ logger = logger_manager.get_logger('GracyBot-HTTP-Pure')
 # 为所有日志器添加脱敏过滤器
 def add_sanitize_filter_to_loggers():
     sanitize_filter = SanitizeLogFilter()
-    # 添加到根日志器
-    root_logger = logger_manager.get_logger('')
-    root_logger.addFilter(sanitize_filter)
-    
-    # 添加到主要日志器
-    for logger_name in ['GracyBot', 'GracyBot-HTTP-Pure', 'GracyBot-Plugin']:
-        named_logger = logger_manager.get_logger(logger_name)
-        named_logger.addFilter(sanitize_filter)
+    # 异步日志模式下由后台写出线程统一脱敏；同步模式下添加到根日志器和主要日志器
+    logger_manager.add_record_filter(
+        sanitize_filter, ['', 'GracyBot', 'GracyBot-HTTP-Pure', 'GracyBot-Plugin'])
 
 # 添加脱敏过滤器
 add_sanitize_filter_to_loggers()
 
+# ========== Napcat接口调用（按配置走HTTP或WebSocket） ==========
+def call_napcat_api(action: str, params: Dict[str, Any], timeout: int = 10) -> Dict[str, Any]:
+    """
+    调用Napcat OneBot API，napcat_transport=ws时复用WebSocket长连接，否则发送HTTP POST
+    :param action: 接口名（如send_private_msg）
+    :param params: 接口参数
+    :param timeout: 超时时间（秒）
+    :return: OneBot响应（包含status/retcode/data），调用失败时抛出异常
+    """
+    from .transport import napcat_transport  # 延迟导入，避免循环依赖
+    if napcat_transport.is_ws():
+        return napcat_transport.ws.call_api(action, params, timeout)
+
+    # 发送POST请求（JSON格式，UTF-8编码）
+    response = requests.post(
+        f"{NAPCAT_HTTP_URL}/{action}",
+        data=json.dumps(params, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        timeout=timeout
+    )
+    # 检查HTTP状态码
+    response.raise_for_status()
+    return response.json()
+
 # ========== 通用消息发送工具（全局唯一实现，所有模块复用） ==========
 def send_http_msg(target: str, content: str, chat_type: str = "private", 
                  context: Optional[Dict[str, Any]] = None) -> bool:
@@ -74,27 +95,22 @@ def send_http_msg(target: str, content: str, chat_type: str = "private",
             )
             return False
         
-        # 按聊天类型拼接接口URL和参数
+        # 按聊天类型选择接口和参数
         if chat_type == "private":
-            url = f"{NAPCAT_HTTP_URL}/send_private_msg"
+            action = "send_private_msg"
             params = {"user_id": int(target), "message": content}
         else:
-            url = f"{NAPCAT_HTTP_URL}/send_group_msg"
+            action = "send_group_msg"
             params = {"group_id": int(target), "message": content}
         
-        # 发送POST请求（JSON格式，UTF-8编码）
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-        response = requests.post(
-            url,
-            data=json.dumps(params, ensure_ascii=False).encode("utf-8"),
-            headers=headers,
-            timeout=10  # 超时保护，避免阻塞
-        )
-        
-        # 检查HTTP状态码
-        response.raise_for_status()
-        
-        result = response.json()
+        # 调用Napcat接口（HTTP或WebSocket，超时保护避免阻塞），耗时计入napcat_send直方图
+        from .monitor import monitor_manager  # 延迟导入，避免循环依赖
+        send_start = time.perf_counter()
+        try:
+            with request_log.stage("send"):
+                result = call_napcat_api(action, params, timeout=10)
+        finally:
+            monitor_manager.record_latency("napcat_send", time.perf_counter() - send_start)
         
         # 结果判断与日志记录
         if result.get("retcode") == 0:
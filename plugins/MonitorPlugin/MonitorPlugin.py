@@ -6,69 +6,29 @@ from core.utils import logger
 from core.monitor import monitor_manager
 from core.plugin_manager import plugin_manager
 
-def handle_monitor(*args, **kwargs):
-    """监控面板处理函数"""
+# 耗时直方图指标 -> 显示名称（插件指标为 plugin.<插件名>）
+LATENCY_METRIC_NAMES = {"callback": "消息处理", "napcat_send": "消息发送", "openai": "AI调用"}
+
+def handle_monitor(event, send_func):
+    """监控面板处理函数（handler(event, bot)签名，直接使用核心解析好的消息事件）"""
+    raw_msg = event.raw_msg
+    target_id = event.target_id
+    chat_type = event.chat_type
     try:
-        logger.info(f"[MonitorPlugin] handle_monitor函数被调用，args数量: {len(args)}, kwargs: {list(kwargs.keys())}")
-        
-        # 从args中获取参数（完全匹配handler.py的调用方式）
-        plugin_manager = args[0] if len(args) > 0 else None
-        send_http_msg_from_args = args[1] if len(args) > 1 else None
-        parsed_data = args[2] if len(args) > 2 else {}
-        sender_id = args[3] if len(args) > 3 else "unknown"
-        chat_type = args[4] if len(args) > 4 else "unknown"
-        permission = args[5] if len(args) > 5 else "all"
-        plugin_logger = args[6] if len(args) > 6 else logger
-        
-        # 从parsed_data中获取raw_msg
-        raw_msg = parsed_data.get('raw_message', '')
-        
-        # 设置target_id
-        target_id = sender_id
-        if chat_type == 'group':
-            target_id = parsed_data.get('group_id', sender_id)
-        
-        # 确保raw_msg是字符串
-        if not isinstance(raw_msg, str):
-            raw_msg = str(raw_msg)
-        
-        logger.info(f"[MonitorPlugin] 调试参数 - chat_type: {chat_type}, sender_id: {sender_id}, raw_msg: {raw_msg}")
-        
-        # 确保raw_msg是字符串
-        if not isinstance(raw_msg, str):
-            raw_msg = str(raw_msg)
-        
-        logger.info(f"[MonitorPlugin] 收到请求: {raw_msg}")
-        logger.info(f"[MonitorPlugin] 消息详情 - 类型: {chat_type}, 发送者: {sender_id}, 目标ID: {target_id}")
-        
-        # 优先使用从参数传入的send_http_msg函数
-        send_func = send_http_msg_from_args
-        
-        # 如果没有传入，则尝试从core.utils导入作为备用
-        if not send_func:
-            try:
-                from core.utils import send_http_msg as send_http_msg_direct
-                send_func = send_http_msg_direct
-                logger.info("[MonitorPlugin] 成功导入send_http_msg函数作为备用")
-            except ImportError:
-                logger.error("[MonitorPlugin] 无法导入send_http_msg函数，无法发送消息")
+        logger.debug(f"[MonitorPlugin] 收到请求: {raw_msg}（类型: {chat_type}, 发送者: {event.sender_id}, 目标ID: {target_id}）")
         
         # 根据不同指令返回不同内容
         content = ""
         if any(keyword in raw_msg for keyword in ["状态", "status"]):
-            logger.info("[MonitorPlugin] 处理'状态'指令")
             content = get_system_status()
         
         elif any(keyword in raw_msg for keyword in ["健康", "health"]):
-            logger.info("[MonitorPlugin] 处理'健康'指令")
             content = get_health_check()
         
         elif any(keyword in raw_msg for keyword in ["性能", "performance"]):
-            logger.info("[MonitorPlugin] 处理'性能'指令")
             content = get_performance_summary()
         
         elif "插件" in raw_msg:
-            logger.info("[MonitorPlugin] 处理'插件'指令")
             content = get_plugins_status()
         
         else:
@@ -80,45 +40,20 @@ def handle_monitor(*args, **kwargs):
 • 性能指标 / performance - 查看性能统计信息
 • 插件状态 - 查看已加载插件信息"""
         
-        logger.info(f"[MonitorPlugin] 返回内容长度: {len(str(content))} 字符")
-        logger.info(f"[MonitorPlugin] 向用户 {sender_id} 发送响应，类型: {chat_type}")
-        
-        # 尝试直接发送消息
-        if send_func and callable(send_func):
-            logger.info("[MonitorPlugin] 调用send_func发送消息")
-            try:
-                # 根据chat_type确定正确的发送参数
-                if chat_type == 'group':
-                    send_result = send_func(target_id, content, chat_type)
-                else:
-                    send_result = send_func(sender_id, content, chat_type)
-                logger.info(f"[MonitorPlugin] 消息发送成功到 {target_id}，类型: {chat_type}")
-            except Exception as send_err:
-                logger.error(f"[MonitorPlugin] 发送消息失败: {str(send_err)}")
-        else:
-            logger.error("[MonitorPlugin] 没有可用的消息发送函数")
-        
-        # 记录插件执行成功
-        logger.info(f"[MonitorPlugin] 命令处理完成: {raw_msg}")
+        try:
+            send_func(target_id, content, chat_type)
+            logger.info(f"[MonitorPlugin] 命令处理完成: {raw_msg}，已回复 {target_id}（{chat_type}）")
+        except Exception as send_err:
+            logger.error(f"[MonitorPlugin] 发送消息失败: {str(send_err)}")
                
     except Exception as e:
         logger.error(f"[MonitorPlugin] 处理请求时发生异常: {str(e)}", exc_info=True)
         
         # 确保异常情况下也发送错误消息
-        error_msg = "❌ 监控数据获取失败"
-        
-        # 尝试发送错误消息
-        if send_http_msg_from_args and callable(send_http_msg_from_args):
-            try:
-                if chat_type == 'group':
-                    send_http_msg_from_args(target_id, error_msg, chat_type)
-                else:
-                    send_http_msg_from_args(sender_id, error_msg, chat_type)
-                logger.info(f"[MonitorPlugin] 已发送错误消息")
-            except Exception as send_err:
-                logger.error(f"[MonitorPlugin] 发送错误消息失败: {str(send_err)}")
-        
-        # 异常情况下不需要返回值，handler.py不使用返回值
+        try:
+            send_func(target_id, "❌ 监控数据获取失败", chat_type)
+        except Exception as send_err:
+            logger.error(f"[MonitorPlugin] 发送错误消息失败: {str(send_err)}")
 
 def get_system_status():
     """获取系统状态"""
@@ -141,6 +76,9 @@ def get_system_status():
         response += f"🔹 错误数: {status['message_stats']['total_errors']}\n"
         response += f"🔹 错误率: {status['message_stats']['error_rate_percent']}%\n"
         response += f"🔹 平均响应: {status['message_stats']['avg_response_time_ms']:.2f}ms"
+        callback_5m = status.get('latency', {}).get('callback', {}).get('5m', {})
+        if callback_5m.get('count'):
+            response += f"\n🔹 响应分位(5分钟): {format_percentiles(callback_5m)}"
         
         return response
         
@@ -199,6 +137,20 @@ def get_performance_summary():
         else:
             response += "🔹 暂无响应时间数据\n"
         
+        # 各阶段耗时分位数（1分钟 / 5分钟 / 1小时滑动窗口）
+        latency = metrics.get('latency', {})
+        latency_lines = []
+        for metric, name in LATENCY_METRIC_NAMES.items():
+            windows = latency.get(metric)
+            if not windows or not windows['1h'].get('count'):
+                continue
+            latency_lines.append(f"🔹 {name}:")
+            for window, label in (("1m", "1分钟"), ("5m", "5分钟"), ("1h", "1小时")):
+                if windows[window].get('count'):
+                    latency_lines.append(f"   - {label}: {format_percentiles(windows[window])}")
+        if latency_lines:
+            response += "\n⏱️ **耗时分位数** ⏱️\n" + "\n".join(latency_lines) + "\n"
+        
         if metrics['plugin_stats']:
             response += "\n🧩 **插件执行统计** 🧩\n"
             # 只显示前5个插件
@@ -212,6 +164,9 @@ def get_performance_summary():
                 response += f"   - 执行次数: {stats['total_executions']}\n"
                 response += f"   - 成功率: {success_rate:.1f}%\n"
                 response += f"   - 平均执行时间: {stats['avg_execution_time']*1000:.2f}ms\n"
+                plugin_1h = latency.get(f"plugin.{plugin_name}", {}).get('1h', {})
+                if plugin_1h.get('count'):
+                    response += f"   - 1小时内: {format_percentiles(plugin_1h)}\n"
         
         return response
         
@@ -249,6 +204,11 @@ def get_plugins_status():
         logger.error(f"[MonitorPlugin] 获取插件状态失败: {str(e)}", exc_info=True)
         return "❌ 获取插件状态信息失败"
 
+def format_percentiles(summary):
+    """格式化一个窗口的分位数"""
+    return (f"p50 {summary['p50_ms']:.1f}ms / p95 {summary['p95_ms']:.1f}ms / "
+            f"p99 {summary['p99_ms']:.1f}ms（{summary['count']}次）")
+
 def get_status_emoji(status):
     """根据状态返回对应的表情符号"""
     if status == "healthy":
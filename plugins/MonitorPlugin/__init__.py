@@ -8,6 +8,7 @@ PLUGIN_META = {
     "description": "查看系统状态和性能指标的监控插件",
     "commands": ["系统状态", "监控", "性能", "health", "status"],
     "handler": "handle_monitor",
+    "handler_style": "event",  # 入口签名：handler(event, bot)
     "chat_type": ["private", "group"],
     "permission": "all",  # 所有用户可使用
     "is_at_required": False
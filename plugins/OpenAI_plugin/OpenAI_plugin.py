@@ -1,8 +1,11 @@
 import json
 import requests
 import os
+import threading
+import time
 from core.config import ROBOT_QQ, MASTER_QQ, NAPCAT_HTTP_URL
-from core.utils import logger, send_http_msg, handle_auto_reply as core_auto_reply
+from core.utils import logger, send_http_msg, sanitize_log, handle_auto_reply as core_auto_reply
+from core.monitor import monitor_manager
 
 # 导入戳一戳功能模块
 from .poke_handler import handle_poke_event
@@ -22,11 +25,17 @@ def read_json(file_path):
         logger.error(f"读取{file_path}失败：{str(e)}")
         return {}
 
-# 写入JSON文件
+# data.json读改写锁：不同会话的消息可能在多个线程中同时追加历史记录
+DATA_LOCK = threading.RLock()
+
+# 写入JSON文件（先写临时文件再替换，避免并发读取到写了一半的文件）
 def write_json(file_path, data):
+    tmp_path = f"{file_path}.tmp"
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        with DATA_LOCK:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, file_path)
         return True
     except Exception as e:
         logger.error(f"写入{file_path}失败：{str(e)}")
@@ -56,42 +65,46 @@ def get_user_conversation(user_id: str) -> list:
     return CONVERSATION_HISTORY.get(user_id, [])
 
 def add_conversation_msg(user_id: str, role: str, content: str):
-    history = get_user_conversation(user_id)
-    history.append({"role": role, "content": content})
-    if len(history) > MAX_HISTORY_COUNT:
-        history = history[-MAX_HISTORY_COUNT:]
-    CONVERSATION_HISTORY[user_id] = history
-    write_json(DATA_FILE, {
-        "CHARACTER_SETTINGS": CHARACTER_SETTINGS,
-        "CURRENT_CHARACTER": CURRENT_CHARACTER,
-        "CONVERSATION_HISTORY": CONVERSATION_HISTORY,
-        "MAX_HISTORY_COUNT": MAX_HISTORY_COUNT
-    })
+    with DATA_LOCK:
+        history = get_user_conversation(user_id)
+        history.append({"role": role, "content": content})
+        if len(history) > MAX_HISTORY_COUNT:
+            history = history[-MAX_HISTORY_COUNT:]
+        CONVERSATION_HISTORY[user_id] = history
+        write_json(DATA_FILE, {
+            "CHARACTER_SETTINGS": CHARACTER_SETTINGS,
+            "CURRENT_CHARACTER": CURRENT_CHARACTER,
+            "CONVERSATION_HISTORY": CONVERSATION_HISTORY,
+            "MAX_HISTORY_COUNT": MAX_HISTORY_COUNT
+        })
 
 def clear_conversation(user_id: str):
-    CONVERSATION_HISTORY[user_id] = []
-    write_json(DATA_FILE, {
-        "CHARACTER_SETTINGS": CHARACTER_SETTINGS,
-        "CURRENT_CHARACTER": CURRENT_CHARACTER,
-        "CONVERSATION_HISTORY": CONVERSATION_HISTORY,
-        "MAX_HISTORY_COUNT": MAX_HISTORY_COUNT
-    })
+    with DATA_LOCK:
+        CONVERSATION_HISTORY[user_id] = []
+        write_json(DATA_FILE, {
+            "CHARACTER_SETTINGS": CHARACTER_SETTINGS,
+            "CURRENT_CHARACTER": CURRENT_CHARACTER,
+            "CONVERSATION_HISTORY": CONVERSATION_HISTORY,
+            "MAX_HISTORY_COUNT": MAX_HISTORY_COUNT
+        })
 
 # 主处理函数
-def handle_openai_plugin(self_bot, bot, message, user_id, chat_type, permission, log_func):
-    raw_msg = message.get("raw_message", "").strip()
-    nickname = message.get("sender", {}).get("card", "") or message.get("sender", {}).get("nickname", "") or user_id
+def handle_openai_plugin(event, bot):
+    raw_msg = event.raw_msg
+    user_id = event.sender_id
+    chat_type = event.chat_type
+    nickname = event.nickname
     
     # 确保使用最新配置
     global CURRENT_CHARACTER, CHARACTER_SETTINGS, CONVERSATION_HISTORY
-    loaded_data = read_json(DATA_FILE)
-    if loaded_data:
-        CURRENT_CHARACTER = loaded_data.get("CURRENT_CHARACTER", CURRENT_CHARACTER)
-        CHARACTER_SETTINGS = loaded_data.get("CHARACTER_SETTINGS", CHARACTER_SETTINGS)
-        CONVERSATION_HISTORY = loaded_data.get("CONVERSATION_HISTORY", CONVERSATION_HISTORY)
+    with DATA_LOCK:
+        loaded_data = read_json(DATA_FILE)
+        if loaded_data:
+            CURRENT_CHARACTER = loaded_data.get("CURRENT_CHARACTER", CURRENT_CHARACTER)
+            CHARACTER_SETTINGS = loaded_data.get("CHARACTER_SETTINGS", CHARACTER_SETTINGS)
+            CONVERSATION_HISTORY = loaded_data.get("CONVERSATION_HISTORY", CONVERSATION_HISTORY)
     
-    target_id = message.get("group_id") if chat_type == "group" else user_id
-    target_id = str(target_id) if target_id else user_id
+    target_id = event.target_id or user_id
     
     # 帮助命令
     if raw_msg == "/chat帮助":
@@ -113,18 +126,11 @@ def handle_openai_plugin(self_bot, bot, message, user_id, chat_type, permission,
                    "/-persona 名称 - 删除人设\n" \
                    "/persona= - 查看人设列表"
         bot(target_id, help_msg, chat_type)
-        log_func(f"用户{user_id}查询/chat帮助")
+        logger.info(f"用户{user_id}查询/chat帮助")
         return True
     
     # AI聊天触发
-    chat_content = ""
-    if raw_msg.startswith("//"):
-        if chat_type == "group" or chat_type == "private":
-            chat_content = raw_msg.lstrip("//").strip()
-    # 私聊中普通消息也触发AI回复
-    elif chat_type == "private" and raw_msg.strip() and not raw_msg.startswith("/"):
-        chat_content = raw_msg.strip()
-    
+    chat_content = extract_chat_content(raw_msg, chat_type)
     if chat_content:
         reply = call_openai_api(chat_content, user_id, nickname)
         bot(target_id, reply, chat_type)
@@ -345,18 +351,40 @@ def handle_openai_plugin(self_bot, bot, message, user_id, chat_type, permission,
     
     return False
 
-# API调用函数
-def call_openai_api(message: str, user_id: str, nickname: str) -> str:
-    if not OPENAI_CONFIG["api_key"]:
-        return "❌ 未配置OpenAI API密钥，请主人执行/设置OpenAI命令完成配置"
+# 提取AI聊天内容（//前缀或私聊普通消息），非聊天消息返回空字符串
+def extract_chat_content(raw_msg: str, chat_type: str) -> str:
+    if raw_msg.startswith("//"):
+        if chat_type == "group" or chat_type == "private":
+            return raw_msg.lstrip("//").strip()
+    # 私聊中普通消息也触发AI回复
+    elif chat_type == "private" and raw_msg.strip() and not raw_msg.startswith("/"):
+        return raw_msg.strip()
+    return ""
+
+# 异步服务模式入口：AI聊天走异步HTTP，不占用线程；其余指令交给同步入口在线程池中执行
+async def handle_openai_plugin_async(event, bot):
+    from core.async_server import async_server
+    raw_msg = event.raw_msg
+    chat_type = event.chat_type
+    chat_content = extract_chat_content(raw_msg, chat_type)
+    if not chat_content:
+        # run_sync复制当前上下文执行，请求摘要和调试追踪在线程中同样生效
+        return await async_server.run_sync(handle_openai_plugin, event, send_http_msg)
     
+    reply = await call_openai_api_async(chat_content, event.sender_id, event.nickname)
+    await bot(event.target_id or event.sender_id, reply, chat_type)
+    return True
+
+# 构建对话请求：返回(请求URL, 请求头, 请求体)
+def build_chat_request(message: str, user_id: str, nickname: str):
     # 使用和handle_openai_plugin完全相同的逻辑
     global CURRENT_CHARACTER, CHARACTER_SETTINGS, CONVERSATION_HISTORY
-    loaded_data = read_json(DATA_FILE)
-    if loaded_data:
-        CURRENT_CHARACTER = loaded_data.get("CURRENT_CHARACTER", CURRENT_CHARACTER)
-        CHARACTER_SETTINGS = loaded_data.get("CHARACTER_SETTINGS", CHARACTER_SETTINGS)
-        CONVERSATION_HISTORY = loaded_data.get("CONVERSATION_HISTORY", CONVERSATION_HISTORY)
+    with DATA_LOCK:
+        loaded_data = read_json(DATA_FILE)
+        if loaded_data:
+            CURRENT_CHARACTER = loaded_data.get("CURRENT_CHARACTER", CURRENT_CHARACTER)
+            CHARACTER_SETTINGS = loaded_data.get("CHARACTER_SETTINGS", CHARACTER_SETTINGS)
+            CONVERSATION_HISTORY = loaded_data.get("CONVERSATION_HISTORY", CONVERSATION_HISTORY)
     
     # 使用全局变量
     current_character = CURRENT_CHARACTER
@@ -385,29 +413,63 @@ def call_openai_api(message: str, user_id: str, nickname: str) -> str:
         "temperature": 0.1,  # 降低随机性，更严格按照系统提示
         "timeout": 30
     }
+    return f"{OPENAI_CONFIG['api_base']}/chat/completions", headers, json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+# 解析对话响应并写入上下文记忆
+def handle_chat_response(resp_json: dict, message: str, user_id: str) -> str:
+    if "choices" in resp_json and len(resp_json["choices"]) > 0:
+        reply = resp_json["choices"][0]["message"]["content"].strip()
+        add_conversation_msg(user_id, "user", message)
+        add_conversation_msg(user_id, "assistant", reply)
+        return reply
+    else:
+        return "⚠️ AI回复格式异常，暂无有效内容"
+
+# API调用函数
+def call_openai_api(message: str, user_id: str, nickname: str) -> str:
+    if not OPENAI_CONFIG["api_key"]:
+        return "❌ 未配置OpenAI API密钥，请主人执行/设置OpenAI命令完成配置"
     
+    url, headers, body = build_chat_request(message, user_id, nickname)
+    request_start = time.perf_counter()
     try:
-        response = requests.post(
-            f"{OPENAI_CONFIG['api_base']}/chat/completions",
-            headers=headers,
-            data=json.dumps(data, ensure_ascii=False).encode("utf-8"),
-            timeout=30
-        )
+        response = requests.post(url, headers=headers, data=body, timeout=30)
         response.raise_for_status()
-        resp_json = response.json()
-        if "choices" in resp_json and len(resp_json["choices"]) > 0:
-            reply = resp_json["choices"][0]["message"]["content"].strip()
-            add_conversation_msg(user_id, "user", message)
-            add_conversation_msg(user_id, "assistant", reply)
-            return reply
-        else:
-            return "⚠️ AI回复格式异常，暂无有效内容"
+        return handle_chat_response(response.json(), message, user_id)
     except requests.exceptions.RequestException as e:
         print(f"OpenAI调用失败：{str(e)}")
         return f"⚠️ AI回复失败：{str(e)[:30]}"
     except Exception as e:
         print(f"AI回复处理失败：{str(e)}")
         return f"⚠️ AI回复失败：{str(e)[:30]}"
+    finally:
+        # AI接口耗时计入openai直方图
+        monitor_manager.record_latency("openai", time.perf_counter() - request_start)
+
+# 异步API调用函数（asyncio服务模式使用，复用全局aiohttp连接池）
+async def call_openai_api_async(message: str, user_id: str, nickname: str) -> str:
+    if not OPENAI_CONFIG["api_key"]:
+        return "❌ 未配置OpenAI API密钥，请主人执行/设置OpenAI命令完成配置"
+    
+    import aiohttp
+    from core.async_server import async_client, async_server
+    # 读写data.json属于阻塞IO，放到线程池执行，仅网络请求在事件循环中等待
+    url, headers, body = await async_server.run_sync(build_chat_request, message, user_id, nickname)
+    request_start = time.perf_counter()
+    try:
+        session = await async_client.get_session()
+        async with session.post(url, headers=headers, data=body, timeout=aiohttp.ClientTimeout(total=30)) as response:
+            response.raise_for_status()
+            resp_json = await response.json(content_type=None)
+        return await async_server.run_sync(handle_chat_response, resp_json, message, user_id)
+    except aiohttp.ClientError as e:
+        logger.error(sanitize_log(f"[OpenAI] 调用失败：{type(e).__name__}，原因：{str(e)}"))
+        return f"⚠️ AI回复失败：{str(e)[:30]}"
+    except Exception as e:
+        logger.error(sanitize_log(f"[OpenAI] 回复处理失败：{type(e).__name__}，原因：{str(e)}"), exc_info=True)
+        return f"⚠️ AI回复失败：{str(e)[:30]}"
+    finally:
+        monitor_manager.record_latency("openai", time.perf_counter() - request_start)
 
 # 自动回复函数
 def handle_auto_reply(msg: str, user_id: str = "auto_reply", nickname: str = "用户") -> str:
@@ -421,5 +483,15 @@ def handle_auto_reply(msg: str, user_id: str = "auto_reply", nickname: str = "
     # 没有API密钥时，返回空字符串
     return ""
 
+# 异步自动回复函数（asyncio服务模式使用）
+async def handle_auto_reply_async(msg: str, user_id: str = "auto_reply", nickname: str = "用户") -> str:
+    from core.config import AUTO_REPLIES
+    if msg in AUTO_REPLIES:
+        return AUTO_REPLIES[msg]
+    if OPENAI_CONFIG["api_key"]:
+        return await call_openai_api_async(msg, user_id, nickname)
+    return ""
+
 # 插件注册
-__all__ = ["handle_openai_plugin", "handle_auto_reply", "handle_poke_event"]
\ No newline at end of file
+__all__ = ["handle_openai_plugin", "handle_openai_plugin_async", "handle_auto_reply", "handle_auto_reply_async",
+           "handle_poke_event"]
\ No newline at end of file
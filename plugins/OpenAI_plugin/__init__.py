@@ -3,6 +3,10 @@ PLUGIN_META = {
     "name": "OpenAI_plugin",  # 插件唯一名称，与目录/核心文件一致
     "commands": ["//", "/chat帮助", "/设置OpenAI", "/新增人设", "/删除人设", "/查看人设列表", "/切换人设", "/清除记忆", "/persona", "/+persona", "/-persona", "/persona=", "/戳一戳开关", "/戳一戳状态"],  # 所有触发指令（包含//用于AI聊天触发）
     "handler": "handle_openai_plugin",  # 核心处理函数名（对应插件主入口函数）
+    "handler_style": "event",  # 入口签名：handler(event, bot)，同步/异步入口一致
+    "async_handler": "handle_openai_plugin_async",  # asyncio服务模式下的异步入口（可选）
+    "event_handlers": {"notice.notify.poke": "handle_poke_event"},  # 戳一戳事件由事件路由分发
+    "ai_commands": ["//"],  # 触发AI请求的指令，入队模式下进入ai通道，不阻塞其他指令
     "chat_type": ["private", "group"],  # 支持私聊和群聊场景
     "permission": "all",  # 全员可用（主人专属命令插件内已做权限校验）
     "is_at_required": False,  # 群聊无需@机器人触发（插件管理指令可直接使用）
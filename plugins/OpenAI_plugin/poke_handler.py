@@ -8,8 +8,8 @@ import json
 import requests
 import os
 import random
-from core.config import ROBOT_QQ, NAPCAT_HTTP_URL
-from core.utils import logger
+from core.config import ROBOT_QQ
+from core.utils import logger, call_napcat_api
 
 # 配置文件路径（复用OpenAI插件的配置）
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.json")
@@ -163,17 +163,13 @@ def send_poke_back(target_id: str, chat_type: str):
     poke_data = {k: v for k, v in poke_data.items() if v is not None}
     
     try:
-        response = requests.post(
-            f"{NAPCAT_HTTP_URL}/send_poke",
-            json=poke_data,
-            timeout=5
-        )
+        result = call_napcat_api("send_poke", poke_data, timeout=5)
         
-        if response.status_code == 200:
+        if result.get("retcode") == 0:
             logger.info(f"回戳消息发送成功：{target_id} ({chat_type})")
             return True
         else:
-            logger.warning(f"回戳消息发送失败：{response.status_code}")
+            logger.warning(f"回戳消息发送失败：{result.get('retcode')}")
             return False
     except Exception as e:
         logger.error(f"回戳消息发送异常：{str(e)}")
@@ -184,25 +180,17 @@ def send_text_message(target_id: str, message: str, chat_type: str):
     """发送文本消息"""
     try:
         if chat_type == "private":
-            response = requests.post(
-                f"{NAPCAT_HTTP_URL}/send_private_msg",
-                json={
-                    "user_id": int(target_id),
-                    "message": message
-                },
-                timeout=5
-            )
+            result = call_napcat_api("send_private_msg", {
+                "user_id": int(target_id),
+                "message": message
+            }, timeout=5)
         else:
-            response = requests.post(
-                f"{NAPCAT_HTTP_URL}/send_group_msg",
-                json={
-                    "group_id": int(target_id),
-                    "message": message
-                },
-                timeout=5
-            )
+            result = call_napcat_api("send_group_msg", {
+                "group_id": int(target_id),
+                "message": message
+            }, timeout=5)
         
-        if response.status_code == 200:
+        if result.get("retcode") == 0:
             return True
         else:
             return False
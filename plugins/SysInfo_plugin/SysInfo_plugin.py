@@ -3,34 +3,16 @@ import platform
 import time
 import logging
 from typing import Dict
-import requests
-import json
 from core.config import (
     ROBOT_START_TIME,
     BOT_VERSION,
     MASTER_QQ,
-    NAPCAT_HTTP_URL,
     LOG_ENCODING,
     ROBOT_QQ  
 )
+from core.utils import send_http_msg
 logger = logging.getLogger("GracyBot-HTTP-Pure")
 
-def send_http_msg(target: str, content: str, chat_type: str = "private") -> bool:
-    try:
-        url = f"{NAPCAT_HTTP_URL}/send_{chat_type}_msg"
-        params = {"group_id" if chat_type == "group" else "user_id": int(target), "message": content}
-        headers = {"Content-Type": "application/json; charset=utf-8"}
-        response = requests.post(url, data=json.dumps(params, ensure_ascii=False).encode("utf-8"), headers=headers, timeout=10)
-        if response.json().get("retcode") == 0:
-            logger.info(f"✅ 发送{chat_type}消息到{target}：{content[:50]}...")
-            return True
-        else:
-            logger.error(f"❌ {chat_type}消息发送失败：{response.json().get('msg')}")
-            return False
-    except Exception as e:
-        logger.error(f"❌ {chat_type}消息发送异常：{str(e)}")
-        return False
-
 def get_system_info() -> Dict[str, str]:
     # 主机名称
     host_name = platform.node() or subprocess.getoutput("hostname")
@@ -85,7 +67,7 @@ def get_system_info() -> Dict[str, str]:
         "运行状态": status_final
     }
 
-def handle_status_cmd(target: str, chat_type: str):
+def handle_status_cmd(target: str, chat_type: str, bot=send_http_msg):
     info = get_system_info()
     msg = (
         "📊 【GracyBot状态信息】\n"
@@ -101,31 +83,25 @@ def handle_status_cmd(target: str, chat_type: str):
         f"👨‍💻  作者QQ：{info['作者QQ']}\n"
         f"📈  运行状态：{info['运行状态']}"
     )
-    send_http_msg(target, msg, chat_type)
+    bot(target, msg, chat_type)
 
-# ========== 核心修改：改为7个标准参数（顺序固定，不可修改） ==========
-def handle_sysinfo_plugin(self_bot, bot, message, user_id, chat_type, permission, logger):
-    # 1. 提取并清理消息内容（过滤空格、@机器人符号，兼容群聊格式）
-    raw_msg = message.get("raw_message", "").strip()
-    msg_content = raw_msg.replace(" ", "").replace("　", "").replace(f"@1972693082", "").replace(f"@机器人", "").strip()
-    
-    # 2. 确定目标ID（群聊=群ID，私聊=用户ID，避免发送失败）
-    if chat_type == "group":
-        target_id = message.get("group_id")
-    else:
-        target_id = user_id
-    target_id = str(target_id) if target_id else user_id  # 容错处理，防止空值
+# ========== 插件入口：handler(event, bot)（PLUGIN_META中声明handler_style为event） ==========
+def handle_sysinfo_plugin(event, bot):
+    # 1. 规范化文本已去除@内容，这里再去掉所有空格，兼容"/运行 状态"等写法
+    msg_content = event.text.replace(" ", "").replace("@机器人", "")
+    target_id = event.target_id
+    chat_type = event.chat_type
     
-    # 3. 指令匹配（保持原有功能逻辑不变）
+    # 2. 指令匹配（保持原有功能逻辑不变）
     if msg_content in ["/运行状态", "/info", "/status"]:
-        handle_status_cmd(target_id, chat_type)
-        logger.info(f"用户{user_id}（{chat_type}）查询系统状态，目标ID：{target_id}")
+        handle_status_cmd(target_id, chat_type, bot)
+        logger.info(f"用户{event.sender_id}（{chat_type}）查询系统状态，目标ID：{target_id}")
         return True
     
-    # 4. 无效指令处理（放过其他插件指令，避免冲突）
-    if msg_content.startswith("/") and msg_content not in ["/运行状态", "/info", "/status"]:
+    # 3. 无效指令处理（放过其他插件指令，避免冲突）
+    if msg_content.startswith("/"):
         bot(target_id, "❌ 无效指令！本插件仅支持：/运行状态、/info、/status", chat_type)
-        logger.warning(f"用户{user_id}（{chat_type}）发送无效系统指令：{msg_content}")
+        logger.warning(f"用户{event.sender_id}（{chat_type}）发送无效系统指令：{msg_content}")
     else:
         return  # 放行其他插件的指令，交给对应插件处理
 
@@ -2,6 +2,7 @@ PLUGIN_META = {
     "name": "SysInfo_plugin",  # 插件名称
     "commands": ["/运行状态", "/info", "/status"],  # 所有触发指令（对应系统状态查询功能）
     "handler": "handle_sysinfo_plugin",  # 核心处理函数名（插件入口函数）
+    "handler_style": "event",  # 入口签名：handler(event, bot)
     "chat_type": ["private", "group"],  # 支持私聊、群聊场景
     "permission": "all",  # 无权限限制
     "is_at_required": False,  
@@ -0,0 +1,6 @@
+"""pytest配置：把项目根目录加入导入路径（在项目根目录执行 python -m pytest）"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
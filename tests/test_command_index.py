@@ -0,0 +1,87 @@
+"""插件指令索引回归测试：匹配结果须与逐个遍历注册池（注册顺序优先）一致"""
+
+import random
+
+from core.command_index import CommandIndex
+
+
+def plugin(name, commands, chat_type=("private", "group"), permission="all", is_at_required=False):
+    return {"name": name, "commands": list(commands), "chat_type": list(chat_type),
+            "permission": permission, "is_at_required": is_at_required}
+
+
+def linear_match(plugins, raw_msg, chat_type, is_master, is_at_bot):
+    """旧实现：按注册顺序逐个检查插件"""
+    for item in plugins:
+        if chat_type not in item["chat_type"]:
+            continue
+        if item["permission"] == "master" and not is_master:
+            continue
+        if chat_type == "group" and item.get("is_at_required", False) and not is_at_bot:
+            continue
+        if any(cmd in raw_msg for cmd in item["commands"]):
+            return item
+    return None
+
+
+def build(plugins):
+    index = CommandIndex()
+    index.rebuild(plugins)
+    return index
+
+
+def test_registration_order_wins_over_position_and_length():
+    plugins = [plugin("early", ["/天气"]), plugin("late", ["/天气预报", "/帮助"])]
+    index = build(plugins)
+    # 后注册插件的指令更长、在消息中更靠前，仍由先注册的插件处理
+    assert index.match("/帮助 /天气预报", "private", False, False)["name"] == "early"
+    assert index.match("/帮助", "private", False, False)["name"] == "late"
+    assert index.match("你好", "private", False, False) is None
+
+
+def test_scene_filters_skip_to_next_plugin():
+    plugins = [
+        plugin("master_only", ["/重载"], permission="master"),
+        plugin("at_only", ["/重载"], chat_type=("group",), is_at_required=True),
+        plugin("private_only", ["/重载"], chat_type=("private",)),
+        plugin("fallback", ["/重载"]),
+    ]
+    index = build(plugins)
+    assert index.match("/重载", "private", True, False)["name"] == "master_only"
+    assert index.match("/重载", "private", False, False)["name"] == "private_only"
+    assert index.match("/重载", "group", False, True)["name"] == "at_only"
+    assert index.match("/重载", "group", False, False)["name"] == "fallback"
+    # @标记只在群聊中生效
+    assert index.match("/重载", "private", False, True)["name"] == "private_only"
+
+
+def test_empty_command_matches_every_message():
+    index = build([plugin("a", ["/a"]), plugin("catch_all", [""]), plugin("b", ["/b"])])
+    assert index.match("/a", "group", False, False)["name"] == "a"
+    assert index.match("/b", "group", False, False)["name"] == "catch_all"
+    assert index.match("", "group", False, False)["name"] == "catch_all"
+
+
+def test_rebuild_replaces_cached_buckets():
+    index = build([plugin("old", ["/旧"])])
+    assert index.match("/旧", "private", False, False)["name"] == "old"
+    index.rebuild([plugin("new", ["/新"])])
+    assert index.match("/旧", "private", False, False) is None
+    assert index.match("/新", "private", False, False)["name"] == "new"
+
+
+def test_matches_linear_scan_on_random_registry():
+    rng = random.Random(7)
+    alphabet = "ab/c"
+    plugins = []
+    for idx in range(40):
+        commands = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 3))]
+        plugins.append(plugin(f"p{idx}", commands,
+                              chat_type=rng.choice((("private",), ("group",), ("private", "group"))),
+                              permission=rng.choice(("all", "all", "master")),
+                              is_at_required=rng.random() < 0.2))
+    index = build(plugins)
+    for _ in range(2000):
+        raw_msg = "".join(rng.choice(alphabet + "xy") for _ in range(rng.randint(0, 12)))
+        scene = (rng.choice(("private", "group")), rng.random() < 0.3, rng.random() < 0.5)
+        assert index.match(raw_msg, *scene) is linear_match(plugins, raw_msg, *scene)
@@ -0,0 +1,95 @@
+"""日志归档回归测试：归档文件写入/读取往返、索引筛选，以及归档与当天日志的联合查询"""
+
+import os
+import time
+
+import pytest
+
+from core.log_archive import (ArchiveReader, LogArchive, archive_file, iter_lines_reversed, iter_records,
+                              iter_records_reversed)
+
+DAY = time.mktime((2026, 10, 15, 0, 0, 0, 0, 0, -1))
+
+
+def make_lines(day_offset, count):
+    lines = []
+    for i in range(count):
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(DAY + day_offset * 86400 + i * 60))
+        level = "ERROR" if i % 10 == 0 else "INFO"
+        lines.append(f"{stamp} - GracyBot - {level} - 消息{day_offset}-{i}（用户****{1000 + i % 20}）\n")
+        if i % 10 == 0:
+            lines.append("Traceback (most recent call last):\n  File \"x.py\", line 1\n")
+    return lines
+
+
+def write_log(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    for offset in (0, 1):
+        path = str(tmp_path / f"gracybot.log.2026-10-{15 + offset}")
+        write_log(path, make_lines(offset, 600))
+        archive_file(path, block_bytes=2048)
+    write_log(str(tmp_path / "gracybot.log"), make_lines(2, 300))
+    return tmp_path
+
+
+def test_archive_round_trip(tmp_path):
+    lines = make_lines(0, 500)
+    path = str(tmp_path / "gracybot.log.2026-10-15")
+    write_log(path, lines)
+    target = archive_file(path, block_bytes=1024)
+
+    assert target.endswith(".garc") and not os.path.exists(path)
+    reader = ArchiveReader(target)
+    assert len(reader.blocks) > 1
+    text = "".join(reader.read_block(idx) for idx in range(len(reader.blocks)))
+    assert text == "".join(lines)
+    # 记录不会跨块切分
+    assert sum(len(list(iter_records(reader.read_block(idx).splitlines(True))))
+               for idx in range(len(reader.blocks))) == reader.index["records"] == 500
+
+
+def test_candidate_blocks_filter_by_level_and_user(tmp_path):
+    path = str(tmp_path / "gracybot.log.2026-10-15")
+    write_log(path, make_lines(0, 500))
+    reader = ArchiveReader(archive_file(path, block_bytes=1024))
+    for level, user in (("ERROR", None), (None, "123451005"), ("ERROR", "1000")):
+        blocks = set(reader.candidate_blocks(0, float("inf"), level, user))
+        for idx in range(len(reader.blocks)):
+            records = iter_records(reader.read_block(idx).splitlines(True))
+            hit = any((not level or rec_level == level) and (not user or f"****{user[-4:]}" in text)
+                      for _, rec_level, text in records)
+            # 索引可以多选块，但不能漏掉包含匹配记录的块
+            assert idx in blocks or not hit
+
+
+def test_reversed_reader_matches_forward_records(tmp_path):
+    path = str(tmp_path / "gracybot.log")
+    write_log(path, ["文件开头的续行\n"] + make_lines(0, 200))
+    with open(path, encoding="utf-8") as f:
+        forward = list(iter_records(f))
+    backward = list(iter_records_reversed(iter_lines_reversed(path, "utf-8", chunk_bytes=100)))
+    assert backward[::-1] == forward
+
+
+def test_query_spans_archives_and_current_file(log_dir):
+    archive = LogArchive()
+    archive.log_dir = str(log_dir)
+    # 跨越第二天归档末尾和当天日志开头
+    since, until = DAY + 86400 + 599 * 60 - 1, DAY + 2 * 86400 + 60
+    records = archive.query(since, until, limit=10)
+    assert [record["text"].splitlines()[0].split(" - ")[-1].split("（")[0] for record in records] == [
+        "消息1-599", "消息2-0", "消息2-1"]
+    assert [record["ts"] for record in records] == sorted(record["ts"] for record in records)
+
+    errors = archive.query(DAY, DAY + 3 * 86400, level="ERROR", limit=200)
+    assert len(errors) == 60 + 60 + 30
+    assert all(record["level"] == "ERROR" and "Traceback" in record["text"] for record in errors)
+
+    latest = archive.query(DAY, DAY + 3 * 86400, user="1005", limit=3)
+    assert [record["text"].split(" - ")[-1].split("（")[0] for record in latest] == [
+        "消息2-245", "消息2-265", "消息2-285"]
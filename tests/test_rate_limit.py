@@ -0,0 +1,78 @@
+"""频率限制窗口回归测试：滑动窗口估算、超限不计数、只检查不计数、小时窗口、多级原子检查
+（进程内与SQLite两种状态后端）
+"""
+
+import pytest
+
+from core.security_manager import RateLimiter
+from core.state_backend import MemoryStateBackend, SQLiteStateBackend
+
+# 对齐到小时边界，分钟窗口和小时窗口同时从头开始
+T0 = 1_800_000_000.0 - 1_800_000_000.0 % 3600
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteStateBackend(str(tmp_path / "state.db"))
+    return MemoryStateBackend()
+
+
+def limiter(backend, per_minute=3, per_hour=0):
+    return RateLimiter("test", max_per_minute=per_minute, max_per_hour=per_hour, metrics=False, backend=backend)
+
+
+def test_minute_window_limit_and_rejected_hits_not_counted(backend):
+    rate = limiter(backend)
+    assert [rate.hit("u1", now=T0 + i) for i in range(3)] == [None, None, None]
+    assert rate.hit("u1", now=T0 + 10) == "minute"
+    assert rate.hit("u1", now=T0 + 20) == "minute"
+    # 其他键互不影响
+    assert rate.hit("u2", now=T0 + 20) is None
+    assert rate.stats == {"allowed": 4, "limited_minute": 2, "limited_hour": 0}
+
+
+def test_previous_window_is_weighted_by_remaining_fraction(backend):
+    rate = limiter(backend)
+    for i in range(3):
+        rate.hit("u1", now=T0 + i)
+    # 新窗口开头：上一窗口的3次按权重≈1计入，仍然超限
+    assert rate.hit("u1", now=T0 + 60) == "minute"
+    # 窗口过半：估算 3 × 0.5 = 1.5，可再放行2次（1.5、2.5 < 3），第3次估算 3.5 超限
+    assert [rate.hit("u1", now=T0 + 90) for _ in range(3)] == [None, None, "minute"]
+    # 隔一个完整窗口后，旧计数全部清零
+    assert [rate.hit("u1", now=T0 + 180 + i) for i in range(3)] == [None, None, None]
+
+
+def test_record_false_only_checks(backend):
+    rate = limiter(backend, per_minute=1)
+    assert rate.hit("u1", now=T0, record=False) is None
+    assert rate.hit("u1", now=T0 + 1) is None
+    assert rate.hit("u1", now=T0 + 2, record=False) == "minute"
+
+
+def test_hour_window_applies_across_minutes(backend):
+    rate = limiter(backend, per_minute=2, per_hour=3)
+    assert rate.hit("u1", now=T0) is None
+    assert rate.hit("u1", now=T0 + 1) is None
+    assert rate.hit("u1", now=T0 + 2) == "minute"
+    assert rate.hit("u1", now=T0 + 600) is None
+    assert rate.hit("u1", now=T0 + 1200) == "hour"
+
+
+def test_multi_tier_hit_is_all_or_nothing(backend):
+    global_windows = ((60, 3),)
+    user_windows = ((60, 1),)
+    entries = (("global:*", global_windows), ("user:1", user_windows))
+    assert backend.hit("ai", entries, T0) is None
+    # 用户层级超限：返回 (计数器下标, 窗口下标)，全局层级不计数
+    assert backend.hit("ai", entries, T0 + 1) == (1, 0)
+    assert backend.hit("ai", (("global:*", global_windows), ("user:2", user_windows)), T0 + 2) is None
+    assert backend.hit("ai", (("global:*", global_windows), ("user:3", user_windows)), T0 + 3) is None
+    assert backend.hit("ai", (("global:*", global_windows), ("user:4", user_windows)), T0 + 4) == (0, 0)
+
+
+def test_claim_once_per_window(backend):
+    assert backend.claim("test", "notice:u1", 100) is True
+    assert backend.claim("test", "notice:u1", 100) is False
+    assert backend.claim("test", "notice:u1", 101) is True